@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Benchmark: event-loop lag while a burst of concurrent updates hits the database.
+
+Replays the per-message DatabaseManager calls made by handle_message
+(get_or_create_user, is_muted, is_admin) for a burst of concurrent updates,
+first through the blocking DatabaseManager and then through AsyncDatabaseManager,
+while a probe task measures how late the event loop wakes it up.
+
+Usage: python benchmarks/bench_async_db.py [updates] [users]
+"""
+
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), 'bench.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{DB_PATH}'
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import db, async_db
+
+CHAT_ID = -100123
+PROBE_INTERVAL = 0.001
+
+async def probe_loop_lag(samples: list, stop: asyncio.Event):
+    """Record how late each short sleep returns"""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(PROBE_INTERVAL)
+        samples.append(time.perf_counter() - start - PROBE_INTERVAL)
+
+async def sync_update(user_id: int):
+    db.get_or_create_user(user_id, f"user{user_id}", "Bench", "User")
+    db.is_muted(user_id, CHAT_ID)
+    db.is_admin(user_id, CHAT_ID)
+
+async def async_update(user_id: int):
+    await async_db.get_or_create_user(user_id, f"user{user_id}", "Bench", "User")
+    await async_db.is_muted(user_id, CHAT_ID)
+    await async_db.is_admin(user_id, CHAT_ID)
+
+async def run_burst(handler, updates: int, users: int):
+    samples = []
+    stop = asyncio.Event()
+    probe = asyncio.create_task(probe_loop_lag(samples, stop))
+    await asyncio.sleep(0.01)
+    
+    start = time.perf_counter()
+    await asyncio.gather(*(handler(1000 + i % users) for i in range(updates)))
+    elapsed = time.perf_counter() - start
+    
+    stop.set()
+    await probe
+    samples.sort()
+    return {
+        'elapsed': elapsed,
+        'max_lag': samples[-1] * 1000,
+        'p99_lag': samples[int(len(samples) * 0.99) - 1] * 1000,
+        'median_lag': statistics.median(samples) * 1000,
+        'probes': len(samples),
+    }
+
+def report(name: str, result: dict, updates: int):
+    print(f"{name:<22} {result['elapsed']:>8.2f}s {updates / result['elapsed']:>10.0f} upd/s "
+          f"{result['median_lag']:>9.2f} {result['p99_lag']:>9.2f} {result['max_lag']:>9.2f}  ({result['probes']} probes)")
+
+async def main():
+    updates = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    users = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    
+    print(f"Replaying {updates} concurrent updates from {users} users against {DB_PATH}")
+    print(f"{'mode':<22} {'wall':>9} {'throughput':>15} {'lag p50':>9} {'lag p99':>9} {'lag max':>9}  (ms)")
+    
+    report("sync DatabaseManager", await run_burst(sync_update, updates, users), updates)
+    report("AsyncDatabaseManager", await run_burst(async_update, updates, users), updates)
+    
+    await async_db.engine.dispose()
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Benchmark: bot writers and web dashboard readers sharing one SQLite database.
+
+N writer threads replay the bot's write pattern (user upserts and warnings, one
+commit each) while M reader threads run the web dashboard's statistics queries.
+The run is repeated against an untuned engine (rollback journal, default
+pooling) and against build_engine() (WAL, synchronous=NORMAL, mmap, busy
+timeout), each on its own fresh database file.
+
+To measure lock waits directly, both engines run with SQLite's busy timeout
+disabled and every operation retries on "database is locked" after a short
+sleep. Lock wait is the total time spent in failed attempts and retry sleeps.
+
+Usage: python benchmarks/bench_db_concurrency.py [writers] [readers] [seconds]
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, event, func, select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from database import Base, Chat, User, Admin, Ban, Warning, Mute, Whitelist, build_engine
+
+CHAT_ID = -100123
+SEED_USERS = 2000
+RETRY_SLEEP = 0.001
+
+def seed(Session):
+    with Session() as session:
+        session.add(Chat(id=CHAT_ID, title="Bench"))
+        session.add_all(User(id=1000 + i, username=f"user{i}", first_name="Bench") for i in range(SEED_USERS))
+        session.commit()
+
+def write_op(Session, n: int):
+    with Session() as session:
+        user = session.get(User, 1000 + n % SEED_USERS)
+        user.username = f"user{n}"
+        session.add(Warning(user_id=user.id, chat_id=CHAT_ID, warned_by=1, reason="bench"))
+        session.commit()
+
+def read_op(Session, n: int):
+    # Same counts the dashboard's /api/stats endpoint runs
+    with Session() as session:
+        for model in (Chat, User, Admin, Ban, Warning, Mute, Whitelist):
+            session.execute(select(func.count()).select_from(model)).scalar()
+
+def disable_busy_timeout(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA busy_timeout=0")
+    cursor.close()
+
+def timed(op, Session, n: int, latencies: list, waits: list):
+    """Run op until it gets its locks, recording total latency and time lost to locks"""
+    start = time.perf_counter()
+    waited = 0.0
+    while True:
+        attempt = time.perf_counter()
+        try:
+            op(Session, n)
+            break
+        except OperationalError as e:
+            if 'locked' not in str(e):
+                raise
+            time.sleep(RETRY_SLEEP)
+            waited += time.perf_counter() - attempt
+    latencies.append(time.perf_counter() - start)
+    waits.append(waited)
+
+def worker(op, Session, deadline: float, offset: int, latencies: list, waits: list):
+    n = offset
+    while time.perf_counter() < deadline:
+        timed(op, Session, n, latencies, waits)
+        n += 1
+
+def run(engine, writers: int, readers: int, seconds: float) -> dict:
+    event.listen(engine, 'connect', disable_busy_timeout)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    seed(Session)
+    
+    write_latencies, read_latencies, write_waits, read_waits = [], [], [], []
+    deadline = time.perf_counter() + seconds
+    threads = [
+        threading.Thread(target=worker, args=(write_op, Session, deadline, i * 100000, write_latencies, write_waits))
+        for i in range(writers)
+    ] + [
+        threading.Thread(target=worker, args=(read_op, Session, deadline, i, read_latencies, read_waits))
+        for i in range(readers)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    engine.dispose()
+    
+    write_latencies.sort()
+    read_latencies.sort()
+    return {
+        'writes': len(write_latencies) / seconds,
+        'reads': len(read_latencies) / seconds,
+        'write_p99': write_latencies[int(len(write_latencies) * 0.99) - 1] * 1000 if write_latencies else 0,
+        'read_p99': read_latencies[int(len(read_latencies) * 0.99) - 1] * 1000 if read_latencies else 0,
+        'write_wait': sum(write_waits),
+        'read_wait': sum(read_waits),
+        'retried': sum(1 for wait in write_waits + read_waits if wait),
+    }
+
+def report(name: str, result: dict):
+    print(f"{name:<26} {result['writes']:>9.0f} {result['reads']:>9.0f} {result['write_p99']:>10.1f} "
+          f"{result['read_p99']:>10.1f} {result['write_wait']:>10.2f}s {result['read_wait']:>10.2f}s {result['retried']:>8}")
+
+def main():
+    writers = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    readers = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    seconds = float(sys.argv[3]) if len(sys.argv) > 3 else 5
+    workdir = tempfile.mkdtemp()
+    
+    print(f"{writers} writers + {readers} dashboard readers for {seconds:.0f}s per engine ({workdir})")
+    print(f"{'engine':<26} {'writes/s':>9} {'reads/s':>9} {'write p99':>10} {'read p99':>10} {'write wait':>11} {'read wait':>11} {'retried':>8}")
+    
+    untuned = create_engine(f"sqlite:///{os.path.join(workdir, 'untuned.db')}", connect_args={'timeout': 0})
+    report("untuned (rollback journal)", run(untuned, writers, readers, seconds))
+    
+    tuned = build_engine(f"sqlite:///{os.path.join(workdir, 'tuned.db')}")
+    report("build_engine (WAL)", run(tuned, writers, readers, seconds))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Benchmark: flood tracking memory and per-message cost.
+
+Compares the previous FloodControl tracking (a deque of datetimes per
+"chat:user" string key) with SlidingWindowLimiter (one fixed-size counter per
+(chat_id, user_id) tuple on an integer monotonic clock).
+
+Memory is measured with tracemalloc after tracking the given number of users
+with a few messages each, and scaled to one million users. Per-message cost is
+the mean over a stream of messages spread across 1000 active users.
+
+Usage: python benchmarks/bench_flood_limiter.py [users] [messages]
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+from collections import defaultdict, deque
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.rate_limiter import SlidingWindowLimiter
+
+CHAT_ID = -100123
+LIMIT = 5
+WINDOW = 10  # seconds
+MESSAGES_PER_USER = 3
+ACTIVE_USERS = 1000
+
+class LegacyFloodTracker:
+    """The deque-per-user tracking FloodControl used before SlidingWindowLimiter"""
+    
+    def __init__(self):
+        self.user_messages = defaultdict(lambda: deque())
+    
+    def hit(self, chat_id: int, user_id: int) -> bool:
+        now = datetime.now()
+        cutoff = now - timedelta(seconds=WINDOW)
+        user_key = f"{chat_id}:{user_id}"
+        while self.user_messages[user_key] and self.user_messages[user_key][0] < cutoff:
+            self.user_messages[user_key].popleft()
+        self.user_messages[user_key].append(now)
+        return len(self.user_messages[user_key]) > LIMIT
+
+class LimiterTracker:
+    def __init__(self):
+        self.limiter = SlidingWindowLimiter()
+    
+    def hit(self, chat_id: int, user_id: int) -> bool:
+        return self.limiter.hit((chat_id, user_id), LIMIT, WINDOW * 1000)
+
+def measure_memory(tracker_class, users: int) -> float:
+    """Bytes allocated per tracked user"""
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    tracker = tracker_class()
+    for user_id in range(users):
+        for _ in range(MESSAGES_PER_USER):
+            tracker.hit(CHAT_ID, 1_000_000_000 + user_id)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    
+    allocated = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    del tracker
+    return allocated / users
+
+def measure_cost(tracker_class, messages: int) -> float:
+    """Mean nanoseconds per tracked message"""
+    tracker = tracker_class()
+    user_ids = [1_000_000_000 + i for i in range(ACTIVE_USERS)]
+    start = time.perf_counter_ns()
+    for i in range(messages):
+        tracker.hit(CHAT_ID, user_ids[i % ACTIVE_USERS])
+    return (time.perf_counter_ns() - start) / messages
+
+def main():
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    messages = int(sys.argv[2]) if len(sys.argv) > 2 else 1_000_000
+    
+    print(f"Memory: {users} users x {MESSAGES_PER_USER} messages; cost: {messages} messages across {ACTIVE_USERS} users")
+    print(f"{'tracker':<22} {'bytes/user':>11} {'MB per 1M users':>16} {'ns/message':>11}")
+    for name, tracker_class in [("deque of datetimes", LegacyFloodTracker), ("SlidingWindowLimiter", LimiterTracker)]:
+        per_user = measure_memory(tracker_class, users)
+        cost = measure_cost(tracker_class, messages)
+        print(f"{name:<22} {per_user:>11.0f} {per_user * 1_000_000 / 2**20:>16.0f} {cost:>11.0f}")
+
+if __name__ == '__main__':
+    main()
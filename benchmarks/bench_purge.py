@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Benchmark: /purge of a large message range against a fake bot.
+
+Compares the old purge loop (one delete_message call per message, awaited in
+turn) with purge_messages() (deleteMessages calls of up to 100 ids, run
+concurrently through fan_out() at the configured request rate). The fake bot
+sleeps for a fixed latency per call to stand in for the Telegram round trip
+and counts API calls and deleted messages.
+
+Usage: python benchmarks/bench_purge.py [messages] [latency_ms] [rate]
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.fanout import purge_messages, purged_count
+
+CHAT_ID = -100123
+
+class FakeBot:
+    """Counts delete calls and deleted messages, sleeping latency seconds per call"""
+    
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls = 0
+        self.deleted = set()
+    
+    async def delete_message(self, chat_id, message_id):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        self.deleted.add(message_id)
+        return True
+    
+    async def delete_messages(self, chat_id, message_ids):
+        assert len(message_ids) <= 100
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        self.deleted.update(message_ids)
+        return True
+
+async def legacy_purge(bot, message_ids):
+    deleted_count = 0
+    for message_id in message_ids:
+        try:
+            await bot.delete_message(CHAT_ID, message_id)
+            deleted_count += 1
+        except Exception:
+            pass
+    return deleted_count
+
+async def batched_purge(bot, message_ids, rate):
+    summary = await purge_messages(bot, CHAT_ID, message_ids, concurrency=4, rate=rate)
+    return purged_count(summary)
+
+async def measure(purge, messages, latency):
+    bot = FakeBot(latency)
+    message_ids = list(range(1, messages + 1))
+    start = time.perf_counter()
+    deleted_count = await purge(bot, message_ids)
+    elapsed = time.perf_counter() - start
+    assert deleted_count == messages and bot.deleted == set(message_ids)
+    return bot.calls, elapsed
+
+async def main():
+    messages = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    latency_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 1
+    rate = float(sys.argv[3]) if len(sys.argv) > 3 else 25
+    
+    print(f"Purging {messages} messages, {latency_ms:g} ms per API call, batched calls paced to {rate:g}/s")
+    print(f"{'purge':<28} {'API calls':>10} {'wall s':>10}")
+    for name, purge in [
+        ("delete_message loop", legacy_purge),
+        ("deleteMessages batches", lambda bot, message_ids: batched_purge(bot, message_ids, rate)),
+    ]:
+        calls, elapsed = await measure(purge, messages, latency_ms / 1000)
+        print(f"{name:<28} {calls:>10} {elapsed:>10.2f}")
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Benchmark: spam pattern checks on long messages.
+
+Compares the old check_spam_patterns loop (re.search for each SPAM_PATTERNS
+entry) with SpamScorer on Telegram-sized messages (up to 4096 characters).
+Besides ordinary chatter, the corpus contains adversarial messages that repeat
+a rule's first keyword without ever completing the rule, which makes each
+"(keywords).*(keywords)" pattern rescan the rest of the line per occurrence.
+Mean and worst-case latency are reported per message kind.
+
+Usage: python benchmarks/bench_spam_scorer.py [messages_per_kind] [length]
+"""
+
+import os
+import random
+import re
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.spam_scorer import SpamScorer, DEFAULT_SPAM_RULES
+
+SPAM_PATTERNS = [
+    r'(?i)(free|win|winner|congratulations).*(money|cash|prize|reward)',
+    r'(?i)(click|visit|check).*(link|url|website)',
+    r'(?i)(telegram|whatsapp|discord).*(group|channel|server)',
+    r'(?i)(crypto|bitcoin|trading|investment).*(profit|earn|money)',
+    r'(?i)(dating|meet|girls|boys).*(app|site|website)',
+]
+
+def legacy_is_spam(text):
+    for pattern in SPAM_PATTERNS:
+        if re.search(pattern, text):
+            return True
+    return False
+
+def random_word(rng):
+    return ''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(2, 9)))
+
+def fill(rng, words, length):
+    text = ''
+    while len(text) < length:
+        text += rng.choice(words) + ' '
+    return text[:length]
+
+def build_corpus(rng, count, length):
+    return {
+        'chatter': [fill(rng, [random_word(rng) for _ in range(50)], length) for _ in range(count)],
+        'spam at end': [fill(rng, [random_word(rng) for _ in range(50)], length - 20) + ' win cash now' for _ in range(count)],
+        'near-miss keywords': [fill(rng, ['free', 'win', 'click', 'telegram', 'crypto', 'meet', random_word(rng)], length) for _ in range(count)],
+        'one first keyword': [fill(rng, ['winwinwin', 'checkcheck', 'freefree'], length) for _ in range(count)],
+    }
+
+def latencies(is_spam, messages):
+    samples = []
+    for text in messages:
+        start = time.perf_counter()
+        is_spam(text)
+        samples.append((time.perf_counter() - start) * 1e6)
+    return sum(samples) / len(samples), max(samples)
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    length = int(sys.argv[2]) if len(sys.argv) > 2 else 4096
+    rng = random.Random(42)
+
+    scorer = SpamScorer(DEFAULT_SPAM_RULES)
+    corpus = build_corpus(rng, count, length)
+    for messages in corpus.values():
+        for text in messages:
+            assert bool(scorer.score(text)[1]) == legacy_is_spam(text), text[:80]
+
+    checkers = [
+        ("re.search loop", legacy_is_spam),
+        ("SpamScorer", lambda text: scorer.score(text)),
+    ]
+    print(f"{count} messages of {length} characters per kind")
+    print(f"{'messages':<20} {'checker':<16} {'mean us':>10} {'max us':>10}")
+    for kind, messages in corpus.items():
+        for name, is_spam in checkers:
+            mean, worst = latencies(is_spam, messages)
+            print(f"{kind:<20} {name:<16} {mean:>10.1f} {worst:>10.1f}")
+
+if __name__ == '__main__':
+    main()
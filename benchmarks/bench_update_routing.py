@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Benchmark: bytes and CPU spent per update before and after trimming allowed_updates.
+
+Replays a fixed mix of group traffic (new and edited messages, commands,
+photos, reactions, channel posts, member updates, callback queries and polls,
+in the proportions below) through an application with the bot's handler table:
+one command handler per command registered in bot.py, the event and callback
+handlers, and the general message handler.
+
+"ALL_TYPES" is the old setup: every update type is delivered, the message
+and command handlers see every kind of message and the general handler is
+registered twice. "routed" registers it once, limits the message and command
+handlers to NEW_MESSAGES as bot.py does, and only receives the update types
+route_updates() returns. For each, the benchmark counts the bytes Telegram
+delivers and the CPU time of decoding, deserializing and dispatching them,
+per update of the mix.
+
+Usage: python benchmarks/bench_update_routing.py [updates] [rounds]
+"""
+
+import asyncio
+import json
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from telegram import Update, User
+from telegram.ext import (
+    Application, CallbackQueryHandler, ChatMemberHandler, CommandHandler, ExtBot, MessageHandler, filters
+)
+
+from services.update_routing import NEW_MESSAGES, route_updates
+
+BOT_PY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'bot.py')
+
+# Share of each kind of update in the recorded mix
+MIX = [
+    ('text', 50), ('command', 6), ('photo', 6), ('edited_message', 10),
+    ('message_reaction', 10), ('message_reaction_count', 2), ('channel_post', 3),
+    ('edited_channel_post', 1), ('callback_query', 4), ('chat_member', 5),
+    ('my_chat_member', 1), ('poll', 1), ('poll_answer', 1),
+]
+
+class OfflineBot(ExtBot):
+    """Bot that initializes without contacting Telegram"""
+    
+    async def get_me(self, *args, **kwargs):
+        self._bot_user = User(id=1, first_name='Bench', is_bot=True, username='bench_bot')
+        return self._bot_user
+
+def user(user_id: int) -> dict:
+    return {'id': user_id, 'is_bot': False, 'first_name': 'Member', 'last_name': str(user_id),
+            'username': f'member{user_id}', 'language_code': 'en'}
+
+def chat(chat_id: int, kind: str = 'supergroup') -> dict:
+    return {'id': chat_id, 'title': 'Busy group', 'username': 'busygroup', 'type': kind}
+
+def message(update_id: int, rng: random.Random, kind: str) -> dict:
+    body = {'message_id': update_id, 'from': user(rng.randrange(1000, 5000)),
+            'chat': chat(-1001000 - rng.randrange(50)), 'date': 1700000000 + update_id}
+    if kind == 'command':
+        body['text'] = '/warnings'
+        body['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': 9}]
+    elif kind == 'photo':
+        body['photo'] = [
+            {'file_id': f'AgACAgIAAxkBAAI{update_id:08d}{size}', 'file_unique_id': f'AQAD{update_id}{size}',
+             'file_size': 1500 * size * size, 'width': 90 * size, 'height': 60 * size}
+            for size in (1, 3, 8, 14)
+        ]
+        body['caption'] = 'look at this'
+    else:
+        body['text'] = ' '.join(rng.choice(('hello', 'anyone', 'around', 'tonight', 'thanks', 'ok'))
+                                for _ in range(rng.randrange(2, 15)))
+    return body
+
+def member_update(update_id: int, rng: random.Random) -> dict:
+    member = user(rng.randrange(1000, 5000))
+    return {'chat': chat(-1001000 - rng.randrange(50)), 'from': member, 'date': 1700000000 + update_id,
+            'old_chat_member': {'status': 'left', 'user': member},
+            'new_chat_member': {'status': 'member', 'user': member}}
+
+def recorded_mix(count: int) -> list:
+    """(update type, JSON body) for count updates, always the same for a given count"""
+    rng = random.Random(42)
+    kinds = [kind for kind, share in MIX for _ in range(share)]
+    updates = []
+    for update_id in range(1, count + 1):
+        kind = rng.choice(kinds)
+        data = {'update_id': update_id}
+        if kind in ('text', 'command', 'photo'):
+            data['message'] = message(update_id, rng, kind)
+            kind = 'message'
+        elif kind in ('edited_message', 'channel_post', 'edited_channel_post'):
+            data[kind] = message(update_id, rng, 'text')
+            data[kind]['edit_date'] = data[kind]['date'] + 5
+            if kind != 'edited_message':
+                data[kind]['chat'] = chat(-1002000, 'channel')
+                del data[kind]['from']
+        elif kind == 'message_reaction':
+            data[kind] = {'chat': chat(-1001000 - rng.randrange(50)), 'message_id': update_id - 3,
+                          'user': user(rng.randrange(1000, 5000)), 'date': 1700000000 + update_id,
+                          'old_reaction': [], 'new_reaction': [{'type': 'emoji', 'emoji': '👍'}]}
+        elif kind == 'message_reaction_count':
+            data[kind] = {'chat': chat(-1001000 - rng.randrange(50)), 'message_id': update_id - 3,
+                          'date': 1700000000 + update_id,
+                          'reactions': [{'type': {'type': 'emoji', 'emoji': '👍'}, 'total_count': 4}]}
+        elif kind == 'callback_query':
+            data[kind] = {'id': str(update_id), 'from': user(rng.randrange(1000, 5000)),
+                          'chat_instance': '-77', 'data': f'captcha_{rng.randrange(1000, 5000)}_0',
+                          'message': message(update_id - 1, rng, 'text')}
+        elif kind in ('chat_member', 'my_chat_member'):
+            data[kind] = member_update(update_id, rng)
+        elif kind == 'poll':
+            data[kind] = {'id': str(update_id), 'question': 'Pizza?', 'total_voter_count': 3,
+                          'is_closed': False, 'is_anonymous': True, 'type': 'regular',
+                          'allows_multiple_answers': False,
+                          'options': [{'text': 'yes', 'voter_count': 2}, {'text': 'no', 'voter_count': 1}]}
+        else:
+            data[kind] = {'poll_id': str(update_id - 1), 'user': user(rng.randrange(1000, 5000)), 'option_ids': [0]}
+        updates.append((kind, json.dumps(data).encode()))
+    return updates
+
+def build_application(routed: bool) -> tuple:
+    """Application with the bot's handler table; returns it and the update types it receives"""
+    application = Application.builder().bot(OfflineBot('123456:bench')).updater(None).build()
+    
+    def noop():
+        async def callback(update, context):
+            pass
+        return callback
+    
+    async def handle_all_messages(update, context):
+        if not update.message or not update.effective_user:
+            return
+    
+    def new_messages(message_filter):
+        return NEW_MESSAGES & message_filter if routed else message_filter
+    
+    for command in re.findall(r'CommandHandler\("(\w+)"', open(BOT_PY).read()):
+        # Commands used to default to new and edited messages
+        application.add_handler(CommandHandler(command, noop(), filters=NEW_MESSAGES if routed else None))
+    application.add_handler(MessageHandler(new_messages(filters.StatusUpdate.NEW_CHAT_MEMBERS), noop()))
+    application.add_handler(MessageHandler(new_messages(filters.StatusUpdate.LEFT_CHAT_MEMBER), noop()))
+    application.add_handler(MessageHandler(new_messages(filters.FORWARDED & filters.ChatType.PRIVATE), noop()))
+    application.add_handler(ChatMemberHandler(noop(), ChatMemberHandler.CHAT_MEMBER))
+    application.add_handler(CallbackQueryHandler(noop(), pattern=r"^captcha_"))
+    application.add_handler(CallbackQueryHandler(noop(), pattern=r"^report_"))
+    if not routed:
+        application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_all_messages))
+    application.add_handler(MessageHandler(
+        new_messages(~filters.COMMAND & ~filters.StatusUpdate.ALL), handle_all_messages
+    ))
+    
+    if routed:
+        return application, set(route_updates(application))
+    return application, set(Update.ALL_TYPES)
+
+async def measure(routed: bool, mix: list, rounds: int) -> tuple:
+    application, allowed = build_application(routed)
+    delivered = [body for kind, body in mix if kind in allowed]
+    await application.initialize()
+    try:
+        started = time.process_time()
+        for _ in range(rounds):
+            for body in delivered:
+                await application.process_update(Update.de_json(json.loads(body), application.bot))
+        cpu = (time.process_time() - started) / rounds
+    finally:
+        await application.shutdown()
+    return len(delivered), sum(len(body) for body in delivered), cpu
+
+async def main():
+    updates = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    mix = recorded_mix(updates)
+    
+    print(f"{updates} updates in the recorded mix, {rounds} rounds")
+    print(f"{'setup':<10} {'delivered':>10} {'KB':>8} {'bytes/update':>13} {'CPU us/update':>14}")
+    for name, routed in [("ALL_TYPES", False), ("routed", True)]:
+        delivered, size, cpu = await measure(routed, mix, rounds)
+        # Per update of the mix: the cost of serving the same traffic
+        print(f"{name:<10} {delivered:>10} {size / 1024:>8.0f} {size / updates:>13.0f} "
+              f"{cpu / updates * 1e6:>14.1f}")
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Benchmark: URL filter checks with a large per-chat block list.
+
+Compares the old check_url_filters loop (a linear scan of SUSPICIOUS_DOMAINS
+and a substring test of every URL against every URLFilter row) with a
+DomainIndex plus a frozenset of shorteners, on messages carrying many URLs.
+URL extraction and database access are left out of both. Clean messages,
+where every filter has to be ruled out, are the expensive case for the loop.
+
+Usage: python benchmarks/bench_url_filters.py [blocked_domains] [messages] [urls_per_message]
+"""
+
+import os
+import random
+import string
+import sys
+import time
+from urllib.parse import urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.domain_index import DomainIndex, DomainRule, normalize_domain, in_domain_set
+
+SUSPICIOUS_DOMAINS = [
+    'bit.ly', 'tinyurl.com', 'short.link', 't.co', 'goo.gl',
+    'ow.ly', 'buff.ly', 'is.gd', 'tiny.cc'
+]
+SHORTENERS = frozenset(SUSPICIOUS_DOMAINS)
+TLDS = ['com', 'net', 'org', 'io', 'ru', 'co.uk']
+
+class Row:
+    """Stand-in for a URLFilter row"""
+    
+    def __init__(self, domain, action, is_whitelist):
+        self.domain = domain
+        self.action = action
+        self.is_whitelist = is_whitelist
+
+def legacy_check(url_filters, urls):
+    for url in urls:
+        domain = urlparse(url).netloc.lower()
+        if domain in SUSPICIOUS_DOMAINS:
+            return 'delete'
+        for url_filter in url_filters:
+            if url_filter.domain in domain:
+                if url_filter.is_whitelist:
+                    continue
+                return url_filter.action
+    return None
+
+def indexed_check(index, urls):
+    for domain in dict.fromkeys(normalize_domain(url) for url in urls):
+        rule = index.lookup(domain)
+        if rule and rule.is_whitelist:
+            continue
+        if in_domain_set(domain, SHORTENERS):
+            return 'delete'
+        if rule:
+            return rule.action
+    return None
+
+def random_domain(rng):
+    name = ''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(6, 14)))
+    return f"{name}.{rng.choice(TLDS)}"
+
+def build_messages(rng, blocked, count, per_message):
+    clean, dirty = [], []
+    for _ in range(count):
+        urls = [f"https://{rng.choice(['', 'www.', 'cdn.'])}{random_domain(rng)}/p/{rng.randint(1, 9999)}" for _ in range(per_message)]
+        clean.append(urls)
+        dirty_urls = list(urls)
+        dirty_urls[rng.randrange(per_message)] = f"https://www.{rng.choice(blocked)}/spam"
+        dirty.append(dirty_urls)
+    return clean, dirty
+
+def time_per_message(check, messages) -> float:
+    start = time.perf_counter()
+    for urls in messages:
+        check(urls)
+    return (time.perf_counter() - start) / len(messages) * 1e6
+
+def main():
+    blocked_count = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    per_message = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+    rng = random.Random(42)
+    
+    blocked = [random_domain(rng) for _ in range(blocked_count)]
+    rows = [Row(domain, 'delete', False) for domain in blocked]
+    start = time.perf_counter()
+    index = DomainIndex(DomainRule(row.domain, row.action, row.is_whitelist) for row in rows)
+    build_ms = (time.perf_counter() - start) * 1000
+    
+    clean, dirty = build_messages(rng, blocked, count, per_message)
+    for urls in dirty:
+        assert indexed_check(index, urls) == 'delete'
+    
+    print(f"{blocked_count} blocked domains, {count} messages x {per_message} URLs; index built in {build_ms:.0f} ms")
+    print(f"{'checker':<22} {'clean us/msg':>13} {'blocked us/msg':>15}")
+    for name, check in [
+        ("substring loop", lambda urls: legacy_check(rows, urls)),
+        ("DomainIndex", lambda urls: indexed_check(index, urls)),
+    ]:
+        print(f"{name:<22} {time_per_message(check, clean):>13.1f} {time_per_message(check, dirty):>15.1f}")
+
+if __name__ == '__main__':
+    main()
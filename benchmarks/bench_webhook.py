@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Benchmark: webhook ingestion and update processing under load.
+
+Starts python-telegram-bot's webhook endpoint, as run_webhook() does in the
+bot, in process on a free local port, in front of an application whose only
+handler sleeps for a fixed time per update (one chat in ten is slow, standing
+in for a purge or a database stall). The load generator posts synthetic message updates over
+keep-alive connections, each chat's updates on the same connection and in
+order as Telegram delivers them, and measures updates processed per second,
+the latency from posting an update to its handler finishing, and how many
+updates started while an earlier update of their chat was still running.
+
+The same updates are run through python-telegram-bot's sequential default,
+its plain concurrent processor and ShardedUpdateProcessor.
+
+Pass a URL to post the updates to an already running bot instead; only the
+endpoint's response rate and latency are measured then.
+
+Usage: python benchmarks/bench_webhook.py [updates] [chats] [concurrency] [url]
+"""
+
+import asyncio
+import json
+import os
+import socket
+import sys
+import time
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from telegram import User
+from telegram.ext import Application, ExtBot, MessageHandler, filters
+
+from services.update_processor import ShardedUpdateProcessor
+
+HANDLER_TIME = 0.002
+SLOW_HANDLER_TIME = 0.05
+CONNECTIONS = 40
+PATH = '/telegram'
+
+class OfflineBot(ExtBot):
+    """Bot that initializes without contacting Telegram"""
+    
+    async def get_me(self, *args, **kwargs):
+        self._bot_user = User(id=1, first_name='Bench', is_bot=True, username='bench_bot')
+        return self._bot_user
+    
+    async def set_webhook(self, *args, **kwargs):
+        return True
+
+def free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+def make_update(update_id: int, chat_index: int) -> bytes:
+    return json.dumps({
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': int(time.time()),
+            'chat': {'id': -1000000 - chat_index, 'type': 'supergroup', 'title': 'Load test'},
+            'from': {'id': 1000 + chat_index, 'is_bot': False, 'first_name': 'Load'},
+            'text': f'message {update_id}',
+        },
+    }).encode()
+
+async def post_all(host: str, port: int, path: str, requests: list, sent: dict) -> list:
+    """Post (update_id, body) pairs over one keep-alive connection; returns response latencies"""
+    reader, writer = await asyncio.open_connection(host, port)
+    latencies = []
+    try:
+        for update_id, body in requests:
+            started = time.perf_counter()
+            sent[update_id] = started
+            writer.write(
+                f"POST {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+            status = await reader.readline()
+            assert b' 200 ' in status, status
+            while (await reader.readline()) not in (b'\r\n', b''):
+                pass
+            latencies.append(time.perf_counter() - started)
+    finally:
+        writer.close()
+    return latencies
+
+async def generate_load(host: str, port: int, path: str, updates: int, chats: int, sent: dict) -> list:
+    """Spread the updates over the connections, each chat pinned to one; returns response latencies"""
+    connections = [[] for _ in range(min(CONNECTIONS, chats))]
+    for update_id in range(1, updates + 1):
+        chat_index = update_id % chats
+        connections[chat_index % len(connections)].append((update_id, make_update(update_id, chat_index)))
+    results = await asyncio.gather(*(post_all(host, port, path, requests, sent) for requests in connections))
+    return [latency for latencies in results for latency in latencies]
+
+def percentile(values: list, fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+async def measure(concurrent_updates, updates: int, chats: int) -> tuple:
+    sent, finished, running = {}, {}, {}
+    overlapped = 0
+    done = asyncio.Event()
+    
+    async def handle(update, context):
+        nonlocal overlapped
+        chat_id = update.effective_chat.id
+        if running.get(chat_id):
+            overlapped += 1
+        running[chat_id] = running.get(chat_id, 0) + 1
+        await asyncio.sleep(SLOW_HANDLER_TIME if chat_id % 10 == 0 else HANDLER_TIME)
+        running[chat_id] -= 1
+        finished[update.update_id] = time.perf_counter()
+        if len(finished) == updates:
+            done.set()
+    
+    application = (
+        Application.builder()
+        .bot(OfflineBot('123456:bench'))
+        .concurrent_updates(concurrent_updates)
+        .build()
+    )
+    application.add_handler(MessageHandler(filters.ALL, handle))
+    port = free_port()
+    
+    await application.initialize()
+    await application.start()
+    await application.updater.start_webhook(listen='127.0.0.1', port=port, url_path=PATH.lstrip('/'))
+    try:
+        started = time.perf_counter()
+        await generate_load('127.0.0.1', port, PATH, updates, chats, sent)
+        await done.wait()
+        elapsed = time.perf_counter() - started
+    finally:
+        await application.updater.stop()
+        await application.stop()
+        await application.shutdown()
+    
+    latencies = [finished[update_id] - sent[update_id] for update_id in finished]
+    return updates / elapsed, percentile(latencies, 0.5), percentile(latencies, 0.99), overlapped
+
+async def main():
+    updates = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    chats = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    concurrency = int(sys.argv[3]) if len(sys.argv) > 3 else 16
+    
+    if len(sys.argv) > 4:
+        url = urlsplit(sys.argv[4])
+        sent = {}
+        started = time.perf_counter()
+        latencies = await generate_load(url.hostname, url.port or 80, url.path or '/', updates, chats, sent)
+        elapsed = time.perf_counter() - started
+        print(f"Posted {updates} updates for {chats} chats to {sys.argv[4]}")
+        print(f"{updates / elapsed:.0f} updates/s, response p50 {percentile(latencies, 0.5) * 1000:.1f} ms, "
+              f"p99 {percentile(latencies, 0.99) * 1000:.1f} ms")
+        return
+    
+    print(f"{updates} updates over {chats} chats and {min(CONNECTIONS, chats)} connections, "
+          f"handlers take {HANDLER_TIME * 1000:g} ms ({SLOW_HANDLER_TIME * 1000:g} ms in every tenth chat)")
+    print(f"{'processing':<32} {'updates/s':>10} {'p50 ms':>10} {'p99 ms':>10} {'overlapped':>10}")
+    for name, concurrent_updates in [
+        ("sequential (default)", False),
+        (f"concurrent_updates={concurrency}", concurrency),
+        (f"sharded by chat, {concurrency} shards", ShardedUpdateProcessor(concurrency, 64)),
+    ]:
+        rate, p50, p99, overlapped = await measure(concurrent_updates, updates, chats)
+        print(f"{name:<32} {rate:>10.0f} {p50 * 1000:>10.1f} {p99 * 1000:>10.1f} {overlapped:>10}")
+
+if __name__ == '__main__':
+    asyncio.run(main())
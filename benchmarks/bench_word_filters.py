@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Benchmark: word filter matching with thousands of filters per chat.
+
+Compares the old check_word_filters loop (`word in text` per literal filter and
+a fresh re.search per regex filter) with a compiled WordMatcher, on clean
+messages (the common case, where every filter has to be ruled out) and on
+messages containing a filtered word. Database access is left out of both; the
+old code additionally ran one query per message.
+
+Usage: python benchmarks/bench_word_filters.py [filters] [regex_filters] [messages]
+"""
+
+import os
+import random
+import re
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.word_matcher import WordMatcher
+
+def legacy_match(filters, text):
+    for word, action, is_regex in filters:
+        if is_regex:
+            if re.search(word, text, re.IGNORECASE):
+                return word, action
+        elif word in text:
+            return word, action
+    return None
+
+def random_word(rng, low=4, high=10):
+    return ''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(low, high)))
+
+def build_filters(rng, literals: int, regexes: int):
+    filters = [(random_word(rng), 'delete', False) for _ in range(literals)]
+    filters += [(f"{random_word(rng, 3, 5)}\\d+{random_word(rng, 2, 4)}", 'warn', True) for _ in range(regexes)]
+    return filters
+
+def build_messages(rng, filters, count: int):
+    clean, dirty = [], []
+    for _ in range(count):
+        words = [random_word(rng, 2, 8) for _ in range(rng.randint(5, 60))]
+        clean.append(' '.join(words))
+        words[rng.randrange(len(words))] = rng.choice(filters)[0] if not filters[0][2] else 'x'
+        dirty.append(' '.join(words))
+    return clean, dirty
+
+def time_per_message(match, filters, messages) -> float:
+    start = time.perf_counter()
+    for text in messages:
+        match(filters, text)
+    return (time.perf_counter() - start) / len(messages) * 1e6
+
+def main():
+    literals = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    regexes = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    count = int(sys.argv[3]) if len(sys.argv) > 3 else 300
+    rng = random.Random(42)
+    
+    filters = build_filters(rng, literals, regexes)
+    clean, dirty = build_messages(rng, filters, count)
+    
+    start = time.perf_counter()
+    matcher = WordMatcher(filters)
+    build_ms = (time.perf_counter() - start) * 1000
+    
+    for text in clean + dirty:
+        assert matcher.match(text) == legacy_match(filters, text), text
+    
+    print(f"{literals} literal + {regexes} regex filters, {count} messages per set; matcher built in {build_ms:.0f} ms")
+    print(f"{'matcher':<22} {'clean us/msg':>13} {'filtered us/msg':>16}")
+    for name, match in [
+        ("row-by-row loop", legacy_match),
+        ("WordMatcher", lambda filters, text: matcher.match(text)),
+    ]:
+        print(f"{name:<22} {time_per_message(match, filters, clean):>13.1f} {time_per_message(match, filters, dirty):>16.1f}")
+
+if __name__ == '__main__':
+    main()
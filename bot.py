@@ -15,6 +15,16 @@ from telegram.ext import (
 # Import configuration and database
 from config import Config
 from database import db
+from migrations import run_migrations
+from services.moderation_context import load_moderation_context
+from services.activity_buffer import user_activity
+from services.night_mode import night_mode
+from services.outbound import outbound
+from services.deletion_scheduler import deletions
+from services.captcha_sweeper import captcha_sweeper
+from services.join_pipeline import join_pipeline
+from services.update_processor import ShardedUpdateProcessor
+from services.update_routing import NEW_MESSAGES, route_updates
 
 # Import all handlers
 from handlers.admin_commands import (
@@ -61,12 +71,13 @@ from handlers.events import (
 
 # Import new advanced handlers
 from handlers.antiflood import (
-    setflood_command, setfloodmode_command, flood_command, check_flood
+    setflood_command, setfloodmode_command, flood_command, check_flood, flood_control
 )
 
 from handlers.filters import (
     addfilter_command, removefilter_command, filters_command,
     lock_command, unlock_command, locks_command, antispam_command,
+    addspam_command, removespam_command, spampatterns_command,
     check_message_filters
 )
 
@@ -101,181 +112,219 @@ logger = logging.getLogger(__name__)
 async def handle_all_messages(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Combined message handler for all filters and checks"""
     try:
+        if not update.message or not update.effective_user:
+            return
+        
+        # Resolve sender status, chat flags and chat settings once for all checks
+        moderation = await load_moderation_context(update.effective_chat.id, update.effective_user.id)
+        
         # Check night mode first
-        if await check_night_mode(update, context):
+        if await check_night_mode(update, context, moderation):
             return
         
         # Check flood protection
-        if await check_flood(update, context):
+        if await check_flood(update, context, moderation):
             return
         
         # Check message filters (word filters, URL filters, media filters, spam)
-        if await check_message_filters(update, context):
+        if await check_message_filters(update, context, moderation):
             return
         
         # Check for note shortcuts (#notename)
         if await handle_note_shortcut(update, context):
             return
         
-        # Check for custom commands
-        if await handle_custom_command(update, context):
-            return
-        
         # Regular message handling
-        await handle_message(update, context)
-        
+        await handle_message(update, context, moderation)
+    
     except Exception as e:
         logger.error(f"Error in handle_all_messages: {e}")
         await error_handler(update, context)
 
-async def main():
+async def post_init(application: Application):
+    """Start background services once the event loop is running"""
+    user_activity.start()
+    flood_control.start_refresh(Config.FLOOD_SETTINGS_REFRESH_INTERVAL)
+    night_mode.start()
+    await deletions.start(application.bot)
+    captcha_sweeper.start(application.bot)
+
+async def post_stop(application: Application):
+    """Finish work that still needs the Bot API once updates stop arriving"""
+    await application.update_processor.drain()
+    await join_pipeline.stop()
+
+async def post_shutdown(application: Application):
+    """Drain background services before the bot exits"""
+    await captcha_sweeper.stop()
+    await deletions.stop()
+    await night_mode.stop()
+    await flood_control.stop_refresh()
+    await user_activity.stop()
+
+def main():
     """Main function to run the bot"""
     try:
         # Validate configuration
         Config.validate()
         logger.info("Configuration validated successfully")
         
+        # Bring existing databases up to the current schema (tables and indexes)
+        run_migrations(db.engine)
+        
         # Create application
-        application = Application.builder().token(Config.BOT_TOKEN).build()
+        application = (
+            Application.builder()
+            .token(Config.BOT_TOKEN)
+            .rate_limiter(outbound)
+            .concurrent_updates(ShardedUpdateProcessor(Config.UPDATE_SHARDS, Config.UPDATE_SHARD_DEPTH))
+            .post_init(post_init)
+            .post_stop(post_stop)
+            .post_shutdown(post_shutdown)
+            .build()
+        )
         
         # Add command handlers
         
         # Admin utility commands
-        application.add_handler(CommandHandler("fileid", fileid_command))
+        application.add_handler(CommandHandler("fileid", fileid_command, filters=NEW_MESSAGES))
         
         # Chat management commands
-        application.add_handler(CommandHandler("activate", activate_command))
-        application.add_handler(CommandHandler("silence", silence_command))
-        application.add_handler(CommandHandler("unsilence", unsilence_command))
-        application.add_handler(CommandHandler("underattack", underattack_command))
-        application.add_handler(CommandHandler("ua", ua_command))
-        application.add_handler(CommandHandler("reload", reload_command))
-        application.add_handler(CommandHandler("debug", debug_command))
-        application.add_handler(CommandHandler("pin", pin_command))
-        application.add_handler(CommandHandler("unpin", unpin_command))
-        application.add_handler(CommandHandler("purge", purge_command))
+        application.add_handler(CommandHandler("activate", activate_command, filters=NEW_MESSAGES))
+        application.add_handler(CommandHandler("silence", silence_command, filters=NEW_MESSAGES))
+        application.add_handler(CommandHandler("unsilence", unsilence_command, filters=NEW_MESSAGES))
+        application.add_handler(CommandHandler("underattack", underattack_command, filters=NEW_MESSAGES))
+        application.add_handler(CommandHandler("ua", ua_command, filters=NEW_MESSAGES))
+        application.add_handler(CommandHandler("reload", reload_command, filters=NEW_MESSAGES))
+        application.add_handler(CommandHandler("debug", debug_command, filters=NEW_MESSAGES))
+        application.add_handler(CommandHandler("pin", pin_command, filters=NEW_MESSAGES))
+        application.add_handler(CommandHandler("unpin", unpin_command, filters=NEW_MESSAGES))
+        application.add_handler(CommandHandler("purge", purge_command, filters=NEW_MESSAGES))
         
         # User management commands
-        application.add_handler(CommandHandler("promote", promote_command))
-        application.add_handler(CommandHandler("title", title_command))
-        application.add_handler(CommandHandler("demote", demote_command))
+        application.add_handler(CommandHandler("promote", promote_command, filters=NEW_MESSAGES))
+        application.add_handler(CommandHandler("title", title_command, filters=NEW_MESSAGES))
+        application.add_handler(CommandHandler("demote", demote_command, filters=NEW_MESSAGES))
         
-        application.add_handler(CommandHandler("ban", ban_command))
-        application.add_handler(CommandHandler("sban", sban_command))
-        application.add_handler(CommandHandler("gban", gban_command))
-        application.add_handler(CommandHandler("sgban", sgban_command))
+        application.add_handler(CommandHandler("ban", ban_command, filters=NEW_MESSAGES))
+        application.add_handler(CommandHandler("sban", sban_command, filters=NEW_MESSAGES))
+        application.add_handler(CommandHandler("gban", gban_command, filters=NEW_MESSAGES))
+        application.add_handler(CommandHandler("sgban", sgban_command, filters=NEW_MESSAGES))
         
-        application.add_handler(CommandHandler("unban", unban_command))
-        application.add_handler(CommandHandler("gunban", gunban_command))
-        application.add_handler(CommandHandler("banlist", banlist_command))
+        application.add_handler(CommandHandler("unban", unban_command, filters=NEW_MESSAGES))
+        application.add_handler(CommandHandler("gunban", gunban_command, filters=NEW_MESSAGES))
+        application.add_handler(CommandHandler("banlist", banlist_command, filters=NEW_MESSAGES))
         
-        application.add_handler(CommandHandler("kick", kick_command))
-        application.add_handler(CommandHandler("skick", skick_command))
-        application.add_handler(CommandHandler("gkick", gkick_command))
+        application.add_handler(CommandHandler("kick", kick_command, filters=NEW_MESSAGES))
+        application.add_handler(CommandHandler("skick", skick_command, filters=NEW_MESSAGES))
+        application.add_handler(CommandHandler("gkick", gkick_command, filters=NEW_MESSAGES))
         
-        application.add_handler(CommandHandler("mute", mute_command))
-        application.add_handler(CommandHandler("unmute", unmute_command))
-        application.add_handler(CommandHandler("smute", smute_command))
+        application.add_handler(CommandHandler("mute", mute_command, filters=NEW_MESSAGES))
+        application.add_handler(CommandHandler("unmute", unmute_command, filters=NEW_MESSAGES))
+        application.add_handler(CommandHandler("smute", smute_command, filters=NEW_MESSAGES))
         
         # Warning system commands
-        application.add_handler(CommandHandler("warn", warn_command))
-        application.add_handler(CommandHandler("gwarn", gwarn_command))
-        application.add_handler(CommandHandler("swarn", swarn_command))
-        application.add_handler(CommandHandler("unwarn", unwarn_command))
-        application.add_handler(CommandHandler("resetwarns", resetwarns_command))
-        application.add_handler(CommandHandler("warnings", warnings_command))
+        application.add_handler(CommandHandler("warn", warn_command, filters=NEW_MESSAGES))
+        application.add_handler(CommandHandler("gwarn", gwarn_command, filters=NEW_MESSAGES))
+        application.add_handler(CommandHandler("swarn", swarn_command, filters=NEW_MESSAGES))
+        application.add_handler(CommandHandler("unwarn", unwarn_command, filters=NEW_MESSAGES))
+        application.add_handler(CommandHandler("resetwarns", resetwarns_command, filters=NEW_MESSAGES))
+        application.add_handler(CommandHandler("warnings", warnings_command, filters=NEW_MESSAGES))
         
         # Whitelist system commands
-        application.add_handler(CommandHandler("whitelist", whitelist_command))
-        application.add_handler(CommandHandler("gwhitelist", gwhitelist_command))
-        application.add_handler(CommandHandler("unwhitelist", unwhitelist_command))
-        application.add_handler(CommandHandler("gunwhitelist", gunwhitelist_command))
-        application.add_handler(CommandHandler("whitelisted", whitelisted_command))
-        application.add_handler(CommandHandler("checkwhitelist", checkwhitelist_command))
+        application.add_handler(CommandHandler("whitelist", whitelist_command, filters=NEW_MESSAGES))
+        application.add_handler(CommandHandler("gwhitelist", gwhitelist_command, filters=NEW_MESSAGES))
+        application.add_handler(CommandHandler("unwhitelist", unwhitelist_command, filters=NEW_MESSAGES))
+        application.add_handler(CommandHandler("gunwhitelist", gunwhitelist_command, filters=NEW_MESSAGES))
+        application.add_handler(CommandHandler("whitelisted", whitelisted_command, filters=NEW_MESSAGES))
+        application.add_handler(CommandHandler("checkwhitelist", checkwhitelist_command, filters=NEW_MESSAGES))
         
         # User info commands
-        application.add_handler(CommandHandler("resetuser", resetuser_command))
-        application.add_handler(CommandHandler("resetrep", resetrep_command))
-        application.add_handler(CommandHandler("user", user_command))
-        application.add_handler(CommandHandler("lastactive", lastactive_command))
-        application.add_handler(CommandHandler("id", id_command))
-        application.add_handler(CommandHandler("chatinfo", chatinfo_command))
+        application.add_handler(CommandHandler("resetuser", resetuser_command, filters=NEW_MESSAGES))
+        application.add_handler(CommandHandler("resetrep", resetrep_command, filters=NEW_MESSAGES))
+        application.add_handler(CommandHandler("user", user_command, filters=NEW_MESSAGES))
+        application.add_handler(CommandHandler("lastactive", lastactive_command, filters=NEW_MESSAGES))
+        application.add_handler(CommandHandler("id", id_command, filters=NEW_MESSAGES))
+        application.add_handler(CommandHandler("chatinfo", chatinfo_command, filters=NEW_MESSAGES))
         
         # Verification commands
-        application.add_handler(CommandHandler("verify", verify_command))
+        application.add_handler(CommandHandler("verify", verify_command, filters=NEW_MESSAGES))
         
         # Help commands
-        application.add_handler(CommandHandler("help", help_command))
-        application.add_handler(CommandHandler("start", start_command))
-        application.add_handler(CommandHandler("about", about_command))
-        application.add_handler(CommandHandler("commands", commands_command))
+        application.add_handler(CommandHandler("help", help_command, filters=NEW_MESSAGES))
+        application.add_handler(CommandHandler("start", start_command, filters=NEW_MESSAGES))
+        application.add_handler(CommandHandler("about", about_command, filters=NEW_MESSAGES))
+        application.add_handler(CommandHandler("commands", commands_command, filters=NEW_MESSAGES))
         
         # Anti-flood commands
-        application.add_handler(CommandHandler("setflood", setflood_command))
-        application.add_handler(CommandHandler("setfloodmode", setfloodmode_command))
-        application.add_handler(CommandHandler("flood", flood_command))
+        application.add_handler(CommandHandler("setflood", setflood_command, filters=NEW_MESSAGES))
+        application.add_handler(CommandHandler("setfloodmode", setfloodmode_command, filters=NEW_MESSAGES))
+        application.add_handler(CommandHandler("flood", flood_command, filters=NEW_MESSAGES))
         
         # Filter commands
-        application.add_handler(CommandHandler("addfilter", addfilter_command))
-        application.add_handler(CommandHandler("removefilter", removefilter_command))
-        application.add_handler(CommandHandler("filters", filters_command))
-        application.add_handler(CommandHandler("lock", lock_command))
-        application.add_handler(CommandHandler("unlock", unlock_command))
-        application.add_handler(CommandHandler("locks", locks_command))
-        application.add_handler(CommandHandler("antispam", antispam_command))
+        application.add_handler(CommandHandler("addfilter", addfilter_command, filters=NEW_MESSAGES))
+        application.add_handler(CommandHandler("removefilter", removefilter_command, filters=NEW_MESSAGES))
+        application.add_handler(CommandHandler("filters", filters_command, filters=NEW_MESSAGES))
+        application.add_handler(CommandHandler("addspam", addspam_command, filters=NEW_MESSAGES))
+        application.add_handler(CommandHandler("removespam", removespam_command, filters=NEW_MESSAGES))
+        application.add_handler(CommandHandler("spampatterns", spampatterns_command, filters=NEW_MESSAGES))
+        application.add_handler(CommandHandler("lock", lock_command, filters=NEW_MESSAGES))
+        application.add_handler(CommandHandler("unlock", unlock_command, filters=NEW_MESSAGES))
+        application.add_handler(CommandHandler("locks", locks_command, filters=NEW_MESSAGES))
+        application.add_handler(CommandHandler("antispam", antispam_command, filters=NEW_MESSAGES))
         
         # Welcome system commands
-        application.add_handler(CommandHandler("setwelcome", setwelcome_command))
-        application.add_handler(CommandHandler("setgoodbye", setgoodbye_command))
-        application.add_handler(CommandHandler("welcome", welcome_command))
-        application.add_handler(CommandHandler("goodbye", goodbye_command))
-        application.add_handler(CommandHandler("captcha", captcha_command))
-        application.add_handler(CommandHandler("cleanservice", cleanservice_command))
+        application.add_handler(CommandHandler("setwelcome", setwelcome_command, filters=NEW_MESSAGES))
+        application.add_handler(CommandHandler("setgoodbye", setgoodbye_command, filters=NEW_MESSAGES))
+        application.add_handler(CommandHandler("welcome", welcome_command, filters=NEW_MESSAGES))
+        application.add_handler(CommandHandler("goodbye", goodbye_command, filters=NEW_MESSAGES))
+        application.add_handler(CommandHandler("captcha", captcha_command, filters=NEW_MESSAGES))
+        application.add_handler(CommandHandler("cleanservice", cleanservice_command, filters=NEW_MESSAGES))
         
         # Notes and rules commands
-        application.add_handler(CommandHandler("save", save_command))
-        application.add_handler(CommandHandler("get", get_command))
-        application.add_handler(CommandHandler("clear", clear_command))
-        application.add_handler(CommandHandler("notes", notes_command))
-        application.add_handler(CommandHandler("setrules", setrules_command))
-        application.add_handler(CommandHandler("rules", rules_command))
-        application.add_handler(CommandHandler("clearrules", clearrules_command))
+        application.add_handler(CommandHandler("save", save_command, filters=NEW_MESSAGES))
+        application.add_handler(CommandHandler("get", get_command, filters=NEW_MESSAGES))
+        application.add_handler(CommandHandler("clear", clear_command, filters=NEW_MESSAGES))
+        application.add_handler(CommandHandler("notes", notes_command, filters=NEW_MESSAGES))
+        application.add_handler(CommandHandler("setrules", setrules_command, filters=NEW_MESSAGES))
+        application.add_handler(CommandHandler("rules", rules_command, filters=NEW_MESSAGES))
+        application.add_handler(CommandHandler("clearrules", clearrules_command, filters=NEW_MESSAGES))
         
         # Report system commands
-        application.add_handler(CommandHandler("report", report_command))
-        application.add_handler(CommandHandler("reports", reports_command))
-        application.add_handler(CommandHandler("reporthistory", reporthistory_command))
+        application.add_handler(CommandHandler("report", report_command, filters=NEW_MESSAGES))
+        application.add_handler(CommandHandler("reports", reports_command, filters=NEW_MESSAGES))
+        application.add_handler(CommandHandler("reporthistory", reporthistory_command, filters=NEW_MESSAGES))
         
         # Advanced feature commands
-        application.add_handler(CommandHandler("setlang", setlang_command))
-        application.add_handler(CommandHandler("nightmode", nightmode_command))
-        application.add_handler(CommandHandler("slowmode", slowmode_command))
-        application.add_handler(CommandHandler("addcmd", addcmd_command))
-        application.add_handler(CommandHandler("delcmd", delcmd_command))
-        application.add_handler(CommandHandler("listcmds", listcmds_command))
-        application.add_handler(CommandHandler("cleanup", cleanup_command))
-        application.add_handler(CommandHandler("backup", backup_command))
+        application.add_handler(CommandHandler("setlang", setlang_command, filters=NEW_MESSAGES))
+        application.add_handler(CommandHandler("nightmode", nightmode_command, filters=NEW_MESSAGES))
+        application.add_handler(CommandHandler("slowmode", slowmode_command, filters=NEW_MESSAGES))
+        application.add_handler(CommandHandler("addcmd", addcmd_command, filters=NEW_MESSAGES))
+        application.add_handler(CommandHandler("delcmd", delcmd_command, filters=NEW_MESSAGES))
+        application.add_handler(CommandHandler("listcmds", listcmds_command, filters=NEW_MESSAGES))
+        application.add_handler(CommandHandler("cleanup", cleanup_command, filters=NEW_MESSAGES))
+        application.add_handler(CommandHandler("backup", backup_command, filters=NEW_MESSAGES))
         
         # Event handlers
         application.add_handler(MessageHandler(
-            filters.StatusUpdate.NEW_CHAT_MEMBERS, 
+            NEW_MESSAGES & filters.StatusUpdate.NEW_CHAT_MEMBERS, 
             handle_new_member_welcome
         ))
         
         application.add_handler(MessageHandler(
-            filters.StatusUpdate.LEFT_CHAT_MEMBER, 
+            NEW_MESSAGES & filters.StatusUpdate.LEFT_CHAT_MEMBER, 
             handle_left_member_goodbye
         ))
         
         # Handle bot being added to chat
         application.add_handler(MessageHandler(
-            filters.StatusUpdate.NEW_CHAT_MEMBERS & filters.User(user_id=None),  # Will be set to bot's ID
+            NEW_MESSAGES & filters.StatusUpdate.NEW_CHAT_MEMBERS & filters.User(user_id=None),  # Will be set to bot's ID
             handle_bot_added_to_chat
         ))
         
         # Handle forwarded messages for verification (private chats only)
         application.add_handler(MessageHandler(
-            filters.FORWARDED & filters.ChatType.PRIVATE,
+            NEW_MESSAGES & filters.FORWARDED & filters.ChatType.PRIVATE,
             handle_forwarded_message
         ))
         
@@ -296,34 +345,49 @@ async def main():
             pattern=r"^report_"
         ))
         
-        # General message handler (should be last)
+        # General message handler for text and media (should be last)
         application.add_handler(MessageHandler(
-            filters.TEXT & ~filters.COMMAND,
+            NEW_MESSAGES & ~filters.COMMAND & ~filters.StatusUpdate.ALL,
             handle_all_messages
         ))
         
-        # Media message handler for filters
+        # Commands no built-in handler took: this chat's custom commands
         application.add_handler(MessageHandler(
-            ~filters.COMMAND & ~filters.StatusUpdate.ALL,
-            handle_all_messages
+            NEW_MESSAGES & filters.COMMAND,
+            handle_custom_command
         ))
         
         # Error handler
         application.add_error_handler(error_handler)
         
+        # Each handler once and for new messages only; subscribe to just the update types handled
+        allowed_updates = route_updates(application)
+        
         logger.info("Bot handlers registered successfully")
         
         # Start the bot
         logger.info("🤖 Starting Telegram Admin Bot...")
-        await application.run_polling(
-            allowed_updates=Update.ALL_TYPES,
-            drop_pending_updates=True
-        )
-        
+        if Config.UPDATE_MODE == 'webhook':
+            # Telegram sends WEBHOOK_SECRET with every update; requests without it are refused
+            application.run_webhook(
+                listen=Config.WEBHOOK_LISTEN,
+                port=Config.WEBHOOK_PORT,
+                url_path=Config.WEBHOOK_PATH.lstrip('/'),
+                webhook_url=Config.WEBHOOK_URL,
+                secret_token=Config.WEBHOOK_SECRET,
+                max_connections=Config.WEBHOOK_MAX_CONNECTIONS,
+                allowed_updates=allowed_updates,
+                drop_pending_updates=Config.DROP_PENDING_UPDATES
+            )
+        else:
+            application.run_polling(
+                allowed_updates=allowed_updates,
+                drop_pending_updates=Config.DROP_PENDING_UPDATES
+            )
+    
     except Exception as e:
         logger.error(f"Failed to start bot: {e}")
         raise
 
 if __name__ == '__main__':
-    import asyncio
-    asyncio.run(main())
\ No newline at end of file
+    main()
\ No newline at end of file
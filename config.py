@@ -13,7 +13,72 @@ class Config:
     # Bot settings
     MAX_WARNINGS = 3
     DEFAULT_MUTE_TIME = 3600  # 1 hour in seconds
-    PURGE_LIMIT = 100  # Maximum messages to purge at once
+    PURGE_LIMIT = int(os.getenv('PURGE_LIMIT', 10000))  # Maximum messages to purge at once
+    PURGE_CONCURRENCY = int(os.getenv('PURGE_CONCURRENCY', 4))  # deleteMessages calls in flight
+    
+    # Database engine tuning (pool settings apply to server databases and file-backed SQLite)
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))
+    DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 10))
+    DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 1800))  # seconds
+    DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', 30))  # seconds
+    SQLITE_JOURNAL_MODE = os.getenv('SQLITE_JOURNAL_MODE', 'WAL')
+    SQLITE_SYNCHRONOUS = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')
+    SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))  # bytes
+    SQLITE_BUSY_TIMEOUT = int(os.getenv('SQLITE_BUSY_TIMEOUT', 5000))  # milliseconds
+    
+    # Admin/ban/whitelist status cache
+    STATUS_CACHE_TTL = int(os.getenv('STATUS_CACHE_TTL', 300))  # seconds
+    STATUS_CACHE_MAX_ENTRIES = int(os.getenv('STATUS_CACHE_MAX_ENTRIES', 50000))  # memory ceiling
+    
+    # Capacity of the in-memory report cooldown and night mode warning stores
+    REPORT_COOLDOWN_MAX_ENTRIES = int(os.getenv('REPORT_COOLDOWN_MAX_ENTRIES', 50000))
+    NIGHT_WARNING_MAX_ENTRIES = int(os.getenv('NIGHT_WARNING_MAX_ENTRIES', 50000))
+    
+    # Chats whose custom command and note names are kept in memory, and the bytes of responses and notes cached
+    NAME_INDEX_MAX_CHATS = int(os.getenv('NAME_INDEX_MAX_CHATS', 10000))
+    NAME_INDEX_BODY_BYTES = int(os.getenv('NAME_INDEX_BODY_BYTES', 4 * 1024 * 1024))
+    
+    # Outbound Bot API requests: requests per second overall, messages per minute per group, RetryAfter retries
+    OUTBOUND_GLOBAL_RATE = float(os.getenv('OUTBOUND_GLOBAL_RATE', 30))
+    OUTBOUND_GROUP_RATE = float(os.getenv('OUTBOUND_GROUP_RATE', 20))
+    OUTBOUND_MAX_RETRIES = int(os.getenv('OUTBOUND_MAX_RETRIES', 3))
+    
+    # Global gban/gkick/gunban: parallel calls, Telegram calls per second and seconds between progress edits
+    FANOUT_CONCURRENCY = int(os.getenv('FANOUT_CONCURRENCY', 8))
+    FANOUT_RATE = float(os.getenv('FANOUT_RATE', 25))
+    FANOUT_PROGRESS_INTERVAL = float(os.getenv('FANOUT_PROGRESS_INTERVAL', 3))
+    
+    # How updates arrive: 'polling' or 'webhook' (Telegram posts to WEBHOOK_URL, forwarded to WEBHOOK_LISTEN:WEBHOOK_PORT)
+    UPDATE_MODE = os.getenv('UPDATE_MODE', 'polling').lower()
+    WEBHOOK_URL = os.getenv('WEBHOOK_URL')
+    WEBHOOK_LISTEN = os.getenv('WEBHOOK_LISTEN', '127.0.0.1')
+    WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', 8080))
+    WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/telegram')
+    WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET')
+    WEBHOOK_MAX_CONNECTIONS = int(os.getenv('WEBHOOK_MAX_CONNECTIONS', 40))
+    # Updates left from before a restart are dropped unless this is set to false
+    DROP_PENDING_UPDATES = os.getenv('DROP_PENDING_UPDATES', 'true').lower() == 'true'
+    # Updates are sharded by chat onto this many ordered workers, each queueing at most UPDATE_SHARD_DEPTH updates
+    UPDATE_SHARDS = int(os.getenv('UPDATE_SHARDS', 8))
+    UPDATE_SHARD_DEPTH = int(os.getenv('UPDATE_SHARD_DEPTH', 64))
+    
+    # New members are buffered per chat for this many seconds and handled as one batch
+    JOIN_BATCH_WINDOW = float(os.getenv('JOIN_BATCH_WINDOW', 2))
+    # A chat's batch is handled early once this many members are waiting
+    JOIN_BATCH_MAX = int(os.getenv('JOIN_BATCH_MAX', 200))
+    
+    # Seconds between passes that kick users whose captcha expired
+    CAPTCHA_SWEEP_INTERVAL = float(os.getenv('CAPTCHA_SWEEP_INTERVAL', 10))
+    
+    # Seconds between polls for flood settings changed by other bot processes (0 disables)
+    FLOOD_SETTINGS_REFRESH_INTERVAL = float(os.getenv('FLOOD_SETTINGS_REFRESH_INTERVAL', 60))
+    
+    # Messages whose summed spam rule weights reach this score are deleted
+    SPAM_SCORE_THRESHOLD = float(os.getenv('SPAM_SCORE_THRESHOLD', 1.0))
+    
+    # User activity write-behind buffer
+    USER_ACTIVITY_FLUSH_INTERVAL = float(os.getenv('USER_ACTIVITY_FLUSH_INTERVAL', 30))  # seconds
+    USER_ACTIVITY_MAX_PENDING = int(os.getenv('USER_ACTIVITY_MAX_PENDING', 1000))  # users before an early flush
     
     @classmethod
     def validate(cls):
@@ -23,4 +88,8 @@ class Config:
         if not cls.BOT_USERNAME:
             raise ValueError("BOT_USERNAME is required")
         if cls.SUPER_ADMIN_ID == 0:
-            raise ValueError("SUPER_ADMIN_ID is required")
\ No newline at end of file
+            raise ValueError("SUPER_ADMIN_ID is required")
+        if cls.UPDATE_MODE not in ('polling', 'webhook'):
+            raise ValueError("UPDATE_MODE must be 'polling' or 'webhook'")
+        if cls.UPDATE_MODE == 'webhook' and not cls.WEBHOOK_URL:
+            raise ValueError("WEBHOOK_URL is required in webhook mode")
\ No newline at end of file
@@ -1,9 +1,16 @@
-from sqlalchemy import create_engine, Column, Integer, String, Boolean, DateTime, Text, BigInteger
+from sqlalchemy import create_engine, Column, Integer, String, Boolean, DateTime, Text, BigInteger, Index
+from sqlalchemy import select, delete, make_url, event
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy import func as sql_func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.sql import func
 from datetime import datetime, timedelta
 from config import Config
+from services.status_cache import status_cache, MISSING
 
 Base = declarative_base()
 
@@ -40,6 +47,11 @@ class Admin(Base):
     title = Column(String(255))
     is_super_admin = Column(Boolean, default=False)
     created_at = Column(DateTime, default=func.now())
+    
+    __table_args__ = (
+        Index('ix_admins_user_chat', 'user_id', 'chat_id'),
+        Index('ix_admins_chat', 'chat_id'),
+    )
 
 class Ban(Base):
     __tablename__ = 'bans'
@@ -51,6 +63,12 @@ class Ban(Base):
     reason = Column(Text)
     is_global = Column(Boolean, default=False)
     created_at = Column(DateTime, default=func.now())
+    
+    __table_args__ = (
+        Index('ix_bans_user_chat', 'user_id', 'chat_id'),
+        Index('ix_bans_chat', 'chat_id'),
+        Index('ix_bans_global_user', 'user_id', sqlite_where=is_global == True, postgresql_where=is_global == True),
+    )
 
 class Warning(Base):
     __tablename__ = 'warnings'
@@ -62,6 +80,11 @@ class Warning(Base):
     reason = Column(Text)
     is_global = Column(Boolean, default=False)
     created_at = Column(DateTime, default=func.now())
+    
+    __table_args__ = (
+        Index('ix_warnings_user_chat', 'user_id', 'chat_id'),
+        Index('ix_warnings_global_user', 'user_id', sqlite_where=is_global == True, postgresql_where=is_global == True),
+    )
 
 class Mute(Base):
     __tablename__ = 'mutes'
@@ -73,6 +96,11 @@ class Mute(Base):
     reason = Column(Text)
     until = Column(DateTime)
     created_at = Column(DateTime, default=func.now())
+    
+    __table_args__ = (
+        Index('ix_mutes_user_chat_until', 'user_id', 'chat_id', 'until'),
+        Index('ix_mutes_chat_until', 'chat_id', 'until'),
+    )
 
 class Whitelist(Base):
     __tablename__ = 'whitelist'
@@ -83,10 +111,70 @@ class Whitelist(Base):
     added_by = Column(BigInteger)
     is_global = Column(Boolean, default=False)
     created_at = Column(DateTime, default=func.now())
+    
+    __table_args__ = (
+        Index('ix_whitelist_user_chat', 'user_id', 'chat_id'),
+        Index('ix_whitelist_chat', 'chat_id'),
+        Index('ix_whitelist_global_user', 'user_id', sqlite_where=is_global == True, postgresql_where=is_global == True),
+    )
+
+class ScheduledDeletion(Base):
+    __tablename__ = 'scheduled_deletions'
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    chat_id = Column(BigInteger)
+    message_id = Column(Integer)
+    delete_at = Column(DateTime)
+    
+    __table_args__ = (
+        Index('ix_scheduled_deletions_delete_at', 'delete_at'),
+    )
+
+def is_sqlite_memory(url) -> bool:
+    return url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
+
+def is_sqlite_file(url) -> bool:
+    return url.get_backend_name() == 'sqlite' and not is_sqlite_memory(url)
+
+def engine_options(database_url: str) -> dict:
+    """Pool keyword arguments for create_engine/create_async_engine"""
+    url = make_url(database_url)
+    if is_sqlite_memory(url):
+        # In-memory SQLite needs its single shared connection
+        return {}
+    
+    options = {
+        'pool_size': Config.DB_POOL_SIZE,
+        'max_overflow': Config.DB_MAX_OVERFLOW,
+        'pool_timeout': Config.DB_POOL_TIMEOUT,
+    }
+    if url.get_backend_name() != 'sqlite':
+        # Drop connections the server or a proxy may have closed
+        options['pool_recycle'] = Config.DB_POOL_RECYCLE
+        options['pool_pre_ping'] = True
+    return options
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Per-connection SQLite settings so bot writers and dashboard readers don't block each other"""
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"PRAGMA journal_mode={Config.SQLITE_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA synchronous={Config.SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA mmap_size={int(Config.SQLITE_MMAP_SIZE)}")
+        cursor.execute(f"PRAGMA busy_timeout={int(Config.SQLITE_BUSY_TIMEOUT)}")
+    finally:
+        cursor.close()
+
+def build_engine(database_url: str):
+    """Create the sync engine with pool settings and SQLite pragmas applied"""
+    engine = create_engine(database_url, **engine_options(database_url))
+    if is_sqlite_file(make_url(database_url)):
+        event.listen(engine, 'connect', set_sqlite_pragmas)
+    return engine
 
 class DatabaseManager:
     def __init__(self, database_url: str):
-        self.engine = create_engine(database_url)
+        self.engine = build_engine(database_url)
         self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
         Base.metadata.create_all(bind=self.engine)
     
@@ -128,18 +216,27 @@ class DatabaseManager:
             session.close()
     
     def is_admin(self, user_id: int, chat_id: int = None):
+        if user_id == Config.SUPER_ADMIN_ID:
+            return True
+        
+        key = ('admin', user_id, chat_id or None)
+        cached = status_cache.get(key)
+        if cached is not MISSING:
+            return cached
+        
+        version = status_cache.version
         session = self.get_session()
         try:
-            if user_id == Config.SUPER_ADMIN_ID:
-                return True
-            
             query = session.query(Admin).filter(Admin.user_id == user_id)
             if chat_id:
                 query = query.filter(Admin.chat_id == chat_id)
             
-            return query.first() is not None
+            result = query.first() is not None
         finally:
             session.close()
+        
+        status_cache.put(key, result, version)
+        return result
     
     def add_admin(self, user_id: int, chat_id: int, title: str = None):
         session = self.get_session()
@@ -157,6 +254,7 @@ class DatabaseManager:
             return False
         finally:
             session.close()
+            status_cache.invalidate('admin', user_id, chat_id)
     
     def remove_admin(self, user_id: int, chat_id: int):
         session = self.get_session()
@@ -173,8 +271,15 @@ class DatabaseManager:
             return False
         finally:
             session.close()
+            status_cache.invalidate('admin', user_id, chat_id)
     
     def is_banned(self, user_id: int, chat_id: int = None):
+        key = ('ban', user_id, chat_id or None)
+        cached = status_cache.get(key)
+        if cached is not MISSING:
+            return cached
+        
+        version = status_cache.version
         session = self.get_session()
         try:
             query = session.query(Ban).filter(Ban.user_id == user_id)
@@ -183,9 +288,12 @@ class DatabaseManager:
             else:
                 query = query.filter(Ban.is_global == True)
             
-            return query.first() is not None
+            result = query.first() is not None
         finally:
             session.close()
+        
+        status_cache.put(key, result, version)
+        return result
     
     def add_ban(self, user_id: int, chat_id: int, banned_by: int, reason: str = None, is_global: bool = False):
         session = self.get_session()
@@ -201,6 +309,7 @@ class DatabaseManager:
             session.commit()
         finally:
             session.close()
+            status_cache.invalidate('ban', user_id, None if is_global else chat_id)
     
     def remove_ban(self, user_id: int, chat_id: int = None, is_global: bool = False):
         session = self.get_session()
@@ -218,6 +327,7 @@ class DatabaseManager:
             return len(bans) > 0
         finally:
             session.close()
+            status_cache.invalidate('ban', user_id, None if is_global else chat_id)
     
     def get_warnings_count(self, user_id: int, chat_id: int):
         session = self.get_session()
@@ -320,6 +430,12 @@ class DatabaseManager:
             session.close()
     
     def is_whitelisted(self, user_id: int, chat_id: int = None):
+        key = ('whitelist', user_id, chat_id or None)
+        cached = status_cache.get(key)
+        if cached is not MISSING:
+            return cached
+        
+        version = status_cache.version
         session = self.get_session()
         try:
             query = session.query(Whitelist).filter(Whitelist.user_id == user_id)
@@ -328,9 +444,12 @@ class DatabaseManager:
             else:
                 query = query.filter(Whitelist.is_global == True)
             
-            return query.first() is not None
+            result = query.first() is not None
         finally:
             session.close()
+        
+        status_cache.put(key, result, version)
+        return result
     
     def add_whitelist(self, user_id: int, chat_id: int, added_by: int, is_global: bool = False):
         session = self.get_session()
@@ -354,6 +473,7 @@ class DatabaseManager:
             return False
         finally:
             session.close()
+            status_cache.invalidate('whitelist', user_id, None if is_global else chat_id)
     
     def remove_whitelist(self, user_id: int, chat_id: int = None, is_global: bool = False):
         session = self.get_session()
@@ -371,6 +491,7 @@ class DatabaseManager:
             return len(whitelists) > 0
         finally:
             session.close()
+            status_cache.invalidate('whitelist', user_id, None if is_global else chat_id)
     
     def add_mute(self, user_id: int, chat_id: int, muted_by: int, duration: int, reason: str = None):
         """Add a mute record"""
@@ -423,5 +544,427 @@ class DatabaseManager:
         finally:
             session.close()
 
-# Global database instance
-db = DatabaseManager(Config.DATABASE_URL)
\ No newline at end of file
+# Async drivers used for each sync dialect in DATABASE_URL
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+asyncpg',
+    'mysql': 'mysql+aiomysql',
+}
+
+# Dialect-specific INSERT constructs that support ON CONFLICT DO UPDATE
+UPSERT_INSERTS = {
+    'sqlite': sqlite_insert,
+    'postgresql': postgresql_insert,
+}
+
+# Rows per multi-row INSERT; keeps bound parameters under SQLite's limit
+UPSERT_BATCH_SIZE = 500
+
+def to_async_url(database_url: str) -> str:
+    """Rewrite a sync DATABASE_URL to use the matching asyncio driver"""
+    url = make_url(database_url)
+    if url.get_backend_name() in ASYNC_DRIVERS and url.get_driver_name() in ('', 'pysqlite', 'psycopg2', 'pymysql'):
+        url = url.set(drivername=ASYNC_DRIVERS[url.get_backend_name()])
+    return url.render_as_string(hide_password=False)
+
+def build_async_engine(database_url: str):
+    """Create the async engine with the same pool settings and SQLite pragmas as build_engine"""
+    sqlite_file = is_sqlite_file(make_url(database_url))
+    options = engine_options(database_url)
+    if sqlite_file:
+        # aiosqlite defaults to NullPool, which opens a connection and thread per session
+        options['poolclass'] = AsyncAdaptedQueuePool
+    
+    engine = create_async_engine(to_async_url(database_url), **options)
+    if sqlite_file:
+        event.listen(engine.sync_engine, 'connect', set_sqlite_pragmas)
+    return engine
+
+class AsyncDatabaseManager:
+    """
+    Awaitable counterpart of DatabaseManager built on an AsyncEngine.
+    Handlers use this so database I/O never blocks the event loop; the sync
+    manager stays for schema creation, the web dashboard and scripts.
+    """
+    def __init__(self, database_url: str):
+        self.engine = build_async_engine(database_url)
+        self.SessionLocal = async_sessionmaker(self.engine, autoflush=False, expire_on_commit=False)
+    
+    def get_session(self):
+        return self.SessionLocal()
+    
+    async def run_sync(self, fn):
+        """Run fn(session) with a sync-style Session on the async engine"""
+        async with self.get_session() as session:
+            return await session.run_sync(fn)
+    
+    async def get_or_create_chat(self, chat_id: int, title: str = None):
+        async with self.get_session() as session:
+            chat = await session.get(Chat, chat_id)
+            if not chat:
+                chat = Chat(id=chat_id, title=title)
+                session.add(chat)
+                await session.commit()
+            elif title and chat.title != title:
+                chat.title = title
+                await session.commit()
+            return chat
+    
+    async def count_chats(self) -> int:
+        async with self.get_session() as session:
+            return await session.scalar(select(sql_func.count(Chat.id)))
+    
+    async def iter_chat_ids(self, batch_size: int = 500):
+        """Yield every registered chat id, fetched in keyset-paginated batches"""
+        last_id = None
+        while True:
+            query = select(Chat.id).order_by(Chat.id).limit(batch_size)
+            if last_id is not None:
+                query = query.where(Chat.id > last_id)
+            async with self.get_session() as session:
+                chat_ids = (await session.scalars(query)).all()
+            for chat_id in chat_ids:
+                yield chat_id
+            if len(chat_ids) < batch_size:
+                return
+            last_id = chat_ids[-1]
+    
+    async def get_or_create_user(self, user_id: int, username: str = None, first_name: str = None, last_name: str = None):
+        insert = UPSERT_INSERTS.get(self.engine.dialect.name)
+        if insert:
+            # Insert or refresh the user in a single statement
+            stmt = insert(User).values(
+                id=user_id, username=username, first_name=first_name, last_name=last_name
+            )
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[User.id],
+                set_={
+                    'username': stmt.excluded.username,
+                    'first_name': stmt.excluded.first_name,
+                    'last_name': stmt.excluded.last_name,
+                    'last_active': datetime.now(),
+                    'updated_at': sql_func.now(),
+                }
+            ).returning(User)
+            async with self.get_session() as session:
+                user = (await session.scalars(stmt)).one()
+                await session.commit()
+                return user
+        
+        async with self.get_session() as session:
+            user = await session.get(User, user_id)
+            if not user:
+                user = User(id=user_id, username=username, first_name=first_name, last_name=last_name)
+                session.add(user)
+            else:
+                # Update user info
+                user.username = username
+                user.first_name = first_name
+                user.last_name = last_name
+                user.last_active = datetime.now()
+            await session.commit()
+            return user
+    
+    async def upsert_users(self, users: list, update_profile: bool = True):
+        """
+        Insert or refresh many users in one transaction. Each entry is a dict with
+        id, username, first_name, last_name and last_active; existing rows only get
+        their profile columns rewritten when update_profile is set.
+        """
+        if not users:
+            return
+        
+        insert = UPSERT_INSERTS.get(self.engine.dialect.name)
+        async with self.get_session() as session:
+            if insert:
+                for start in range(0, len(users), UPSERT_BATCH_SIZE):
+                    stmt = insert(User).values(users[start:start + UPSERT_BATCH_SIZE])
+                    set_ = {'last_active': stmt.excluded.last_active}
+                    if update_profile:
+                        set_.update({
+                            'username': stmt.excluded.username,
+                            'first_name': stmt.excluded.first_name,
+                            'last_name': stmt.excluded.last_name,
+                            'updated_at': sql_func.now(),
+                        })
+                    await session.execute(stmt.on_conflict_do_update(index_elements=[User.id], set_=set_))
+            else:
+                for values in users:
+                    user = await session.get(User, values['id'])
+                    if not user:
+                        session.add(User(**values))
+                        continue
+                    user.last_active = values['last_active']
+                    if update_profile:
+                        user.username = values['username']
+                        user.first_name = values['first_name']
+                        user.last_name = values['last_name']
+            await session.commit()
+    
+    async def _load_status(self, key: tuple, query):
+        """Run an existence query for a status predicate and cache the answer"""
+        version = status_cache.version
+        async with self.get_session() as session:
+            result = (await session.execute(query.limit(1))).first() is not None
+        status_cache.put(key, result, version)
+        return result
+    
+    async def is_admin(self, user_id: int, chat_id: int = None):
+        if user_id == Config.SUPER_ADMIN_ID:
+            return True
+        
+        key = ('admin', user_id, chat_id or None)
+        cached = status_cache.get(key)
+        if cached is not MISSING:
+            return cached
+        
+        query = select(Admin.id).where(Admin.user_id == user_id)
+        if chat_id:
+            query = query.where(Admin.chat_id == chat_id)
+        
+        return await self._load_status(key, query)
+    
+    async def add_admin(self, user_id: int, chat_id: int, title: str = None):
+        async with self.get_session() as session:
+            existing = (await session.execute(
+                select(Admin.id).where(Admin.user_id == user_id, Admin.chat_id == chat_id).limit(1)
+            )).first()
+            
+            if not existing:
+                session.add(Admin(user_id=user_id, chat_id=chat_id, title=title))
+                await session.commit()
+            status_cache.invalidate('admin', user_id, chat_id)
+            return not existing
+    
+    async def remove_admin(self, user_id: int, chat_id: int):
+        async with self.get_session() as session:
+            admin = (await session.execute(
+                select(Admin).where(Admin.user_id == user_id, Admin.chat_id == chat_id).limit(1)
+            )).scalar()
+            
+            if admin:
+                await session.delete(admin)
+                await session.commit()
+            status_cache.invalidate('admin', user_id, chat_id)
+            return admin is not None
+    
+    async def is_banned(self, user_id: int, chat_id: int = None):
+        key = ('ban', user_id, chat_id or None)
+        cached = status_cache.get(key)
+        if cached is not MISSING:
+            return cached
+        
+        query = select(Ban.id).where(Ban.user_id == user_id)
+        if chat_id:
+            query = query.where((Ban.chat_id == chat_id) | (Ban.is_global == True))
+        else:
+            query = query.where(Ban.is_global == True)
+        
+        return await self._load_status(key, query)
+    
+    async def banned_user_ids(self, user_ids: list, chat_id: int = None) -> set:
+        """
+        The user_ids that is_banned() would report as banned, looked up with one
+        IN query per UPSERT_BATCH_SIZE ids; the answers are cached like is_banned().
+        """
+        user_ids = list(dict.fromkeys(user_ids))
+        banned, missing = set(), []
+        for user_id in user_ids:
+            cached = status_cache.get(('ban', user_id, chat_id or None))
+            if cached is MISSING:
+                missing.append(user_id)
+            elif cached:
+                banned.add(user_id)
+        
+        version = status_cache.version
+        async with self.get_session() as session:
+            for start in range(0, len(missing), UPSERT_BATCH_SIZE):
+                batch = missing[start:start + UPSERT_BATCH_SIZE]
+                query = select(Ban.user_id).where(Ban.user_id.in_(batch)).distinct()
+                if chat_id:
+                    query = query.where((Ban.chat_id == chat_id) | (Ban.is_global == True))
+                else:
+                    query = query.where(Ban.is_global == True)
+                found = set((await session.scalars(query)).all())
+                for user_id in batch:
+                    status_cache.put(('ban', user_id, chat_id or None), user_id in found, version)
+                banned |= found
+        return banned
+    
+    async def add_ban(self, user_id: int, chat_id: int, banned_by: int, reason: str = None, is_global: bool = False):
+        async with self.get_session() as session:
+            session.add(Ban(
+                user_id=user_id,
+                chat_id=chat_id,
+                banned_by=banned_by,
+                reason=reason,
+                is_global=is_global
+            ))
+            await session.commit()
+        status_cache.invalidate('ban', user_id, None if is_global else chat_id)
+    
+    async def remove_ban(self, user_id: int, chat_id: int = None, is_global: bool = False):
+        query = delete(Ban).where(Ban.user_id == user_id)
+        if is_global:
+            query = query.where(Ban.is_global == True)
+        elif chat_id:
+            query = query.where(Ban.chat_id == chat_id)
+        
+        async with self.get_session() as session:
+            result = await session.execute(query)
+            await session.commit()
+        status_cache.invalidate('ban', user_id, None if is_global else chat_id)
+        return result.rowcount > 0
+    
+    async def get_warnings_count(self, user_id: int, chat_id: int):
+        async with self.get_session() as session:
+            return await session.scalar(
+                select(sql_func.count(Warning.id)).where(
+                    Warning.user_id == user_id,
+                    (Warning.chat_id == chat_id) | (Warning.is_global == True)
+                )
+            )
+    
+    async def add_warning(self, user_id: int, chat_id: int, warned_by: int, reason: str = None, is_global: bool = False):
+        async with self.get_session() as session:
+            session.add(Warning(
+                user_id=user_id,
+                chat_id=chat_id,
+                warned_by=warned_by,
+                reason=reason,
+                is_global=is_global
+            ))
+            await session.commit()
+    
+    async def remove_warning(self, user_id: int, chat_id: int):
+        async with self.get_session() as session:
+            warning = (await session.execute(
+                select(Warning).where(
+                    Warning.user_id == user_id,
+                    Warning.chat_id == chat_id
+                ).order_by(Warning.created_at.desc()).limit(1)
+            )).scalar()
+            
+            if warning:
+                await session.delete(warning)
+                await session.commit()
+                return True
+            return False
+    
+    async def reset_warnings(self, user_id: int, chat_id: int):
+        async with self.get_session() as session:
+            result = await session.execute(
+                delete(Warning).where(Warning.user_id == user_id, Warning.chat_id == chat_id)
+            )
+            await session.commit()
+            return result.rowcount
+    
+    async def is_muted(self, user_id: int, chat_id: int):
+        async with self.get_session() as session:
+            return (await session.execute(
+                select(Mute.id).where(
+                    Mute.user_id == user_id,
+                    Mute.chat_id == chat_id,
+                    Mute.until > datetime.now()
+                ).limit(1)
+            )).first() is not None
+    
+    async def add_mute(self, user_id: int, chat_id: int, muted_by: int, duration: int, reason: str = None):
+        async with self.get_session() as session:
+            session.add(Mute(
+                user_id=user_id,
+                chat_id=chat_id,
+                muted_by=muted_by,
+                reason=reason,
+                until=datetime.now() + timedelta(seconds=duration)
+            ))
+            await session.commit()
+    
+    async def remove_mute(self, user_id: int, chat_id: int):
+        async with self.get_session() as session:
+            result = await session.execute(
+                delete(Mute).where(Mute.user_id == user_id, Mute.chat_id == chat_id)
+            )
+            await session.commit()
+            return result.rowcount > 0
+    
+    async def is_whitelisted(self, user_id: int, chat_id: int = None):
+        key = ('whitelist', user_id, chat_id or None)
+        cached = status_cache.get(key)
+        if cached is not MISSING:
+            return cached
+        
+        query = select(Whitelist.id).where(Whitelist.user_id == user_id)
+        if chat_id:
+            query = query.where((Whitelist.chat_id == chat_id) | (Whitelist.is_global == True))
+        else:
+            query = query.where(Whitelist.is_global == True)
+        
+        return await self._load_status(key, query)
+    
+    async def add_whitelist(self, user_id: int, chat_id: int, added_by: int, is_global: bool = False):
+        async with self.get_session() as session:
+            existing = (await session.execute(
+                select(Whitelist.id).where(
+                    Whitelist.user_id == user_id,
+                    Whitelist.chat_id == chat_id,
+                    Whitelist.is_global == is_global
+                ).limit(1)
+            )).first()
+            
+            if not existing:
+                session.add(Whitelist(
+                    user_id=user_id,
+                    chat_id=chat_id,
+                    added_by=added_by,
+                    is_global=is_global
+                ))
+                await session.commit()
+            status_cache.invalidate('whitelist', user_id, None if is_global else chat_id)
+            return not existing
+    
+    async def remove_whitelist(self, user_id: int, chat_id: int = None, is_global: bool = False):
+        query = delete(Whitelist).where(Whitelist.user_id == user_id)
+        if is_global:
+            query = query.where(Whitelist.is_global == True)
+        elif chat_id:
+            query = query.where(Whitelist.chat_id == chat_id)
+        
+        async with self.get_session() as session:
+            result = await session.execute(query)
+            await session.commit()
+        status_cache.invalidate('whitelist', user_id, None if is_global else chat_id)
+        return result.rowcount > 0
+    
+    async def add_spam_pattern(self, chat_id: int, pattern: str, weight: float, created_by: int) -> int:
+        """Store a chat's spam pattern; returns its id"""
+        # Filter models are defined with their handlers, which import this module
+        from handlers.filters import SpamPattern
+        
+        async with self.get_session() as session:
+            spam_pattern = SpamPattern(chat_id=chat_id, pattern=pattern, weight=weight, created_by=created_by)
+            session.add(spam_pattern)
+            await session.commit()
+            return spam_pattern.id
+    
+    async def remove_spam_pattern(self, chat_id: int, pattern_id: int) -> bool:
+        from handlers.filters import SpamPattern
+        
+        async with self.get_session() as session:
+            result = await session.execute(
+                delete(SpamPattern).where(SpamPattern.chat_id == chat_id, SpamPattern.id == pattern_id)
+            )
+            await session.commit()
+            return result.rowcount > 0
+    
+    async def get_spam_patterns(self, chat_id: int) -> list:
+        from handlers.filters import SpamPattern
+        
+        async with self.get_session() as session:
+            return (await session.scalars(
+                select(SpamPattern).where(SpamPattern.chat_id == chat_id).order_by(SpamPattern.id)
+            )).all()
+
+# Global database instances
+db = DatabaseManager(Config.DATABASE_URL)
+async_db = AsyncDatabaseManager(Config.DATABASE_URL)
\ No newline at end of file
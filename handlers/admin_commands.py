@@ -1,9 +1,14 @@
 from telegram import Update
 from telegram.ext import ContextTypes
 from telegram.constants import ChatMemberStatus
-from database import db
+from database import async_db, Chat, User
 from utils import is_admin_command, is_group_command, get_file_id_from_message
+from services.status_cache import status_cache
+from services.outbound import outbound
+from services.fanout import purge_messages, purged_count, DELETE_BATCH_SIZE
+from services.deletion_scheduler import schedule_delete, deletions
 import logging
+from sqlalchemy import select
 
 logger = logging.getLogger(__name__)
 
@@ -37,11 +42,11 @@ async def activate_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     # Register chat and user
-    db.get_or_create_chat(chat.id, chat.title)
-    db.get_or_create_user(user.id, user.username, user.first_name, user.last_name)
+    await async_db.get_or_create_chat(chat.id, chat.title)
+    await async_db.get_or_create_user(user.id, user.username, user.first_name, user.last_name)
     
     # Add user as admin
-    db.add_admin(user.id, chat.id)
+    await async_db.add_admin(user.id, chat.id)
     
     await update.message.reply_text(
         f"✅ Chat **{chat.title}** has been activated!\n"
@@ -55,17 +60,14 @@ async def silence_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Silence the chat - only admins can speak"""
     chat_id = update.effective_chat.id
     
-    session = db.get_session()
-    try:
-        chat = session.query(db.Chat).filter(db.Chat.id == chat_id).first()
+    async with async_db.get_session() as session:
+        chat = (await session.execute(select(Chat).where(Chat.id == chat_id).limit(1))).scalar()
         if chat:
             chat.is_silenced = True
-            session.commit()
+            await session.commit()
             await update.message.reply_text("🔇 Chat has been silenced. Only admins can speak now.")
         else:
             await update.message.reply_text("❌ Chat not registered. Use /activate first.")
-    finally:
-        session.close()
 
 @is_admin_command
 @is_group_command
@@ -73,17 +75,14 @@ async def unsilence_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Unsilence the chat - all users can speak"""
     chat_id = update.effective_chat.id
     
-    session = db.get_session()
-    try:
-        chat = session.query(db.Chat).filter(db.Chat.id == chat_id).first()
+    async with async_db.get_session() as session:
+        chat = (await session.execute(select(Chat).where(Chat.id == chat_id).limit(1))).scalar()
         if chat:
             chat.is_silenced = False
-            session.commit()
+            await session.commit()
             await update.message.reply_text("🔊 Chat has been unsilenced. All users can speak now.")
         else:
             await update.message.reply_text("❌ Chat not registered. Use /activate first.")
-    finally:
-        session.close()
 
 @is_admin_command
 @is_group_command
@@ -91,13 +90,12 @@ async def underattack_command(update: Update, context: ContextTypes.DEFAULT_TYPE
     """Toggle under attack mode"""
     chat_id = update.effective_chat.id
     
-    session = db.get_session()
-    try:
-        chat = session.query(db.Chat).filter(db.Chat.id == chat_id).first()
+    async with async_db.get_session() as session:
+        chat = (await session.execute(select(Chat).where(Chat.id == chat_id).limit(1))).scalar()
         if chat:
             chat.under_attack = not chat.under_attack
             chat.is_silenced = chat.under_attack  # Auto-silence when under attack
-            session.commit()
+            await session.commit()
             
             if chat.under_attack:
                 await update.message.reply_text(
@@ -116,8 +114,6 @@ async def underattack_command(update: Update, context: ContextTypes.DEFAULT_TYPE
                 )
         else:
             await update.message.reply_text("❌ Chat not registered. Use /activate first.")
-    finally:
-        session.close()
 
 # Alias for underattack
 ua_command = underattack_command
@@ -141,11 +137,13 @@ async def debug_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat = update.effective_chat
     user = update.effective_user
     
-    session = db.get_session()
-    try:
-        chat_obj = session.query(db.Chat).filter(db.Chat.id == chat.id).first()
-        user_obj = session.query(db.User).filter(db.User.id == user.id).first()
-        is_admin = db.is_admin(user.id, chat.id)
+    async with async_db.get_session() as session:
+        chat_obj = (await session.execute(select(Chat).where(Chat.id == chat.id).limit(1))).scalar()
+        user_obj = (await session.execute(select(User).where(User.id == user.id).limit(1))).scalar()
+        is_admin = await async_db.is_admin(user.id, chat.id)
+        cache_stats = status_cache.stats()
+        outbound_stats = outbound.stats()
+        shard_stats = getattr(context.application.update_processor, 'stats', None)
         
         debug_info = f"""
 🔍 **Debug Information**
@@ -168,11 +166,28 @@ async def debug_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 **Bot Info:**
 • Username: @{context.bot.username}
 • ID: `{context.bot.id}`
+
+**Status Cache:**
+• Entries: {cache_stats['entries']}/{cache_stats['max_entries']}
+• Hit rate: {cache_stats['hit_rate']:.0%} ({cache_stats['hits']} hits, {cache_stats['misses']} misses)
+• Evictions: {cache_stats['evictions']}
+
+**Outbound Requests:**
+• Sent: {outbound_stats['requests']} ({outbound_stats['retries']} retried after 429, {outbound_stats['coalesced']} deletes coalesced)
+• Queued: {outbound_stats['queued']}
+• Queue wait p50/p99: {outbound_stats['latency_p50'] * 1000:.0f}/{outbound_stats['latency_p99'] * 1000:.0f} ms
+• Scheduled deletions pending: {deletions.pending_count()}
         """
         
+        if shard_stats:
+            debug_info = debug_info.rstrip() + "\n\n**Update Shards:** (queued/peak, processed, blocked, wait, p50/p99)\n" + "\n".join(
+                f"• {index}: {shard['queued']}/{shard['peak_depth']}, {shard['processed']}, {shard['blocked']}, "
+                f"{shard['average_wait'] * 1000:.0f} ms, "
+                f"{shard['service_p50'] * 1000:.0f}/{shard['service_p99'] * 1000:.0f} ms"
+                for index, shard in enumerate(shard_stats())
+            )
+        
         await update.message.reply_text(debug_info.strip(), parse_mode='Markdown')
-    finally:
-        session.close()
 
 @is_admin_command
 @is_group_command
@@ -192,17 +207,14 @@ async def pin_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
         # Save pinned message ID to database
         chat_id = update.effective_chat.id
-        session = db.get_session()
-        try:
-            chat = session.query(db.Chat).filter(db.Chat.id == chat_id).first()
+        async with async_db.get_session() as session:
+            chat = (await session.execute(select(Chat).where(Chat.id == chat_id).limit(1))).scalar()
             if chat:
                 chat.pinned_message_id = message_to_pin.message_id
-                session.commit()
-        finally:
-            session.close()
+                await session.commit()
         
         await update.message.reply_text("📌 Message pinned successfully!")
-        
+    
     except Exception as e:
         logger.error(f"Error pinning message: {e}")
         await update.message.reply_text("❌ Failed to pin message. Make sure I have admin rights.")
@@ -215,28 +227,76 @@ async def unpin_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         chat_id = update.effective_chat.id
         
         # Get pinned message ID from database
-        session = db.get_session()
-        try:
-            chat = session.query(db.Chat).filter(db.Chat.id == chat_id).first()
+        async with async_db.get_session() as session:
+            chat = (await session.execute(select(Chat).where(Chat.id == chat_id).limit(1))).scalar()
             if chat and chat.pinned_message_id:
                 await context.bot.unpin_chat_message(
                     chat_id=chat_id,
                     message_id=chat.pinned_message_id
                 )
                 chat.pinned_message_id = None
-                session.commit()
+                await session.commit()
                 await update.message.reply_text("📌 Message unpinned successfully!")
             else:
                 # Try to unpin all messages
                 await context.bot.unpin_all_chat_messages(chat_id)
                 await update.message.reply_text("📌 All pinned messages have been unpinned!")
-        finally:
-            session.close()
-            
+    
     except Exception as e:
         logger.error(f"Error unpinning message: {e}")
         await update.message.reply_text("❌ Failed to unpin message. Make sure I have admin rights.")
 
+async def purge_in_background(context: ContextTypes.DEFAULT_TYPE, chat_id: int, message_ids: list, command_message_id: int):
+    """Delete message_ids and the purge command with deleteMessages batches, then confirm"""
+    from config import Config
+    
+    total = len(message_ids)
+    status_message = None
+    progress = None
+    if total > DELETE_BATCH_SIZE:
+        status_message = await context.bot.send_message(chat_id, f"🗑️ Purging {total} messages...")
+        
+        async def progress(summary):
+            done = min(purged_count(summary), total)
+            await status_message.edit_text(f"🗑️ Purging {total} messages... {done}/{total}")
+    
+    # Messages that are already gone are skipped by Telegram rather than failing the batch
+    summary = await purge_messages(
+        context.bot, chat_id, message_ids + [command_message_id],
+        concurrency=Config.PURGE_CONCURRENCY,
+        rate=Config.FANOUT_RATE,
+        progress=progress,
+        progress_interval=Config.FANOUT_PROGRESS_INTERVAL,
+    )
+    # Telegram does not say which ids in an accepted batch still existed, so this counts ids processed, not deleted
+    processed_count = sum(
+        1 for batch, error in summary.results.items() if error is None
+        for message_id in batch if message_id != command_message_id
+    )
+    
+    if not processed_count:
+        if summary.failed:
+            logger.error(f"Error purging messages in chat {chat_id}: {summary.errors(1)}")
+            text = "❌ Failed to purge messages. Make sure I have admin rights."
+            if status_message:
+                await status_message.edit_text(text)
+            else:
+                await context.bot.send_message(chat_id, text)
+        return
+    
+    # Send confirmation (will be auto-deleted after 5 seconds)
+    text = f"🗑️ Processed {processed_count} messages."
+    if summary.failed:
+        text += f" {total - processed_count} could not be deleted."
+    if status_message:
+        await status_message.edit_text(text)
+        confirmation = status_message
+    else:
+        confirmation = await context.bot.send_message(chat_id, text)
+    
+    # Schedule deletion of confirmation message
+    schedule_delete(chat_id, confirmation.message_id, 5)
+
 @is_admin_command
 @is_group_command
 async def purge_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -256,11 +316,8 @@ async def purge_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         if context.args and context.args[0].isdigit():
             # Purge specified number of messages
             amount = min(int(context.args[0]), Config.PURGE_LIMIT)
-            messages_to_delete = []
-            
-            for i in range(1, amount + 1):
-                messages_to_delete.append(current_message_id - i)
-            
+            messages_to_delete = list(range(max(current_message_id - amount, 1), current_message_id))
+        
         elif update.message.reply_to_message:
             # Purge from replied message to current
             start_id = update.message.reply_to_message.message_id
@@ -275,34 +332,12 @@ async def purge_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         else:
             return
         
-        # Delete messages
-        deleted_count = 0
-        for msg_id in messages_to_delete:
-            try:
-                await context.bot.delete_message(chat_id, msg_id)
-                deleted_count += 1
-            except Exception:
-                pass  # Message might already be deleted or too old
-        
-        # Delete the purge command message
-        try:
-            await context.bot.delete_message(chat_id, current_message_id)
-        except Exception:
-            pass
-        
-        # Send confirmation (will be auto-deleted after 5 seconds)
-        if deleted_count > 0:
-            confirmation = await context.bot.send_message(
-                chat_id,
-                f"🗑️ Purged {deleted_count} messages."
-            )
-            
-            # Schedule deletion of confirmation message
-            context.job_queue.run_once(
-                lambda context: context.bot.delete_message(chat_id, confirmation.message_id),
-                5
-            )
-        
+        # Delete in bulk batches in the background; large purges report progress
+        context.application.create_task(
+            purge_in_background(context, chat_id, messages_to_delete, current_message_id),
+            update=update
+        )
+    
     except Exception as e:
         logger.error(f"Error purging messages: {e}")
         await update.message.reply_text("❌ Failed to purge messages. Make sure I have admin rights.")
\ No newline at end of file
@@ -1,7 +1,17 @@
 from telegram import Update
 from telegram.ext import ContextTypes
-from database import db
+from database import async_db, Admin, User
 from utils import is_admin_command, is_group_command, parse_time_string, format_time_duration
+from services.moderation_context import get_moderation_context
+from services.chat_config import chat_configs
+from services.night_mode import night_mode
+from services.outbound import COSMETIC
+from services.expiring_store import ExpiringStore
+from services.deletion_scheduler import schedule_delete
+from services.name_index import command_index
+from handlers.filters import WordFilter
+from handlers.notes import Note
+from config import Config
 import logging
 from datetime import datetime, timedelta
 import re
@@ -9,7 +19,7 @@ import re
 logger = logging.getLogger(__name__)
 
 # Add new tables for advanced features
-from sqlalchemy import Column, Integer, String, Boolean, Text, BigInteger, DateTime
+from sqlalchemy import Column, Integer, String, Boolean, Text, BigInteger, DateTime, Index, select
 from sqlalchemy.sql import func
 from database import Base
 
@@ -30,6 +40,23 @@ class ChatSettings(Base):
     created_at = Column(DateTime, default=func.now())
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
 
+class FloodSettings(Base):
+    __tablename__ = 'flood_settings'
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    chat_id = Column(BigInteger, unique=True)
+    enabled = Column(Boolean, default=False)
+    message_limit = Column(Integer, default=5)
+    time_window = Column(Integer, default=10)  # seconds
+    action = Column(String(10), default='mute')  # mute, kick, ban
+    duration = Column(Integer, default=3600)  # mute duration in seconds
+    created_at = Column(DateTime, default=func.now())
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+    
+    __table_args__ = (
+        Index('ix_flood_settings_updated', 'updated_at'),
+    )
+
 class Federation(Base):
     __tablename__ = 'federations'
     
@@ -47,6 +74,10 @@ class FederationChat(Base):
     chat_id = Column(BigInteger)
     joined_by = Column(BigInteger)
     joined_at = Column(DateTime, default=func.now())
+    
+    __table_args__ = (
+        Index('ix_federation_chats_fed_chat', 'fed_id', 'chat_id'),
+    )
 
 class FederationBan(Base):
     __tablename__ = 'federation_bans'
@@ -57,6 +88,10 @@ class FederationBan(Base):
     banned_by = Column(BigInteger)
     reason = Column(Text)
     created_at = Column(DateTime, default=func.now())
+    
+    __table_args__ = (
+        Index('ix_federation_bans_fed_user', 'fed_id', 'user_id'),
+    )
 
 class CustomCommand(Base):
     __tablename__ = 'custom_commands'
@@ -67,13 +102,18 @@ class CustomCommand(Base):
     response = Column(Text)
     created_by = Column(BigInteger)
     created_at = Column(DateTime, default=func.now())
+    
+    __table_args__ = (
+        Index('ix_custom_commands_chat_command', 'chat_id', 'command'),
+    )
 
 def update_advanced_database():
     from database import db as database_instance
     Base.metadata.create_all(bind=database_instance.engine)
 
-# Night mode tracking
-night_mode_restrictions = {}
+# Night mode tracking: (chat_id, user_id, night end) of users already warned.
+# Keys of past nights never match again and expire; no night lasts a day.
+night_mode_restrictions = ExpiringStore(ttl=24 * 3600, max_entries=Config.NIGHT_WARNING_MAX_ENTRIES)
 
 @is_admin_command
 @is_group_command
@@ -96,22 +136,19 @@ async def setlang_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     chat_id = update.effective_chat.id
     
-    session = db.get_session()
-    try:
-        settings = session.query(ChatSettings).filter(ChatSettings.chat_id == chat_id).first()
+    async with async_db.get_session() as session:
+        settings = (await session.execute(select(ChatSettings).where(ChatSettings.chat_id == chat_id).limit(1))).scalar()
         
         if settings:
             settings.language = language
-            session.commit()
+            await session.commit()
         else:
             settings = ChatSettings(chat_id=chat_id, language=language)
             session.add(settings)
-            session.commit()
+            await session.commit()
+        chat_configs.invalidate(chat_id)
         
         await update.message.reply_text(f"✅ Language set to {language.upper()}")
-    
-    finally:
-        session.close()
 
 @is_admin_command
 @is_group_command
@@ -131,9 +168,8 @@ async def nightmode_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = update.effective_chat.id
     
     if context.args[0].lower() == 'status':
-        session = db.get_session()
-        try:
-            settings = session.query(ChatSettings).filter(ChatSettings.chat_id == chat_id).first()
+        async with async_db.get_session() as session:
+            settings = (await session.execute(select(ChatSettings).where(ChatSettings.chat_id == chat_id).limit(1))).scalar()
             
             if not settings:
                 await update.message.reply_text("❌ No night mode settings found.")
@@ -144,6 +180,7 @@ async def nightmode_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 **Status:** {'✅ Enabled' if settings.night_mode_enabled else '❌ Disabled'}
 **Start Time:** {settings.night_mode_start}
 **End Time:** {settings.night_mode_end}
+**Timezone:** {settings.timezone or 'UTC'}
 
 **During night mode:**
 • Only admins can send messages
@@ -151,30 +188,25 @@ async def nightmode_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 • New users are auto-muted"""
             
             await update.message.reply_text(status_text, parse_mode='Markdown')
-        
-        finally:
-            session.close()
         return
     
     elif context.args[0].lower() in ['on', 'off']:
         status = context.args[0].lower() == 'on'
         
-        session = db.get_session()
-        try:
-            settings = session.query(ChatSettings).filter(ChatSettings.chat_id == chat_id).first()
+        async with async_db.get_session() as session:
+            settings = (await session.execute(select(ChatSettings).where(ChatSettings.chat_id == chat_id).limit(1))).scalar()
             
             if settings:
                 settings.night_mode_enabled = status
-                session.commit()
+                await session.commit()
             else:
                 settings = ChatSettings(chat_id=chat_id, night_mode_enabled=status)
                 session.add(settings)
-                session.commit()
+                await session.commit()
+            chat_configs.invalidate(chat_id)
+            night_mode.invalidate(chat_id)
             
             await update.message.reply_text(f"🌙 Night mode {'enabled' if status else 'disabled'}.")
-        
-        finally:
-            session.close()
     
     elif context.args[0].lower() == 'set' and len(context.args) == 3:
         start_time = context.args[1]
@@ -186,14 +218,13 @@ async def nightmode_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await update.message.reply_text("❌ Invalid time format. Use HH:MM (24-hour format)")
             return
         
-        session = db.get_session()
-        try:
-            settings = session.query(ChatSettings).filter(ChatSettings.chat_id == chat_id).first()
+        async with async_db.get_session() as session:
+            settings = (await session.execute(select(ChatSettings).where(ChatSettings.chat_id == chat_id).limit(1))).scalar()
             
             if settings:
                 settings.night_mode_start = start_time
                 settings.night_mode_end = end_time
-                session.commit()
+                await session.commit()
             else:
                 settings = ChatSettings(
                     chat_id=chat_id,
@@ -201,12 +232,11 @@ async def nightmode_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     night_mode_end=end_time
                 )
                 session.add(settings)
-                session.commit()
+                await session.commit()
+            chat_configs.invalidate(chat_id)
+            night_mode.invalidate(chat_id)
             
             await update.message.reply_text(f"🌙 Night mode hours set: {start_time} - {end_time}")
-        
-        finally:
-            session.close()
 
 @is_admin_command
 @is_group_command
@@ -226,9 +256,8 @@ async def slowmode_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = update.effective_chat.id
     
     if context.args[0].lower() == 'status':
-        session = db.get_session()
-        try:
-            settings = session.query(ChatSettings).filter(ChatSettings.chat_id == chat_id).first()
+        async with async_db.get_session() as session:
+            settings = (await session.execute(select(ChatSettings).where(ChatSettings.chat_id == chat_id).limit(1))).scalar()
             
             if not settings or not settings.slow_mode_enabled:
                 await update.message.reply_text("🐌 Slow mode is disabled.")
@@ -239,30 +268,24 @@ async def slowmode_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 f"**Delay:** {settings.slow_mode_delay} seconds",
                 parse_mode='Markdown'
             )
-        
-        finally:
-            session.close()
         return
     
     elif context.args[0].lower() in ['on', 'off']:
         status = context.args[0].lower() == 'on'
         
-        session = db.get_session()
-        try:
-            settings = session.query(ChatSettings).filter(ChatSettings.chat_id == chat_id).first()
+        async with async_db.get_session() as session:
+            settings = (await session.execute(select(ChatSettings).where(ChatSettings.chat_id == chat_id).limit(1))).scalar()
             
             if settings:
                 settings.slow_mode_enabled = status
-                session.commit()
+                await session.commit()
             else:
                 settings = ChatSettings(chat_id=chat_id, slow_mode_enabled=status)
                 session.add(settings)
-                session.commit()
+                await session.commit()
+            chat_configs.invalidate(chat_id)
             
             await update.message.reply_text(f"🐌 Slow mode {'enabled' if status else 'disabled'}.")
-        
-        finally:
-            session.close()
     
     elif context.args[0].isdigit():
         delay = int(context.args[0])
@@ -270,14 +293,13 @@ async def slowmode_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await update.message.reply_text("❌ Delay must be between 1 and 3600 seconds.")
             return
         
-        session = db.get_session()
-        try:
-            settings = session.query(ChatSettings).filter(ChatSettings.chat_id == chat_id).first()
+        async with async_db.get_session() as session:
+            settings = (await session.execute(select(ChatSettings).where(ChatSettings.chat_id == chat_id).limit(1))).scalar()
             
             if settings:
                 settings.slow_mode_enabled = True
                 settings.slow_mode_delay = delay
-                session.commit()
+                await session.commit()
             else:
                 settings = ChatSettings(
                     chat_id=chat_id,
@@ -285,12 +307,10 @@ async def slowmode_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     slow_mode_delay=delay
                 )
                 session.add(settings)
-                session.commit()
+                await session.commit()
+            chat_configs.invalidate(chat_id)
             
             await update.message.reply_text(f"🐌 Slow mode enabled with {delay} second delay.")
-        
-        finally:
-            session.close()
 
 @is_admin_command
 @is_group_command
@@ -310,17 +330,17 @@ async def addcmd_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     admin_id = update.effective_user.id
     
     # Check if command already exists
-    session = db.get_session()
-    try:
-        existing = session.query(CustomCommand).filter(
+    async with async_db.get_session() as session:
+        existing = (await session.execute(select(CustomCommand).where(
             CustomCommand.chat_id == chat_id,
             CustomCommand.command == command
-        ).first()
+        ).limit(1))).scalar()
         
         if existing:
             existing.response = response
             existing.created_by = admin_id
-            session.commit()
+            await session.commit()
+            command_index.invalidate(chat_id, command)
             await update.message.reply_text(f"✅ Updated custom command `/{command}`")
         else:
             custom_cmd = CustomCommand(
@@ -330,11 +350,9 @@ async def addcmd_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 created_by=admin_id
             )
             session.add(custom_cmd)
-            session.commit()
+            await session.commit()
+            command_index.invalidate(chat_id, command)
             await update.message.reply_text(f"✅ Added custom command `/{command}`")
-    
-    finally:
-        session.close()
 
 @is_admin_command
 @is_group_command
@@ -347,30 +365,26 @@ async def delcmd_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     command = context.args[0].lower()
     chat_id = update.effective_chat.id
     
-    session = db.get_session()
-    try:
-        custom_cmd = session.query(CustomCommand).filter(
+    async with async_db.get_session() as session:
+        custom_cmd = (await session.execute(select(CustomCommand).where(
             CustomCommand.chat_id == chat_id,
             CustomCommand.command == command
-        ).first()
+        ).limit(1))).scalar()
         
         if custom_cmd:
-            session.delete(custom_cmd)
-            session.commit()
+            await session.delete(custom_cmd)
+            await session.commit()
+            command_index.invalidate(chat_id, command)
             await update.message.reply_text(f"✅ Deleted custom command `/{command}`")
         else:
             await update.message.reply_text(f"❌ Custom command `/{command}` not found.")
-    
-    finally:
-        session.close()
 
 async def listcmds_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """List custom commands"""
     chat_id = update.effective_chat.id
     
-    session = db.get_session()
-    try:
-        commands = session.query(CustomCommand).filter(CustomCommand.chat_id == chat_id).all()
+    async with async_db.get_session() as session:
+        commands = (await session.scalars(select(CustomCommand).where(CustomCommand.chat_id == chat_id))).all()
         
         if not commands:
             await update.message.reply_text("📝 No custom commands set for this chat.")
@@ -382,31 +396,26 @@ async def listcmds_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
         cmd_list += f"\n**Total:** {len(commands)} commands"
         await update.message.reply_text(cmd_list, parse_mode='Markdown')
-    
-    finally:
-        session.close()
 
 async def handle_custom_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
     """Handle custom commands"""
     if not update.message or not update.message.text or not update.message.text.startswith('/'):
         return False
     
-    command = update.message.text[1:].split()[0].lower()
-    chat_id = update.effective_chat.id
+    words = update.message.text[1:].split()
+    if not words:
+        return False
+    command, _, target = words[0].lower().partition('@')
+    if target and target != (context.bot.username or '').lower():
+        # Addressed to another bot
+        return False
     
-    session = db.get_session()
-    try:
-        custom_cmd = session.query(CustomCommand).filter(
-            CustomCommand.chat_id == chat_id,
-            CustomCommand.command == command
-        ).first()
-        
-        if custom_cmd:
-            await update.message.reply_text(custom_cmd.response, parse_mode='Markdown')
-            return True
+    # Misses, including commands for other bots, are answered from memory
+    custom_cmd = await command_index.get(update.effective_chat.id, command)
     
-    finally:
-        session.close()
+    if custom_cmd:
+        await update.message.reply_text(custom_cmd.response, parse_mode='Markdown')
+        return True
     
     return False
 
@@ -434,12 +443,11 @@ async def cleanup_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = update.effective_chat.id
     cutoff_date = datetime.now() - timedelta(days=days)
     
-    session = db.get_session()
-    try:
+    async with async_db.get_session() as session:
         # Get inactive users
-        inactive_users = session.query(db.User).filter(
-            db.User.last_active < cutoff_date
-        ).all()
+        inactive_users = (await session.scalars(select(User).where(
+            User.last_active < cutoff_date
+        ))).all()
         
         if not inactive_users:
             await update.message.reply_text(f"✅ No inactive users found (inactive for {days} days).")
@@ -455,9 +463,6 @@ async def cleanup_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # Store cleanup data for confirmation
         context.user_data['cleanup_users'] = [user.id for user in inactive_users]
         context.user_data['cleanup_days'] = days
-    
-    finally:
-        session.close()
 
 async def backup_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Backup chat settings"""
@@ -466,12 +471,11 @@ async def backup_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # This would generate a backup file with all chat settings
     # For now, just show what would be backed up
     
-    session = db.get_session()
-    try:
+    async with async_db.get_session() as session:
         # Count various settings
-        notes_count = session.query(db.Note).filter(db.Note.chat_id == chat_id).count()
-        filters_count = session.query(db.WordFilter).filter(db.WordFilter.chat_id == chat_id).count()
-        admins_count = session.query(db.Admin).filter(db.Admin.chat_id == chat_id).count()
+        notes_count = await session.scalar(select(func.count(Note.id)).where(Note.chat_id == chat_id))
+        filters_count = await session.scalar(select(func.count(WordFilter.id)).where(WordFilter.chat_id == chat_id))
+        admins_count = await session.scalar(select(func.count(Admin.id)).where(Admin.chat_id == chat_id))
         
         backup_info = f"""💾 **Backup Information**
 
@@ -489,67 +493,47 @@ async def backup_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 **Note:** Full backup/restore functionality coming soon!"""
         
         await update.message.reply_text(backup_info, parse_mode='Markdown')
-    
-    finally:
-        session.close()
 
-async def check_night_mode(update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
+async def check_night_mode(update: Update, context: ContextTypes.DEFAULT_TYPE, moderation=None) -> bool:
     """Check if night mode restrictions apply"""
     if not update.message or not update.effective_user:
         return False
     
     chat_id = update.effective_chat.id
     user_id = update.effective_user.id
+    moderation = await get_moderation_context(update, moderation)
     
     # Skip admins
-    if db.is_admin(user_id, chat_id):
+    if moderation.is_admin:
         return False
     
-    session = db.get_session()
-    try:
-        settings = session.query(ChatSettings).filter(ChatSettings.chat_id == chat_id).first()
-        
-        if not settings or not settings.night_mode_enabled:
-            return False
-        
-        # Check if current time is in night mode
-        now = datetime.now().time()
-        start_time = datetime.strptime(settings.night_mode_start, '%H:%M').time()
-        end_time = datetime.strptime(settings.night_mode_end, '%H:%M').time()
-        
-        # Handle overnight periods (e.g., 22:00 to 06:00)
-        if start_time > end_time:
-            is_night = now >= start_time or now <= end_time
-        else:
-            is_night = start_time <= now <= end_time
-        
-        if is_night:
-            try:
-                await context.bot.delete_message(chat_id, update.message.message_id)
-                
-                # Send warning (only once per user per night)
-                warning_key = f"night_warning_{chat_id}_{user_id}"
-                if warning_key not in night_mode_restrictions:
-                    warning_msg = await context.bot.send_message(
-                        chat_id,
-                        f"🌙 {update.effective_user.first_name}, chat is in night mode. "
-                        f"Only admins can send messages between {settings.night_mode_start} and {settings.night_mode_end}."
-                    )
-                    
-                    # Delete warning after 10 seconds
-                    context.job_queue.run_once(
-                        lambda context: context.bot.delete_message(chat_id, warning_msg.message_id),
-                        10
-                    )
-                    
-                    night_mode_restrictions[warning_key] = True
-                
-                return True
-            except Exception as e:
-                logger.error(f"Error applying night mode restriction: {e}")
+    settings = moderation.chat_settings
+    
+    if not settings or not settings.night_mode_enabled:
+        return False
     
-    finally:
-        session.close()
+    # Precomputed in the chat's timezone; only recomputed at night start and end
+    is_night = night_mode.is_night(chat_id, settings)
+    
+    if is_night:
+        try:
+            await context.bot.delete_message(chat_id, update.message.message_id)
+            
+            # Send warning (only once per user per night)
+            if night_mode_restrictions.add((chat_id, user_id, night_mode.night_end(chat_id))):
+                warning_msg = await context.bot.send_message(
+                    chat_id,
+                    f"🌙 {update.effective_user.first_name}, chat is in night mode. "
+                    f"Only admins can send messages between {settings.night_mode_start} and {settings.night_mode_end} ({settings.timezone or 'UTC'}).",
+                    rate_limit_args=COSMETIC
+                )
+                
+                # Delete warning after 10 seconds
+                schedule_delete(chat_id, warning_msg.message_id, 10)
+            
+            return True
+        except Exception as e:
+            logger.error(f"Error applying night mode restriction: {e}")
     
     return False
 
@@ -1,65 +1,150 @@
 from telegram import Update
 from telegram.ext import ContextTypes
-from database import db
+from database import db, async_db
 from utils import is_admin_command, is_group_command, parse_time_string, format_time_duration
+from services.moderation_context import get_moderation_context
+from services.rate_limiter import SlidingWindowLimiter
+from services.deletion_scheduler import schedule_delete
+from handlers.advanced_features import FloodSettings
+from sqlalchemy import select
 from datetime import datetime, timedelta
+import asyncio
 import logging
-from collections import defaultdict, deque
 
 logger = logging.getLogger(__name__)
 
-# In-memory flood tracking
-flood_tracker = defaultdict(lambda: deque())
-flood_settings = {}
+DEFAULT_FLOOD_SETTINGS = {
+    'enabled': False,
+    'limit': 5,
+    'time_window': 10,  # seconds
+    'action': 'mute',  # mute, kick, ban
+    'duration': 3600   # mute duration in seconds
+}
+
+# Settings keys -> FloodSettings columns
+FLOOD_SETTINGS_COLUMNS = {
+    'enabled': 'enabled',
+    'limit': 'message_limit',
+    'time_window': 'time_window',
+    'action': 'action',
+    'duration': 'duration',
+}
+
+REFRESH_OVERLAP = timedelta(seconds=5)
+
+def settings_from_row(row) -> dict:
+    if row is None:
+        return dict(DEFAULT_FLOOD_SETTINGS)
+    return {key: getattr(row, column) for key, column in FLOOD_SETTINGS_COLUMNS.items()}
 
 class FloodControl:
+    """
+    Flood tracking plus flood settings. Settings are persisted in the
+    flood_settings table; the hot path reads an in-memory copy that is loaded
+    once per chat and replaced whenever the settings change.
+    """
     def __init__(self):
-        self.user_messages = defaultdict(lambda: deque())
+        # Fixed-size counter per (chat_id, user_id); idle users are swept
+        self.limiter = SlidingWindowLimiter()
         self.flood_settings = {}
+        self._last_refresh = None
+        self._refresh_task = None
     
     def add_message(self, chat_id: int, user_id: int):
         """Add a message to flood tracking"""
-        now = datetime.now()
-        
         # Get flood settings for chat
         settings = self.get_flood_settings(chat_id)
         if not settings['enabled']:
             return False
         
-        # Clean old messages
-        cutoff = now - timedelta(seconds=settings['time_window'])
-        user_key = f"{chat_id}:{user_id}"
-        
-        # Remove old messages
-        while self.user_messages[user_key] and self.user_messages[user_key][0] < cutoff:
-            self.user_messages[user_key].popleft()
-        
-        # Add current message
-        self.user_messages[user_key].append(now)
-        
         # Check if flood limit exceeded
-        if len(self.user_messages[user_key]) > settings['limit']:
-            return True
-        
-        return False
+        return self.limiter.hit((chat_id, user_id), settings['limit'], settings['time_window'] * 1000)
     
     def get_flood_settings(self, chat_id: int):
-        """Get flood settings for a chat"""
-        if chat_id not in self.flood_settings:
-            self.flood_settings[chat_id] = {
-                'enabled': False,
-                'limit': 5,
-                'time_window': 10,  # seconds
-                'action': 'mute',  # mute, kick, ban
-                'duration': 3600   # mute duration in seconds
-            }
-        return self.flood_settings[chat_id]
-    
-    def set_flood_settings(self, chat_id: int, **kwargs):
-        """Update flood settings for a chat"""
-        settings = self.get_flood_settings(chat_id)
-        settings.update(kwargs)
+        """Get the in-memory flood settings for a chat (defaults until loaded)"""
+        settings = self.flood_settings.get(chat_id)
+        if settings is None:
+            return DEFAULT_FLOOD_SETTINGS
+        return settings
+    
+    async def load_flood_settings(self, chat_id: int):
+        """Get flood settings for a chat, reading the database only the first time"""
+        settings = self.flood_settings.get(chat_id)
+        if settings is None:
+            async with async_db.get_session() as session:
+                row = (await session.execute(
+                    select(FloodSettings).where(FloodSettings.chat_id == chat_id)
+                )).scalar()
+            settings = self.flood_settings.setdefault(chat_id, settings_from_row(row))
+        return settings
+    
+    async def set_flood_settings(self, chat_id: int, **kwargs):
+        """Update and persist flood settings for a chat"""
+        async with async_db.get_session() as session:
+            row = (await session.execute(
+                select(FloodSettings).where(FloodSettings.chat_id == chat_id)
+            )).scalar()
+            if not row:
+                row = FloodSettings(chat_id=chat_id, **{
+                    column: DEFAULT_FLOOD_SETTINGS[key] for key, column in FLOOD_SETTINGS_COLUMNS.items()
+                })
+                session.add(row)
+            for key, value in kwargs.items():
+                setattr(row, FLOOD_SETTINGS_COLUMNS[key], value)
+            # Set from Python so refresh_changed() compares like with like on SQLite
+            row.updated_at = datetime.now()
+            await session.commit()
+            settings = settings_from_row(row)
+        
         self.flood_settings[chat_id] = settings
+        return settings
+    
+    def invalidate(self, chat_id: int = None):
+        """Drop the in-memory copy for a chat (or all chats) so it is reloaded on next use"""
+        if chat_id is None:
+            self.flood_settings.clear()
+        else:
+            self.flood_settings.pop(chat_id, None)
+    
+    async def refresh_changed(self) -> int:
+        """Pick up settings other processes changed since the last refresh"""
+        query = select(FloodSettings)
+        if self._last_refresh is not None:
+            # Overlap the previous poll to catch commits that landed late
+            query = query.where(FloodSettings.updated_at >= self._last_refresh - REFRESH_OVERLAP)
+        
+        async with async_db.get_session() as session:
+            rows = (await session.execute(query)).scalars().all()
+        
+        for row in rows:
+            # Only chats already loaded are kept hot; others load lazily
+            if row.chat_id in self.flood_settings:
+                self.flood_settings[row.chat_id] = settings_from_row(row)
+            if self._last_refresh is None or row.updated_at > self._last_refresh:
+                self._last_refresh = row.updated_at
+        return len(rows)
+    
+    async def _run_refresh(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.refresh_changed()
+            except Exception as e:
+                logger.error(f"Failed to refresh flood settings: {e}")
+    
+    def start_refresh(self, interval: float):
+        """Poll for changes made by other processes every interval seconds (0 disables)"""
+        if interval > 0 and not self._refresh_task:
+            self._refresh_task = asyncio.get_running_loop().create_task(self._run_refresh(interval))
+    
+    async def stop_refresh(self):
+        if self._refresh_task:
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+            self._refresh_task = None
 
 # Global flood control instance
 flood_control = FloodControl()
@@ -81,11 +166,10 @@ async def setflood_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = update.effective_chat.id
     
     if limit == 0:
-        flood_control.set_flood_settings(chat_id, enabled=False)
+        await flood_control.set_flood_settings(chat_id, enabled=False)
         await update.message.reply_text("✅ Flood protection has been disabled.")
     else:
-        flood_control.set_flood_settings(chat_id, enabled=True, limit=limit)
-        settings = flood_control.get_flood_settings(chat_id)
+        settings = await flood_control.set_flood_settings(chat_id, enabled=True, limit=limit)
         await update.message.reply_text(
             f"✅ Flood protection set to {limit} messages per {settings['time_window']} seconds.\n"
             f"Action: {settings['action'].title()}"
@@ -114,7 +198,7 @@ async def setfloodmode_command(update: Update, context: ContextTypes.DEFAULT_TYP
         duration = parse_time_string(context.args[1])
     
     chat_id = update.effective_chat.id
-    flood_control.set_flood_settings(chat_id, action=action, duration=duration)
+    await flood_control.set_flood_settings(chat_id, action=action, duration=duration)
     
     if action == 'mute':
         await update.message.reply_text(
@@ -132,7 +216,7 @@ async def setfloodmode_command(update: Update, context: ContextTypes.DEFAULT_TYP
 async def flood_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Show current flood settings"""
     chat_id = update.effective_chat.id
-    settings = flood_control.get_flood_settings(chat_id)
+    settings = await flood_control.load_flood_settings(chat_id)
     
     if not settings['enabled']:
         await update.message.reply_text("🌊 Flood protection is currently **disabled**.", parse_mode='Markdown')
@@ -159,7 +243,7 @@ If a user sends more than {settings['limit']} messages in {settings['time_window
     
     await update.message.reply_text(flood_info, parse_mode='Markdown')
 
-async def check_flood(update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
+async def check_flood(update: Update, context: ContextTypes.DEFAULT_TYPE, moderation=None) -> bool:
     """Check if user is flooding and take action"""
     if not update.message or not update.effective_user:
         return False
@@ -169,12 +253,13 @@ async def check_flood(update: Update, context: ContextTypes.DEFAULT_TYPE) -> boo
     user = update.effective_user
     
     # Skip admins and whitelisted users
-    if db.is_admin(user_id, chat_id) or db.is_whitelisted(user_id, chat_id):
+    moderation = await get_moderation_context(update, moderation)
+    if moderation.is_exempt:
         return False
     
-    # Check for flood
+    # Check for flood (settings come from memory after the first message in a chat)
+    settings = await flood_control.load_flood_settings(chat_id)
     if flood_control.add_message(chat_id, user_id):
-        settings = flood_control.get_flood_settings(chat_id)
         
         try:
             if settings['action'] == 'mute':
@@ -185,13 +270,13 @@ async def check_flood(update: Update, context: ContextTypes.DEFAULT_TYPE) -> boo
                     permissions=context.bot.get_chat(chat_id).permissions,
                     until_date=until_date
                 )
-                db.add_mute(user_id, chat_id, context.bot.id, settings['duration'], "Flood protection")
+                await async_db.add_mute(user_id, chat_id, context.bot.id, settings['duration'], "Flood protection")
                 
                 action_msg = await context.bot.send_message(
                     chat_id,
                     f"🌊 {user.first_name} has been muted for {format_time_duration(settings['duration'])} due to flooding!"
                 )
-                
+            
             elif settings['action'] == 'kick':
                 await context.bot.ban_chat_member(chat_id, user_id)
                 await context.bot.unban_chat_member(chat_id, user_id)
@@ -200,10 +285,10 @@ async def check_flood(update: Update, context: ContextTypes.DEFAULT_TYPE) -> boo
                     chat_id,
                     f"🌊 {user.first_name} has been kicked due to flooding!"
                 )
-                
+            
             elif settings['action'] == 'ban':
                 await context.bot.ban_chat_member(chat_id, user_id)
-                db.add_ban(user_id, chat_id, context.bot.id, "Flood protection")
+                await async_db.add_ban(user_id, chat_id, context.bot.id, "Flood protection")
                 
                 action_msg = await context.bot.send_message(
                     chat_id,
@@ -211,14 +296,11 @@ async def check_flood(update: Update, context: ContextTypes.DEFAULT_TYPE) -> boo
                 )
             
             # Delete the action message after 5 seconds
-            context.job_queue.run_once(
-                lambda context: context.bot.delete_message(chat_id, action_msg.message_id),
-                5
-            )
+            schedule_delete(chat_id, action_msg.message_id, 5)
             
             logger.info(f"Flood protection: {settings['action']}ed user {user_id} in chat {chat_id}")
             return True
-            
+        
         except Exception as e:
             logger.error(f"Error applying flood protection: {e}")
     
@@ -1,59 +1,32 @@
 from telegram import Update
 from telegram.ext import ContextTypes
 from telegram.constants import ChatMemberStatus
-from database import db
+from database import async_db
+from services.moderation_context import get_moderation_context
+from services.activity_buffer import user_activity
+from services.join_pipeline import join_pipeline
 import logging
 
 logger = logging.getLogger(__name__)
 
 async def handle_new_member(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle new members joining the chat"""
-    chat_id = update.effective_chat.id
-    
-    # Check if chat is under attack
-    session = db.get_session()
-    try:
-        chat = session.query(db.Chat).filter(db.Chat.id == chat_id).first()
-        if chat and chat.under_attack:
-            # Kick all new members when under attack
-            for member in update.message.new_chat_members:
-                try:
-                    await context.bot.ban_chat_member(chat_id, member.id)
-                    await context.bot.unban_chat_member(chat_id, member.id)
-                    logger.info(f"Kicked new member {member.id} due to under attack mode in chat {chat_id}")
-                except Exception as e:
-                    logger.error(f"Failed to kick new member {member.id}: {e}")
-            
-            # Delete the join message
-            try:
-                await context.bot.delete_message(chat_id, update.message.message_id)
-            except:
-                pass
-            return
-        
-        # Check for global bans
-        for member in update.message.new_chat_members:
-            if db.is_banned(member.id):
-                try:
-                    await context.bot.ban_chat_member(chat_id, member.id)
-                    logger.info(f"Banned new member {member.id} due to global ban in chat {chat_id}")
-                except Exception as e:
-                    logger.error(f"Failed to ban globally banned member {member.id}: {e}")
-            else:
-                # Register new user
-                db.get_or_create_user(member.id, member.username, member.first_name, member.last_name)
-    
-    finally:
-        session.close()
+    # Under attack kicks, global ban checks and user registration run per batch in the join pipeline
+    join_pipeline.add(
+        context.bot,
+        update.effective_chat,
+        update.message.new_chat_members,
+        update.message.message_id
+    )
 
 async def handle_left_member(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle members leaving the chat"""
     # Update user last active time
     left_member = update.message.left_chat_member
     if left_member:
-        db.get_or_create_user(left_member.id, left_member.username, left_member.first_name, left_member.last_name)
+        user_activity.record(left_member.id, left_member.username, left_member.first_name, left_member.last_name)
 
-async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
+async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE, moderation=None):
     """Handle regular messages for various checks"""
     if not update.message or not update.effective_user:
         return
@@ -62,43 +35,38 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat = update.effective_chat
     message = update.message
     
-    # Update user info and last active
-    db.get_or_create_user(user.id, user.username, user.first_name, user.last_name)
+    # Update user info and last active (written in batches)
+    user_activity.record(user.id, user.username, user.first_name, user.last_name)
     
     # Skip processing for private chats
     if chat.type == 'private':
         return
     
     # Check if chat is registered
-    session = db.get_session()
-    try:
-        chat_obj = session.query(db.Chat).filter(db.Chat.id == chat.id).first()
-        if not chat_obj:
-            return  # Chat not registered
-        
-        # Check if user is muted
-        if db.is_muted(user.id, chat.id):
-            try:
-                await context.bot.delete_message(chat.id, message.message_id)
-                logger.info(f"Deleted message from muted user {user.id} in chat {chat.id}")
-            except Exception as e:
-                logger.error(f"Failed to delete message from muted user: {e}")
-            return
-        
-        # Check if chat is silenced and user is not admin
-        if chat_obj.is_silenced and not db.is_admin(user.id, chat.id):
-            try:
-                await context.bot.delete_message(chat.id, message.message_id)
-                logger.info(f"Deleted message from non-admin {user.id} in silenced chat {chat.id}")
-            except Exception as e:
-                logger.error(f"Failed to delete message in silenced chat: {e}")
-            return
-        
-        # Check for spam/flood (basic implementation)
-        # This could be expanded with more sophisticated anti-spam measures
-        
-    finally:
-        session.close()
+    moderation = await get_moderation_context(update, moderation)
+    if not moderation.is_registered:
+        return  # Chat not registered
+    
+    # Check if user is muted
+    if moderation.is_muted:
+        try:
+            await context.bot.delete_message(chat.id, message.message_id)
+            logger.info(f"Deleted message from muted user {user.id} in chat {chat.id}")
+        except Exception as e:
+            logger.error(f"Failed to delete message from muted user: {e}")
+        return
+    
+    # Check if chat is silenced and user is not admin
+    if moderation.is_silenced and not moderation.is_admin:
+        try:
+            await context.bot.delete_message(chat.id, message.message_id)
+            logger.info(f"Deleted message from non-admin {user.id} in silenced chat {chat.id}")
+        except Exception as e:
+            logger.error(f"Failed to delete message in silenced chat: {e}")
+        return
+    
+    # Check for spam/flood (basic implementation)
+    # This could be expanded with more sophisticated anti-spam measures
 
 async def handle_chat_member_update(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle chat member status updates (promotions, demotions, etc.)"""
@@ -121,7 +89,7 @@ async def handle_chat_member_update(update: Update, context: ContextTypes.DEFAUL
         # User was demoted from admin
         logger.info(f"User {user_id} was demoted from admin in chat {chat_id}")
         # Remove from bot admin list
-        db.remove_admin(user_id, chat_id)
+        await async_db.remove_admin(user_id, chat_id)
     
     # Handle bans
     elif new_status in [ChatMemberStatus.BANNED, ChatMemberStatus.KICKED]:
@@ -137,7 +105,7 @@ async def handle_bot_added_to_chat(update: Update, context: ContextTypes.DEFAULT
     chat = update.effective_chat
     
     # Register the chat
-    db.get_or_create_chat(chat.id, chat.title)
+    await async_db.get_or_create_chat(chat.id, chat.title)
     
     # Send welcome message
     welcome_msg = (
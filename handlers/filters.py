@@ -1,15 +1,21 @@
 from telegram import Update
 from telegram.ext import ContextTypes
-from database import db
+from database import async_db, Chat
 from utils import is_admin_command, is_group_command
-import re
+from services.moderation_context import get_moderation_context
+from services.word_matcher import word_matchers
+from services.spam_scorer import spam_scorers, SpamRule
+from services.domain_index import url_filter_indexes, normalize_domain, in_domain_set
+from services.message_classifier import classify_message, LOCK_TYPES
+from services.chat_config import chat_configs
+from services.deletion_scheduler import schedule_delete
+from config import Config
 import logging
-from urllib.parse import urlparse
 
 logger = logging.getLogger(__name__)
 
 # Add new tables to database for filters
-from sqlalchemy import Column, Integer, String, Boolean, Text, BigInteger, DateTime
+from sqlalchemy import Column, Integer, String, Boolean, Text, BigInteger, DateTime, Float, Index, delete, select
 from sqlalchemy.sql import func
 from database import Base, db as database_instance
 
@@ -23,6 +29,10 @@ class WordFilter(Base):
     is_regex = Column(Boolean, default=False)
     created_by = Column(BigInteger)
     created_at = Column(DateTime, default=func.now())
+    
+    __table_args__ = (
+        Index('ix_word_filters_chat_word', 'chat_id', 'word'),
+    )
 
 class URLFilter(Base):
     __tablename__ = 'url_filters'
@@ -34,6 +44,10 @@ class URLFilter(Base):
     is_whitelist = Column(Boolean, default=False)  # True for allowed domains
     created_by = Column(BigInteger)
     created_at = Column(DateTime, default=func.now())
+    
+    __table_args__ = (
+        Index('ix_url_filters_chat_domain', 'chat_id', 'domain'),
+    )
 
 class MediaFilter(Base):
     __tablename__ = 'media_filters'
@@ -45,24 +59,35 @@ class MediaFilter(Base):
     action = Column(String(50), default='delete')
     created_by = Column(BigInteger)
     created_at = Column(DateTime, default=func.now())
+    
+    __table_args__ = (
+        Index('ix_media_filters_chat_type', 'chat_id', 'media_type'),
+    )
+
+class SpamPattern(Base):
+    __tablename__ = 'spam_patterns'
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    chat_id = Column(BigInteger)
+    pattern = Column(String(255))  # keyword groups in order, e.g. "join|subscribe channel|group"
+    weight = Column(Float, default=1.0)
+    created_by = Column(BigInteger)
+    created_at = Column(DateTime, default=func.now())
+    
+    __table_args__ = (
+        Index('ix_spam_patterns_chat', 'chat_id'),
+    )
 
 # Recreate database with new tables
 def update_database():
     Base.metadata.create_all(bind=database_instance.engine)
 
-# Common spam patterns
-SPAM_PATTERNS = [
-    r'(?i)(free|win|winner|congratulations).*(money|cash|prize|reward)',
-    r'(?i)(click|visit|check).*(link|url|website)',
-    r'(?i)(telegram|whatsapp|discord).*(group|channel|server)',
-    r'(?i)(crypto|bitcoin|trading|investment).*(profit|earn|money)',
-    r'(?i)(dating|meet|girls|boys).*(app|site|website)',
-]
+# Built-in spam rules live in services.spam_scorer.DEFAULT_SPAM_RULES
 
-SUSPICIOUS_DOMAINS = [
+SUSPICIOUS_DOMAINS = frozenset([
     'bit.ly', 'tinyurl.com', 'short.link', 't.co', 'goo.gl',
     'ow.ly', 'buff.ly', 'is.gd', 'tiny.cc'
-]
+])
 
 @is_admin_command
 @is_group_command
@@ -87,31 +112,31 @@ async def addfilter_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = update.effective_chat.id
     admin_id = update.effective_user.id
     
-    session = db.get_session()
-    try:
+    async with async_db.get_session() as session:
         # Check if filter already exists
-        existing = session.query(WordFilter).filter(
-            WordFilter.chat_id == chat_id,
-            WordFilter.word == word
-        ).first()
+        existing = (await session.execute(
+            select(WordFilter).where(
+                WordFilter.chat_id == chat_id,
+                WordFilter.word == word
+            ).limit(1)
+        )).scalar()
         
         if existing:
             existing.action = action
-            session.commit()
-            await update.message.reply_text(f"✅ Updated filter for '{word}' with action: {action}")
         else:
-            word_filter = WordFilter(
+            session.add(WordFilter(
                 chat_id=chat_id,
                 word=word,
                 action=action,
                 created_by=admin_id
-            )
-            session.add(word_filter)
-            session.commit()
-            await update.message.reply_text(f"✅ Added filter for '{word}' with action: {action}")
-    
-    finally:
-        session.close()
+            ))
+        await session.commit()
+    word_matchers.invalidate(chat_id)
+    
+    if existing:
+        await update.message.reply_text(f"✅ Updated filter for '{word}' with action: {action}")
+    else:
+        await update.message.reply_text(f"✅ Added filter for '{word}' with action: {action}")
 
 @is_admin_command
 @is_group_command
@@ -124,22 +149,20 @@ async def removefilter_command(update: Update, context: ContextTypes.DEFAULT_TYP
     word = context.args[0].lower()
     chat_id = update.effective_chat.id
     
-    session = db.get_session()
-    try:
-        word_filter = session.query(WordFilter).filter(
-            WordFilter.chat_id == chat_id,
-            WordFilter.word == word
-        ).first()
-        
-        if word_filter:
-            session.delete(word_filter)
-            session.commit()
-            await update.message.reply_text(f"✅ Removed filter for '{word}'")
-        else:
-            await update.message.reply_text(f"❌ No filter found for '{word}'")
+    async with async_db.get_session() as session:
+        result = await session.execute(
+            delete(WordFilter).where(
+                WordFilter.chat_id == chat_id,
+                WordFilter.word == word
+            )
+        )
+        await session.commit()
     
-    finally:
-        session.close()
+    if result.rowcount:
+        word_matchers.invalidate(chat_id)
+        await update.message.reply_text(f"✅ Removed filter for '{word}'")
+    else:
+        await update.message.reply_text(f"❌ No filter found for '{word}'")
 
 @is_admin_command
 @is_group_command
@@ -147,22 +170,18 @@ async def filters_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """List all word filters"""
     chat_id = update.effective_chat.id
     
-    session = db.get_session()
-    try:
-        filters = session.query(WordFilter).filter(WordFilter.chat_id == chat_id).all()
-        
-        if not filters:
-            await update.message.reply_text("📝 No word filters set for this chat.")
-            return
-        
-        filter_list = "📝 **Word Filters:**\n\n"
-        for f in filters:
-            filter_list += f"• `{f.word}` → {f.action}\n"
-        
-        await update.message.reply_text(filter_list, parse_mode='Markdown')
+    async with async_db.get_session() as session:
+        filters = (await session.scalars(select(WordFilter).where(WordFilter.chat_id == chat_id))).all()
+    
+    if not filters:
+        await update.message.reply_text("📝 No word filters set for this chat.")
+        return
+    
+    filter_list = "📝 **Word Filters:**\n\n"
+    for f in filters:
+        filter_list += f"• `{f.word}` → {f.action}\n"
     
-    finally:
-        session.close()
+    await update.message.reply_text(filter_list, parse_mode='Markdown')
 
 @is_admin_command
 @is_group_command
@@ -176,39 +195,34 @@ async def lock_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     media_type = context.args[0].lower()
-    valid_types = ['url', 'photo', 'video', 'document', 'sticker', 'voice', 'video_note', 'animation', 'contact', 'location', 'poll', 'forward', 'reply']
-    
-    if media_type not in valid_types:
-        await update.message.reply_text(f"❌ Invalid type. Valid types: {', '.join(valid_types)}")
+    if media_type not in LOCK_TYPES:
+        await update.message.reply_text(f"❌ Invalid type. Valid types: {', '.join(LOCK_TYPES)}")
         return
     
     chat_id = update.effective_chat.id
     admin_id = update.effective_user.id
     
-    session = db.get_session()
-    try:
-        existing = session.query(MediaFilter).filter(
-            MediaFilter.chat_id == chat_id,
-            MediaFilter.media_type == media_type
-        ).first()
+    async with async_db.get_session() as session:
+        existing = (await session.execute(
+            select(MediaFilter).where(
+                MediaFilter.chat_id == chat_id,
+                MediaFilter.media_type == media_type
+            ).limit(1)
+        )).scalar()
         
         if existing:
             existing.is_locked = True
-            session.commit()
         else:
-            media_filter = MediaFilter(
+            session.add(MediaFilter(
                 chat_id=chat_id,
                 media_type=media_type,
                 is_locked=True,
                 created_by=admin_id
-            )
-            session.add(media_filter)
-            session.commit()
-        
-        await update.message.reply_text(f"🔒 Locked {media_type} messages in this chat.")
+            ))
+        await session.commit()
+    chat_configs.invalidate(chat_id)
     
-    finally:
-        session.close()
+    await update.message.reply_text(f"🔒 Locked {media_type} messages in this chat.")
 
 @is_admin_command
 @is_group_command
@@ -221,22 +235,23 @@ async def unlock_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     media_type = context.args[0].lower()
     chat_id = update.effective_chat.id
     
-    session = db.get_session()
-    try:
-        media_filter = session.query(MediaFilter).filter(
-            MediaFilter.chat_id == chat_id,
-            MediaFilter.media_type == media_type
-        ).first()
+    async with async_db.get_session() as session:
+        media_filter = (await session.execute(
+            select(MediaFilter).where(
+                MediaFilter.chat_id == chat_id,
+                MediaFilter.media_type == media_type
+            ).limit(1)
+        )).scalar()
         
         if media_filter:
             media_filter.is_locked = False
-            session.commit()
-            await update.message.reply_text(f"🔓 Unlocked {media_type} messages in this chat.")
-        else:
-            await update.message.reply_text(f"❌ {media_type} is not locked.")
+            await session.commit()
     
-    finally:
-        session.close()
+    if media_filter:
+        chat_configs.invalidate(chat_id)
+        await update.message.reply_text(f"🔓 Unlocked {media_type} messages in this chat.")
+    else:
+        await update.message.reply_text(f"❌ {media_type} is not locked.")
 
 @is_admin_command
 @is_group_command
@@ -244,25 +259,93 @@ async def locks_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Show current locks"""
     chat_id = update.effective_chat.id
     
-    session = db.get_session()
+    async with async_db.get_session() as session:
+        locks = (await session.scalars(
+            select(MediaFilter).where(
+                MediaFilter.chat_id == chat_id,
+                MediaFilter.is_locked == True
+            )
+        )).all()
+    
+    if not locks:
+        await update.message.reply_text("🔓 No message types are currently locked.")
+        return
+    
+    lock_list = "🔒 **Locked Message Types:**\n\n"
+    for lock in locks:
+        lock_list += f"• {lock.media_type}\n"
+    
+    await update.message.reply_text(lock_list, parse_mode='Markdown')
+
+@is_admin_command
+@is_group_command
+async def addspam_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Add a weighted spam pattern for this chat"""
+    if len(context.args) < 2:
+        await update.message.reply_text(
+            "❌ Usage: `/addspam <weight> <words> [<words> ...]`\n"
+            "Each `<words>` is one or more keywords separated by `|`; the groups must appear in order on one line.\n"
+            f"Messages scoring {Config.SPAM_SCORE_THRESHOLD:g} or more are deleted.\n"
+            "Example: `/addspam 0.5 join|subscribe channel|group`",
+            parse_mode='Markdown'
+        )
+        return
+    
     try:
-        locks = session.query(MediaFilter).filter(
-            MediaFilter.chat_id == chat_id,
-            MediaFilter.is_locked == True
-        ).all()
-        
-        if not locks:
-            await update.message.reply_text("🔓 No message types are currently locked.")
-            return
-        
-        lock_list = "🔒 **Locked Message Types:**\n\n"
-        for lock in locks:
-            lock_list += f"• {lock.media_type}\n"
-        
-        await update.message.reply_text(lock_list, parse_mode='Markdown')
+        weight = float(context.args[0])
+    except ValueError:
+        await update.message.reply_text("❌ Weight must be a number, e.g. 0.5")
+        return
+    if not 0 < weight <= 100:
+        await update.message.reply_text("❌ Weight must be between 0 and 100.")
+        return
+    
+    try:
+        rule = SpamRule.parse(' '.join(context.args[1:]), weight)
+    except ValueError as e:
+        await update.message.reply_text(f"❌ {e}")
+        return
+    
+    pattern = str(rule)
+    if len(pattern) > 255:
+        await update.message.reply_text("❌ Pattern is too long.")
+        return
+    
+    chat_id = update.effective_chat.id
+    pattern_id = await async_db.add_spam_pattern(chat_id, pattern, weight, update.effective_user.id)
+    spam_scorers.invalidate(chat_id)
+    await update.message.reply_text(f"✅ Added spam pattern #{pattern_id} `{pattern}` with weight {weight:g}", parse_mode='Markdown')
+
+@is_admin_command
+@is_group_command
+async def removespam_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Remove a spam pattern by id"""
+    if not context.args or not context.args[0].lstrip('#').isdigit():
+        await update.message.reply_text("❌ Usage: `/removespam <id>` (see /spampatterns)")
+        return
+    
+    pattern_id = int(context.args[0].lstrip('#'))
+    chat_id = update.effective_chat.id
+    
+    if await async_db.remove_spam_pattern(chat_id, pattern_id):
+        spam_scorers.invalidate(chat_id)
+        await update.message.reply_text(f"✅ Removed spam pattern #{pattern_id}")
+    else:
+        await update.message.reply_text(f"❌ No spam pattern #{pattern_id} in this chat")
+
+@is_admin_command
+@is_group_command
+async def spampatterns_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """List the spam rules applied in this chat"""
+    patterns = await async_db.get_spam_patterns(update.effective_chat.id)
     
-    finally:
-        session.close()
+    pattern_list = f"🛡 **Spam Rules** (delete at score {Config.SPAM_SCORE_THRESHOLD:g}):\n\n"
+    for rule in spam_scorers.default_rules:
+        pattern_list += f"• built-in `{rule}` → {rule.weight:g}\n"
+    for p in patterns:
+        pattern_list += f"• #{p.id} `{p.pattern}` → {p.weight:g}\n"
+    
+    await update.message.reply_text(pattern_list, parse_mode='Markdown')
 
 @is_admin_command
 @is_group_command
@@ -276,42 +359,38 @@ async def antispam_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = update.effective_chat.id
     
     # Store in chat settings (we'll add this to database)
-    session = db.get_session()
-    try:
-        chat = session.query(db.Chat).filter(db.Chat.id == chat_id).first()
-        if chat:
-            # We'll add an antispam field to the Chat model
-            await update.message.reply_text(
-                f"✅ Anti-spam protection {'enabled' if status else 'disabled'}."
-            )
-    finally:
-        session.close()
+    async with async_db.get_session() as session:
+        chat = await session.get(Chat, chat_id)
+    if chat:
+        # We'll add an antispam field to the Chat model
+        await update.message.reply_text(
+            f"✅ Anti-spam protection {'enabled' if status else 'disabled'}."
+        )
 
-async def check_message_filters(update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
+async def check_message_filters(update: Update, context: ContextTypes.DEFAULT_TYPE, moderation=None) -> bool:
     """Check message against all filters"""
     if not update.message or not update.effective_user:
         return False
     
-    chat_id = update.effective_chat.id
-    user_id = update.effective_user.id
     message = update.message
     
     # Skip admins and whitelisted users
-    if db.is_admin(user_id, chat_id) or db.is_whitelisted(user_id, chat_id):
+    moderation = await get_moderation_context(update, moderation)
+    if moderation.is_exempt:
         return False
     
     # Check word filters
-    if message.text:
+    if message.text and moderation.has_word_filters:
         if await check_word_filters(update, context):
             return True
     
     # Check URL filters
-    if message.text and ('http' in message.text or 'www.' in message.text):
-        if await check_url_filters(update, context):
+    if classify_message(update, context).urls:
+        if await check_url_filters(update, context, moderation.has_url_filters):
             return True
     
     # Check media filters
-    if await check_media_filters(update, context):
+    if moderation.has_locks and await check_media_filters(update, context):
         return True
     
     # Check spam patterns
@@ -323,124 +402,71 @@ async def check_message_filters(update: Update, context: ContextTypes.DEFAULT_TY
 async def check_word_filters(update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
     """Check message against word filters"""
     chat_id = update.effective_chat.id
-    message_text = update.message.text.lower()
-    
-    session = db.get_session()
-    try:
-        filters = session.query(WordFilter).filter(WordFilter.chat_id == chat_id).all()
-        
-        for word_filter in filters:
-            if word_filter.is_regex:
-                if re.search(word_filter.word, message_text, re.IGNORECASE):
-                    await apply_filter_action(update, context, word_filter.action, f"Filtered word: {word_filter.word}")
-                    return True
-            else:
-                if word_filter.word in message_text:
-                    await apply_filter_action(update, context, word_filter.action, f"Filtered word: {word_filter.word}")
-                    return True
-    
-    finally:
-        session.close()
+    message_text = classify_message(update, context).text_lower
+    
+    # Compiled once per chat; rebuilt after /addfilter or /removefilter
+    matcher = await word_matchers.get(chat_id)
+    match = matcher.match(message_text)
+    if match:
+        word, action = match
+        await apply_filter_action(update, context, action, f"Filtered word: {word}")
+        return True
     
     return False
 
-async def check_url_filters(update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
+async def check_url_filters(update: Update, context: ContextTypes.DEFAULT_TYPE, has_url_filters: bool = True) -> bool:
     """Check message against URL filters"""
     chat_id = update.effective_chat.id
-    message_text = update.message.text
     
-    # Extract URLs
-    urls = re.findall(r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+', message_text)
+    # Extracted once per update by classify_message
+    urls = classify_message(update, context).urls
     
     if not urls:
         return False
     
-    session = db.get_session()
-    try:
-        url_filters = session.query(URLFilter).filter(URLFilter.chat_id == chat_id).all()
+    # Indexed once per chat; whole labels only, most specific entry wins
+    index = await url_filter_indexes.get(chat_id) if has_url_filters else None
+    
+    for domain in dict.fromkeys(normalize_domain(url) for url in urls):
+        rule = index.lookup(domain) if index else None
+        if rule and rule.is_whitelist:
+            continue  # Allowed domain
         
-        for url in urls:
-            domain = urlparse(url).netloc.lower()
-            
-            # Check against suspicious domains
-            if domain in SUSPICIOUS_DOMAINS:
-                await apply_filter_action(update, context, 'delete', f"Suspicious shortened URL: {domain}")
-                return True
-            
-            # Check against custom filters
-            for url_filter in url_filters:
-                if url_filter.domain in domain:
-                    if url_filter.is_whitelist:
-                        continue  # Allowed domain
-                    else:
-                        await apply_filter_action(update, context, url_filter.action, f"Blocked domain: {domain}")
-                        return True
-    
-    finally:
-        session.close()
+        # Check against suspicious domains
+        if in_domain_set(domain, SUSPICIOUS_DOMAINS):
+            await apply_filter_action(update, context, 'delete', f"Suspicious shortened URL: {domain}")
+            return True
+        
+        if rule:
+            await apply_filter_action(update, context, rule.action, f"Blocked domain: {domain}")
+            return True
     
     return False
 
 async def check_media_filters(update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
-    """Check message against media filters"""
-    chat_id = update.effective_chat.id
-    message = update.message
-    
-    # Determine message type
-    media_type = None
-    if message.photo:
-        media_type = 'photo'
-    elif message.video:
-        media_type = 'video'
-    elif message.document:
-        media_type = 'document'
-    elif message.sticker:
-        media_type = 'sticker'
-    elif message.voice:
-        media_type = 'voice'
-    elif message.video_note:
-        media_type = 'video_note'
-    elif message.animation:
-        media_type = 'animation'
-    elif message.contact:
-        media_type = 'contact'
-    elif message.location:
-        media_type = 'location'
-    elif message.poll:
-        media_type = 'poll'
-    elif message.forward_from or message.forward_from_chat:
-        media_type = 'forward'
-    elif message.reply_to_message:
-        media_type = 'reply'
-    
-    if not media_type:
+    """Check message against the chat's locked message types"""
+    message_class = classify_message(update, context)
+    if not message_class.lock_bits:
         return False
     
-    session = db.get_session()
-    try:
-        media_filter = session.query(MediaFilter).filter(
-            MediaFilter.chat_id == chat_id,
-            MediaFilter.media_type == media_type,
-            MediaFilter.is_locked == True
-        ).first()
-        
-        if media_filter:
-            await apply_filter_action(update, context, media_filter.action, f"Locked media type: {media_type}")
-            return True
+    # Locks are part of the in-memory chat config; reloaded after /lock or /unlock
+    locks = (await chat_configs.get(update.effective_chat.id)).locks
+    lock_type = locks.first_locked(message_class.lock_bits)
     
-    finally:
-        session.close()
+    if lock_type:
+        await apply_filter_action(update, context, locks.actions[lock_type], f"Locked media type: {lock_type}")
+        return True
     
     return False
 
 async def check_spam_patterns(update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
-    """Check message against spam patterns"""
-    message_text = update.message.text
+    """Score message against the built-in and chat spam rules"""
+    scorer = await spam_scorers.get(update.effective_chat.id)
+    score, rules = scorer.score(update.message.text)
     
-    for pattern in SPAM_PATTERNS:
-        if re.search(pattern, message_text):
-            await apply_filter_action(update, context, 'delete', "Spam pattern detected")
-            return True
+    if rules and score >= Config.SPAM_SCORE_THRESHOLD:
+        await apply_filter_action(update, context, 'delete', f"Spam pattern detected (score {score:g})")
+        return True
     
     return False
 
@@ -455,15 +481,15 @@ async def apply_filter_action(update: Update, context: ContextTypes.DEFAULT_TYPE
         await context.bot.delete_message(chat_id, update.message.message_id)
         
         if action == 'warn':
-            db.add_warning(user_id, chat_id, context.bot.id, reason)
-            warning_count = db.get_warnings_count(user_id, chat_id)
+            await async_db.add_warning(user_id, chat_id, context.bot.id, reason)
+            warning_count = await async_db.get_warnings_count(user_id, chat_id)
             
             action_msg = await context.bot.send_message(
                 chat_id,
                 f"⚠️ {user.first_name} warned for: {reason}\n"
                 f"Warnings: {warning_count}/3"
             )
-            
+        
         elif action == 'mute':
             from datetime import datetime, timedelta
             until_date = datetime.now() + timedelta(hours=1)
@@ -474,13 +500,13 @@ async def apply_filter_action(update: Update, context: ContextTypes.DEFAULT_TYPE
                 permissions=context.bot.get_chat(chat_id).permissions,
                 until_date=until_date
             )
-            db.add_mute(user_id, chat_id, context.bot.id, 3600, reason)
+            await async_db.add_mute(user_id, chat_id, context.bot.id, 3600, reason)
             
             action_msg = await context.bot.send_message(
                 chat_id,
                 f"🔇 {user.first_name} muted for 1 hour: {reason}"
             )
-            
+        
         elif action == 'kick':
             await context.bot.ban_chat_member(chat_id, user_id)
             await context.bot.unban_chat_member(chat_id, user_id)
@@ -489,10 +515,10 @@ async def apply_filter_action(update: Update, context: ContextTypes.DEFAULT_TYPE
                 chat_id,
                 f"👢 {user.first_name} kicked: {reason}"
             )
-            
+        
         elif action == 'ban':
             await context.bot.ban_chat_member(chat_id, user_id)
-            db.add_ban(user_id, chat_id, context.bot.id, reason)
+            await async_db.add_ban(user_id, chat_id, context.bot.id, reason)
             
             action_msg = await context.bot.send_message(
                 chat_id,
@@ -501,13 +527,10 @@ async def apply_filter_action(update: Update, context: ContextTypes.DEFAULT_TYPE
         
         # Delete action message after 5 seconds (except for delete-only)
         if action != 'delete':
-            context.job_queue.run_once(
-                lambda context: context.bot.delete_message(chat_id, action_msg.message_id),
-                5
-            )
+            schedule_delete(chat_id, action_msg.message_id, 5)
         
         logger.info(f"Filter action {action} applied to user {user_id} in chat {chat_id}: {reason}")
-        
+    
     except Exception as e:
         logger.error(f"Error applying filter action: {e}")
 
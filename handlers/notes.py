@@ -1,13 +1,14 @@
 from telegram import Update
 from telegram.ext import ContextTypes
-from database import db
+from database import async_db
 from utils import is_admin_command, is_group_command
+from services.name_index import note_index
 import logging
 
 logger = logging.getLogger(__name__)
 
 # Add new table for notes system
-from sqlalchemy import Column, Integer, String, Boolean, Text, BigInteger, DateTime
+from sqlalchemy import Column, Integer, String, Boolean, Text, BigInteger, DateTime, Index, select
 from sqlalchemy.sql import func
 from database import Base
 
@@ -23,6 +24,10 @@ class Note(Base):
     created_by = Column(BigInteger)
     created_at = Column(DateTime, default=func.now())
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+    
+    __table_args__ = (
+        Index('ix_notes_chat_name', 'chat_id', 'name'),
+    )
 
 class Rule(Base):
     __tablename__ = 'rules'
@@ -99,13 +104,12 @@ async def save_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("❌ No content to save!")
         return
     
-    session = db.get_session()
-    try:
+    async with async_db.get_session() as session:
         # Check if note already exists
-        existing_note = session.query(Note).filter(
+        existing_note = (await session.execute(select(Note).where(
             Note.chat_id == chat_id,
             Note.name == note_name
-        ).first()
+        ).limit(1))).scalar()
         
         if existing_note:
             # Update existing note
@@ -113,7 +117,8 @@ async def save_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             existing_note.file_id = file_id
             existing_note.file_type = file_type
             existing_note.created_by = admin_id
-            session.commit()
+            await session.commit()
+            note_index.invalidate(chat_id, note_name)
             await update.message.reply_text(f"✅ Updated note '{note_name}'")
         else:
             # Create new note
@@ -126,11 +131,9 @@ async def save_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 created_by=admin_id
             )
             session.add(note)
-            session.commit()
+            await session.commit()
+            note_index.invalidate(chat_id, note_name)
             await update.message.reply_text(f"✅ Saved note '{note_name}'")
-    
-    finally:
-        session.close()
 
 async def get_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Get a note"""
@@ -141,12 +144,11 @@ async def get_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     note_name = context.args[0].lower()
     chat_id = update.effective_chat.id
     
-    session = db.get_session()
-    try:
-        note = session.query(Note).filter(
+    async with async_db.get_session() as session:
+        note = (await session.execute(select(Note).where(
             Note.chat_id == chat_id,
             Note.name == note_name
-        ).first()
+        ).limit(1))).scalar()
         
         if not note:
             await update.message.reply_text(f"❌ Note '{note_name}' not found.")
@@ -201,9 +203,6 @@ async def get_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         else:
             # Send text note
             await context.bot.send_message(chat_id, note.content, parse_mode='Markdown')
-    
-    finally:
-        session.close()
 
 @is_admin_command
 @is_group_command
@@ -216,30 +215,26 @@ async def clear_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     note_name = context.args[0].lower()
     chat_id = update.effective_chat.id
     
-    session = db.get_session()
-    try:
-        note = session.query(Note).filter(
+    async with async_db.get_session() as session:
+        note = (await session.execute(select(Note).where(
             Note.chat_id == chat_id,
             Note.name == note_name
-        ).first()
+        ).limit(1))).scalar()
         
         if note:
-            session.delete(note)
-            session.commit()
+            await session.delete(note)
+            await session.commit()
+            note_index.invalidate(chat_id, note_name)
             await update.message.reply_text(f"✅ Deleted note '{note_name}'")
         else:
             await update.message.reply_text(f"❌ Note '{note_name}' not found.")
-    
-    finally:
-        session.close()
 
 async def notes_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """List all notes"""
     chat_id = update.effective_chat.id
     
-    session = db.get_session()
-    try:
-        notes = session.query(Note).filter(Note.chat_id == chat_id).order_by(Note.name).all()
+    async with async_db.get_session() as session:
+        notes = (await session.scalars(select(Note).where(Note.chat_id == chat_id).order_by(Note.name))).all()
         
         if not notes:
             await update.message.reply_text("📝 No notes saved in this chat.")
@@ -254,9 +249,6 @@ async def notes_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         notes_list += "Use `/get <notename>` to retrieve a note."
         
         await update.message.reply_text(notes_list, parse_mode='Markdown')
-    
-    finally:
-        session.close()
 
 @is_admin_command
 @is_group_command
@@ -278,14 +270,13 @@ async def setrules_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     else:
         rules_text = ' '.join(context.args)
     
-    session = db.get_session()
-    try:
-        existing_rules = session.query(Rule).filter(Rule.chat_id == chat_id).first()
+    async with async_db.get_session() as session:
+        existing_rules = (await session.execute(select(Rule).where(Rule.chat_id == chat_id).limit(1))).scalar()
         
         if existing_rules:
             existing_rules.content = rules_text
             existing_rules.created_by = admin_id
-            session.commit()
+            await session.commit()
             await update.message.reply_text("✅ Updated chat rules!")
         else:
             rules = Rule(
@@ -294,19 +285,15 @@ async def setrules_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 created_by=admin_id
             )
             session.add(rules)
-            session.commit()
+            await session.commit()
             await update.message.reply_text("✅ Set chat rules!")
-    
-    finally:
-        session.close()
 
 async def rules_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Show chat rules"""
     chat_id = update.effective_chat.id
     
-    session = db.get_session()
-    try:
-        rules = session.query(Rule).filter(Rule.chat_id == chat_id).first()
+    async with async_db.get_session() as session:
+        rules = (await session.execute(select(Rule).where(Rule.chat_id == chat_id).limit(1))).scalar()
         
         if not rules:
             await update.message.reply_text("📋 No rules set for this chat.")
@@ -314,9 +301,6 @@ async def rules_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
         rules_text = f"📋 **{update.effective_chat.title} Rules:**\n\n{rules.content}"
         await update.message.reply_text(rules_text, parse_mode='Markdown')
-    
-    finally:
-        session.close()
 
 @is_admin_command
 @is_group_command
@@ -324,19 +308,15 @@ async def clearrules_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
     """Clear chat rules"""
     chat_id = update.effective_chat.id
     
-    session = db.get_session()
-    try:
-        rules = session.query(Rule).filter(Rule.chat_id == chat_id).first()
+    async with async_db.get_session() as session:
+        rules = (await session.execute(select(Rule).where(Rule.chat_id == chat_id).limit(1))).scalar()
         
         if rules:
-            session.delete(rules)
-            session.commit()
+            await session.delete(rules)
+            await session.commit()
             await update.message.reply_text("✅ Cleared chat rules!")
         else:
             await update.message.reply_text("❌ No rules to clear.")
-    
-    finally:
-        session.close()
 
 # Handle note shortcuts (e.g., #notename)
 async def handle_note_shortcut(update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
@@ -351,49 +331,42 @@ async def handle_note_shortcut(update: Update, context: ContextTypes.DEFAULT_TYP
         note_name = text[1:].lower()
         chat_id = update.effective_chat.id
         
-        session = db.get_session()
-        try:
-            note = session.query(Note).filter(
-                Note.chat_id == chat_id,
-                Note.name == note_name
-            ).first()
-            
-            if note:
-                # Send the note
-                if note.file_id and note.file_type:
-                    if note.file_type == 'photo':
-                        await context.bot.send_photo(
-                            chat_id,
-                            note.file_id,
-                            caption=note.content,
-                            parse_mode='Markdown'
-                        )
-                    elif note.file_type == 'video':
-                        await context.bot.send_video(
-                            chat_id,
-                            note.file_id,
-                            caption=note.content,
-                            parse_mode='Markdown'
-                        )
-                    elif note.file_type == 'document':
-                        await context.bot.send_document(
-                            chat_id,
-                            note.file_id,
-                            caption=note.content,
-                            parse_mode='Markdown'
-                        )
-                    elif note.file_type == 'sticker':
-                        await context.bot.send_sticker(chat_id, note.file_id)
-                        if note.content:
-                            await context.bot.send_message(chat_id, note.content, parse_mode='Markdown')
-                    # Add other media types as needed
-                else:
-                    await context.bot.send_message(chat_id, note.content, parse_mode='Markdown')
-                
-                return True
+        # Hashtags that are not notes are answered from memory
+        note = await note_index.get(chat_id, note_name)
         
-        finally:
-            session.close()
+        if note:
+            # Send the note
+            if note.file_id and note.file_type:
+                if note.file_type == 'photo':
+                    await context.bot.send_photo(
+                        chat_id,
+                        note.file_id,
+                        caption=note.content,
+                        parse_mode='Markdown'
+                    )
+                elif note.file_type == 'video':
+                    await context.bot.send_video(
+                        chat_id,
+                        note.file_id,
+                        caption=note.content,
+                        parse_mode='Markdown'
+                    )
+                elif note.file_type == 'document':
+                    await context.bot.send_document(
+                        chat_id,
+                        note.file_id,
+                        caption=note.content,
+                        parse_mode='Markdown'
+                    )
+                elif note.file_type == 'sticker':
+                    await context.bot.send_sticker(chat_id, note.file_id)
+                    if note.content:
+                        await context.bot.send_message(chat_id, note.content, parse_mode='Markdown')
+                # Add other media types as needed
+            else:
+                await context.bot.send_message(chat_id, note.content, parse_mode='Markdown')
+            
+            return True
     
     return False
 
@@ -1,14 +1,18 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
-from database import db
+from database import async_db, Admin
 from utils import is_admin_command, is_group_command, format_user_mention
+from services.chat_config import chat_configs
+from services.expiring_store import ExpiringStore
+from config import Config
 import logging
+import time
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
 # Add new table for reports
-from sqlalchemy import Column, Integer, String, Boolean, Text, BigInteger, DateTime
+from sqlalchemy import Column, Integer, String, Boolean, Text, BigInteger, DateTime, Index, select
 from sqlalchemy.sql import func
 from database import Base
 
@@ -25,6 +29,11 @@ class Report(Base):
     handled_by = Column(BigInteger)
     created_at = Column(DateTime, default=func.now())
     resolved_at = Column(DateTime)
+    
+    __table_args__ = (
+        Index('ix_reports_chat_created', 'chat_id', 'created_at'),
+        Index('ix_reports_chat_status', 'chat_id', 'status'),
+    )
 
 class ReportSettings(Base):
     __tablename__ = 'report_settings'
@@ -41,8 +50,11 @@ def update_reports_database():
     from database import db as database_instance
     Base.metadata.create_all(bind=database_instance.engine)
 
-# Track report cooldowns
-report_cooldowns = {}
+# Longest cooldown /reports cooldown accepts, in seconds
+MAX_REPORT_COOLDOWN = 3600
+
+# Track report cooldowns: (chat_id, reporter_id) -> monotonic time of the last report
+report_cooldowns = ExpiringStore(ttl=MAX_REPORT_COOLDOWN, max_entries=Config.REPORT_COOLDOWN_MAX_ENTRIES)
 
 async def report_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Report a message or user"""
@@ -64,19 +76,19 @@ async def report_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     # Check if reports are enabled
-    session = db.get_session()
-    try:
-        settings = session.query(ReportSettings).filter(ReportSettings.chat_id == chat_id).first()
+    settings = (await chat_configs.get(chat_id)).reports
+    async with async_db.get_session() as session:
         if settings and not settings.reports_enabled:
             await update.message.reply_text("❌ Reports are disabled in this chat.")
             return
         
         # Check cooldown
-        cooldown_key = f"{chat_id}:{reporter_id}"
-        now = datetime.now()
+        cooldown_key = (chat_id, reporter_id)
+        now = time.monotonic()
+        last_report = report_cooldowns.get(cooldown_key)
         
-        if cooldown_key in report_cooldowns:
-            time_diff = (now - report_cooldowns[cooldown_key]).total_seconds()
+        if last_report is not None:
+            time_diff = now - last_report
             cooldown_time = settings.report_cooldown if settings else 300
             
             if time_diff < cooldown_time:
@@ -87,7 +99,7 @@ async def report_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 return
         
         # Check if user is trying to report an admin
-        if db.is_admin(reported_user.id, chat_id):
+        if await async_db.is_admin(reported_user.id, chat_id):
             await update.message.reply_text("❌ You cannot report an admin.")
             return
         
@@ -108,10 +120,10 @@ async def report_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             reason=reason
         )
         session.add(report)
-        session.commit()
+        await session.commit()
         
         # Update cooldown
-        report_cooldowns[cooldown_key] = now
+        report_cooldowns.set(cooldown_key, now)
         
         # Delete the report command message
         try:
@@ -133,16 +145,12 @@ async def report_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             )
         except:
             pass  # User might have blocked the bot
-    
-    finally:
-        session.close()
 
 async def send_report_to_admins(context: ContextTypes.DEFAULT_TYPE, report: Report, reported_message, chat):
     """Send report notification to admins"""
-    session = db.get_session()
-    try:
+    async with async_db.get_session() as session:
         # Get all admins
-        admins = session.query(db.Admin).filter(db.Admin.chat_id == report.chat_id).all()
+        admins = (await session.scalars(select(Admin).where(Admin.chat_id == report.chat_id))).all()
         
         # Get user info
         reporter = await context.bot.get_chat_member(report.chat_id, report.reporter_id)
@@ -197,9 +205,6 @@ async def send_report_to_admins(context: ContextTypes.DEFAULT_TYPE, report: Repo
                 )
             except:
                 pass  # Admin might have blocked the bot
-    
-    finally:
-        session.close()
 
 async def handle_report_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle report action buttons"""
@@ -214,15 +219,14 @@ async def handle_report_callback(update: Update, context: ContextTypes.DEFAULT_T
     report_id = int(data[2])
     admin_id = query.from_user.id
     
-    session = db.get_session()
-    try:
-        report = session.query(Report).filter(Report.id == report_id).first()
+    async with async_db.get_session() as session:
+        report = (await session.execute(select(Report).where(Report.id == report_id).limit(1))).scalar()
         if not report:
             await query.edit_message_text("❌ Report not found.")
             return
         
         # Check if user is admin
-        if not db.is_admin(admin_id, report.chat_id):
+        if not await async_db.is_admin(admin_id, report.chat_id):
             await query.answer("❌ You need to be an admin to handle reports!", show_alert=True)
             return
         
@@ -237,14 +241,14 @@ async def handle_report_callback(update: Update, context: ContextTypes.DEFAULT_T
         try:
             if action == 'ban':
                 await context.bot.ban_chat_member(chat_id, reported_user_id)
-                db.add_ban(reported_user_id, chat_id, admin_id, f"Report: {report.reason}")
+                await async_db.add_ban(reported_user_id, chat_id, admin_id, f"Report: {report.reason}")
                 action_text = "banned"
-                
+            
             elif action == 'kick':
                 await context.bot.ban_chat_member(chat_id, reported_user_id)
                 await context.bot.unban_chat_member(chat_id, reported_user_id)
                 action_text = "kicked"
-                
+            
             elif action == 'mute':
                 from datetime import datetime, timedelta
                 until_date = datetime.now() + timedelta(hours=1)
@@ -254,23 +258,23 @@ async def handle_report_callback(update: Update, context: ContextTypes.DEFAULT_T
                     permissions=context.bot.get_chat(chat_id).permissions,
                     until_date=until_date
                 )
-                db.add_mute(reported_user_id, chat_id, admin_id, 3600, f"Report: {report.reason}")
+                await async_db.add_mute(reported_user_id, chat_id, admin_id, 3600, f"Report: {report.reason}")
                 action_text = "muted for 1 hour"
-                
+            
             elif action == 'warn':
-                db.add_warning(reported_user_id, chat_id, admin_id, f"Report: {report.reason}")
+                await async_db.add_warning(reported_user_id, chat_id, admin_id, f"Report: {report.reason}")
                 action_text = "warned"
-                
+            
             elif action == 'delete':
                 try:
                     await context.bot.delete_message(chat_id, report.message_id)
                     action_text = "message deleted"
                 except:
                     action_text = "message deletion failed"
-                    
+            
             elif action == 'resolve':
                 action_text = "resolved without action"
-                
+            
             elif action == 'dismiss':
                 action_text = "dismissed"
             
@@ -278,7 +282,7 @@ async def handle_report_callback(update: Update, context: ContextTypes.DEFAULT_T
             report.status = 'resolved' if action in ['ban', 'kick', 'mute', 'warn', 'delete', 'resolve'] else 'dismissed'
             report.handled_by = admin_id
             report.resolved_at = datetime.now()
-            session.commit()
+            await session.commit()
             
             # Update message
             await query.edit_message_text(
@@ -297,15 +301,12 @@ async def handle_report_callback(update: Update, context: ContextTypes.DEFAULT_T
                 )
             except:
                 pass
-            
+        
         except Exception as e:
             await query.edit_message_text(
                 f"{query.message.text}\n\n❌ **Failed to {action}: {str(e)}**",
                 parse_mode='Markdown'
             )
-    
-    finally:
-        session.close()
 
 @is_admin_command
 @is_group_command
@@ -314,21 +315,21 @@ async def reports_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not context.args:
         # Show current settings
         chat_id = update.effective_chat.id
-        session = db.get_session()
-        try:
-            settings = session.query(ReportSettings).filter(ReportSettings.chat_id == chat_id).first()
+        async with async_db.get_session() as session:
+            settings = (await session.execute(select(ReportSettings).where(ReportSettings.chat_id == chat_id).limit(1))).scalar()
             
             if not settings:
                 settings = ReportSettings(chat_id=chat_id)
                 session.add(settings)
-                session.commit()
+                await session.commit()
+                chat_configs.invalidate(chat_id)
             
             # Get report statistics
-            total_reports = session.query(Report).filter(Report.chat_id == chat_id).count()
-            pending_reports = session.query(Report).filter(
+            total_reports = await session.scalar(select(func.count(Report.id)).where(Report.chat_id == chat_id))
+            pending_reports = await session.scalar(select(func.count(Report.id)).where(
                 Report.chat_id == chat_id,
                 Report.status == 'pending'
-            ).count()
+            ))
             
             settings_text = f"""📊 **Report Settings**
 
@@ -349,9 +350,6 @@ async def reports_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 • `/reporthistory` - View report history"""
             
             await update.message.reply_text(settings_text, parse_mode='Markdown')
-        
-        finally:
-            session.close()
         return
     
     # Handle settings
@@ -359,70 +357,61 @@ async def reports_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         status = context.args[0].lower() == 'on'
         chat_id = update.effective_chat.id
         
-        session = db.get_session()
-        try:
-            settings = session.query(ReportSettings).filter(ReportSettings.chat_id == chat_id).first()
+        async with async_db.get_session() as session:
+            settings = (await session.execute(select(ReportSettings).where(ReportSettings.chat_id == chat_id).limit(1))).scalar()
             
             if settings:
                 settings.reports_enabled = status
-                session.commit()
+                await session.commit()
             else:
                 settings = ReportSettings(chat_id=chat_id, reports_enabled=status)
                 session.add(settings)
-                session.commit()
+                await session.commit()
+            chat_configs.invalidate(chat_id)
             
             await update.message.reply_text(f"✅ Reports {'enabled' if status else 'disabled'}.")
-        
-        finally:
-            session.close()
     
     elif len(context.args) >= 2 and context.args[0].lower() == 'adminonly':
         status = context.args[1].lower() == 'on'
         chat_id = update.effective_chat.id
         
-        session = db.get_session()
-        try:
-            settings = session.query(ReportSettings).filter(ReportSettings.chat_id == chat_id).first()
+        async with async_db.get_session() as session:
+            settings = (await session.execute(select(ReportSettings).where(ReportSettings.chat_id == chat_id).limit(1))).scalar()
             
             if settings:
                 settings.admin_only = status
-                session.commit()
+                await session.commit()
             else:
                 settings = ReportSettings(chat_id=chat_id, admin_only=status)
                 session.add(settings)
-                session.commit()
+                await session.commit()
+            chat_configs.invalidate(chat_id)
             
             await update.message.reply_text(
                 f"✅ Admin only reports {'enabled' if status else 'disabled'}."
             )
-        
-        finally:
-            session.close()
     
     elif len(context.args) >= 2 and context.args[0].lower() == 'cooldown':
         try:
             cooldown = int(context.args[1])
-            if cooldown < 0 or cooldown > 3600:
-                await update.message.reply_text("❌ Cooldown must be between 0 and 3600 seconds.")
+            if cooldown < 0 or cooldown > MAX_REPORT_COOLDOWN:
+                await update.message.reply_text(f"❌ Cooldown must be between 0 and {MAX_REPORT_COOLDOWN} seconds.")
                 return
             
             chat_id = update.effective_chat.id
-            session = db.get_session()
-            try:
-                settings = session.query(ReportSettings).filter(ReportSettings.chat_id == chat_id).first()
+            async with async_db.get_session() as session:
+                settings = (await session.execute(select(ReportSettings).where(ReportSettings.chat_id == chat_id).limit(1))).scalar()
                 
                 if settings:
                     settings.report_cooldown = cooldown
-                    session.commit()
+                    await session.commit()
                 else:
                     settings = ReportSettings(chat_id=chat_id, report_cooldown=cooldown)
                     session.add(settings)
-                    session.commit()
+                    await session.commit()
+                chat_configs.invalidate(chat_id)
                 
                 await update.message.reply_text(f"✅ Report cooldown set to {cooldown} seconds.")
-            
-            finally:
-                session.close()
         
         except ValueError:
             await update.message.reply_text("❌ Invalid cooldown value.")
@@ -433,11 +422,10 @@ async def reporthistory_command(update: Update, context: ContextTypes.DEFAULT_TY
     """Show report history"""
     chat_id = update.effective_chat.id
     
-    session = db.get_session()
-    try:
-        reports = session.query(Report).filter(
+    async with async_db.get_session() as session:
+        reports = (await session.scalars(select(Report).where(
             Report.chat_id == chat_id
-        ).order_by(Report.created_at.desc()).limit(10).all()
+        ).order_by(Report.created_at.desc()).limit(10))).all()
         
         if not reports:
             await update.message.reply_text("📊 No reports found for this chat.")
@@ -462,9 +450,6 @@ async def reporthistory_command(update: Update, context: ContextTypes.DEFAULT_TY
             history_text += "\n"
         
         await update.message.reply_text(history_text, parse_mode='Markdown')
-    
-    finally:
-        session.close()
 
 # Initialize database
 update_reports_database()
\ No newline at end of file
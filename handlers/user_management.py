@@ -2,17 +2,51 @@ from telegram import Update
 from telegram.ext import ContextTypes
 from telegram.constants import ChatMemberStatus
 from telegram.error import BadRequest
-from database import db
+from telegram.helpers import escape_markdown
+from database import async_db, Admin, Ban
 from utils import (
     is_admin_command, is_group_command, get_user_from_message, 
     format_user_mention, parse_time_string, format_time_duration
 )
+from services.fanout import fan_out, FanOutSummary
 from config import Config
 import logging
 from datetime import datetime, timedelta
+from sqlalchemy import select
 
 logger = logging.getLogger(__name__)
 
+async def global_fan_out(action, status_message=None, status_text: str = ''):
+    """Run action(chat_id) in every registered chat, editing status_message with progress"""
+    progress = None
+    if status_message:
+        total = await async_db.count_chats()
+        reported = -1
+        
+        async def progress(summary):
+            nonlocal reported
+            if len(summary) != reported:
+                reported = len(summary)
+                await status_message.edit_text(f"{status_text}\n⏳ {reported}/{total} chats done...", parse_mode='Markdown')
+    
+    return await fan_out(
+        async_db.iter_chat_ids(),
+        action,
+        concurrency=Config.FANOUT_CONCURRENCY,
+        rate=Config.FANOUT_RATE,
+        progress=progress,
+        progress_interval=Config.FANOUT_PROGRESS_INTERVAL,
+    )
+
+def fan_out_failures(summary: FanOutSummary) -> str:
+    """Failure lines for a global action's final status message"""
+    if not summary.failed:
+        return ""
+    text = f"\n**Failed in {summary.failed} chats:**"
+    for error, count in summary.errors():
+        text += f"\n• {escape_markdown(error)}: {count}"
+    return text
+
 @is_admin_command
 @is_group_command
 async def promote_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -27,7 +61,7 @@ async def promote_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     if user_id:
         # Add to database
-        if db.add_admin(user_id, chat_id):
+        if await async_db.add_admin(user_id, chat_id):
             # Try to promote in Telegram
             try:
                 await context.bot.promote_chat_member(
@@ -72,21 +106,18 @@ async def title_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             )
             
             # Update in database
-            session = db.get_session()
-            try:
-                admin = session.query(db.Admin).filter(
-                    db.Admin.user_id == user_id,
-                    db.Admin.chat_id == chat_id
-                ).first()
+            async with async_db.get_session() as session:
+                admin = (await session.execute(select(Admin).where(
+                    Admin.user_id == user_id,
+                    Admin.chat_id == chat_id
+                ).limit(1))).scalar()
                 if admin:
                     admin.title = title
-                    session.commit()
-            finally:
-                session.close()
+                    await session.commit()
             
             user_mention = format_user_mention(user_obj) if user_obj else f"User {user_id}"
             await update.message.reply_text(f"✅ Set title '{title}' for {user_mention}!", parse_mode='Markdown')
-            
+        
         except BadRequest as e:
             await update.message.reply_text(f"❌ Failed to set title: {e}")
 
@@ -104,7 +135,7 @@ async def demote_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     if user_id:
         # Remove from database
-        if db.remove_admin(user_id, chat_id):
+        if await async_db.remove_admin(user_id, chat_id):
             # Try to demote in Telegram
             try:
                 await context.bot.promote_chat_member(
@@ -142,7 +173,7 @@ async def ban_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await context.bot.ban_chat_member(chat_id, user_id)
             
             # Add to database
-            db.add_ban(user_id, chat_id, admin_id, reason)
+            await async_db.add_ban(user_id, chat_id, admin_id, reason)
             
             user_mention = format_user_mention(user_obj) if user_obj else f"User {user_id}"
             await update.message.reply_text(
@@ -150,7 +181,7 @@ async def ban_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 f"**Reason:** {reason}",
                 parse_mode='Markdown'
             )
-            
+        
         except BadRequest as e:
             await update.message.reply_text(f"❌ Failed to ban user: {e}")
 
@@ -170,14 +201,14 @@ async def sban_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if user_id:
         try:
             await context.bot.ban_chat_member(chat_id, user_id)
-            db.add_ban(user_id, chat_id, admin_id, reason)
+            await async_db.add_ban(user_id, chat_id, admin_id, reason)
             
             # Delete the command message
             try:
                 await context.bot.delete_message(chat_id, update.message.message_id)
             except:
                 pass
-                
+        
         except BadRequest:
             pass  # Silent command, no error message
 
@@ -195,29 +226,24 @@ async def gban_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     if user_id:
         # Add global ban to database
-        db.add_ban(user_id, 0, admin_id, reason, is_global=True)
-        
-        # Try to ban from all registered chats
-        session = db.get_session()
-        banned_chats = 0
-        try:
-            chats = session.query(db.Chat).all()
-            for chat in chats:
-                try:
-                    await context.bot.ban_chat_member(chat.id, user_id)
-                    banned_chats += 1
-                except:
-                    pass  # Chat might be inactive or bot removed
-        finally:
-            session.close()
+        await async_db.add_ban(user_id, 0, admin_id, reason, is_global=True)
         
         user_mention = format_user_mention(user_obj) if user_obj else f"User {user_id}"
-        await update.message.reply_text(
-            f"🌐 {user_mention} has been globally banned!\n"
-            f"**Reason:** {reason}\n"
-            f"**Banned from {banned_chats} chats**",
-            parse_mode='Markdown'
-        )
+        status_text = f"🌐 {user_mention} has been globally banned!\n**Reason:** {reason}"
+        status_message = await update.message.reply_text(status_text, parse_mode='Markdown')
+        
+        async def ban_everywhere():
+            summary = await global_fan_out(
+                lambda chat_id: context.bot.ban_chat_member(chat_id, user_id),
+                status_message, status_text
+            )
+            await status_message.edit_text(
+                f"{status_text}\n**Banned from {summary.succeeded} chats**{fan_out_failures(summary)}",
+                parse_mode='Markdown'
+            )
+        
+        # Ban from all registered chats in the background so other updates are not held up
+        context.application.create_task(ban_everywhere(), update=update)
 
 @is_admin_command
 async def sgban_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -231,19 +257,13 @@ async def sgban_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     reason = ' '.join(context.args[1:]) if len(context.args) > 1 else "Silent global ban"
     
     if user_id:
-        db.add_ban(user_id, 0, admin_id, reason, is_global=True)
+        await async_db.add_ban(user_id, 0, admin_id, reason, is_global=True)
         
-        # Ban from all chats silently
-        session = db.get_session()
-        try:
-            chats = session.query(db.Chat).all()
-            for chat in chats:
-                try:
-                    await context.bot.ban_chat_member(chat.id, user_id)
-                except:
-                    pass
-        finally:
-            session.close()
+        # Ban from all chats silently, in the background
+        context.application.create_task(
+            global_fan_out(lambda chat_id: context.bot.ban_chat_member(chat_id, user_id)),
+            update=update
+        )
         
         # Delete command message
         try:
@@ -268,11 +288,11 @@ async def unban_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await context.bot.unban_chat_member(chat_id, user_id)
             
             # Remove from database
-            db.remove_ban(user_id, chat_id)
+            await async_db.remove_ban(user_id, chat_id)
             
             user_mention = format_user_mention(user_obj) if user_obj else f"User {user_id}"
             await update.message.reply_text(f"✅ {user_mention} has been unbanned!", parse_mode='Markdown')
-            
+        
         except BadRequest as e:
             await update.message.reply_text(f"❌ Failed to unban user: {e}")
 
@@ -288,27 +308,24 @@ async def gunban_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     if user_id:
         # Remove global ban from database
-        if db.remove_ban(user_id, is_global=True):
-            # Unban from all chats
-            session = db.get_session()
-            unbanned_chats = 0
-            try:
-                chats = session.query(db.Chat).all()
-                for chat in chats:
-                    try:
-                        await context.bot.unban_chat_member(chat.id, user_id)
-                        unbanned_chats += 1
-                    except:
-                        pass
-            finally:
-                session.close()
-            
+        if await async_db.remove_ban(user_id, is_global=True):
             user_mention = format_user_mention(user_obj) if user_obj else f"User {user_id}"
-            await update.message.reply_text(
-                f"🌐 {user_mention} has been globally unbanned!\n"
-                f"**Unbanned from {unbanned_chats} chats**",
-                parse_mode='Markdown'
-            )
+            status_text = f"🌐 {user_mention} has been globally unbanned!"
+            status_message = await update.message.reply_text(status_text, parse_mode='Markdown')
+            
+            async def unban_everywhere():
+                # only_if_banned: unbanning a current member would remove them from the chat
+                summary = await global_fan_out(
+                    lambda chat_id: context.bot.unban_chat_member(chat_id, user_id, only_if_banned=True),
+                    status_message, status_text
+                )
+                await status_message.edit_text(
+                    f"{status_text}\n**Unbanned from {summary.succeeded} chats**{fan_out_failures(summary)}",
+                    parse_mode='Markdown'
+                )
+            
+            # Unban from all chats in the background
+            context.application.create_task(unban_everywhere(), update=update)
         else:
             await update.message.reply_text("❌ User is not globally banned.")
 
@@ -318,11 +335,10 @@ async def banlist_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """View list of banned users"""
     chat_id = update.effective_chat.id
     
-    session = db.get_session()
-    try:
-        bans = session.query(db.Ban).filter(
-            (db.Ban.chat_id == chat_id) | (db.Ban.is_global == True)
-        ).order_by(db.Ban.created_at.desc()).limit(20).all()
+    async with async_db.get_session() as session:
+        bans = (await session.scalars(select(Ban).where(
+            (Ban.chat_id == chat_id) | (Ban.is_global == True)
+        ).order_by(Ban.created_at.desc()).limit(20))).all()
         
         if not bans:
             await update.message.reply_text("📋 No banned users found.")
@@ -337,9 +353,6 @@ async def banlist_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             ban_list += f"   Date: {ban.created_at.strftime('%Y-%m-%d %H:%M')}\n\n"
         
         await update.message.reply_text(ban_list, parse_mode='Markdown')
-        
-    finally:
-        session.close()
 
 @is_admin_command
 @is_group_command
@@ -365,7 +378,7 @@ async def kick_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 f"**Reason:** {reason}",
                 parse_mode='Markdown'
             )
-            
+        
         except BadRequest as e:
             await update.message.reply_text(f"❌ Failed to kick user: {e}")
 
@@ -390,7 +403,7 @@ async def skick_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 await context.bot.delete_message(chat_id, update.message.message_id)
             except:
                 pass
-                
+        
         except BadRequest:
             pass
 
@@ -406,27 +419,23 @@ async def gkick_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     reason = ' '.join(context.args[1:]) if len(context.args) > 1 else "Global kick"
     
     if user_id:
-        session = db.get_session()
-        kicked_chats = 0
-        try:
-            chats = session.query(db.Chat).all()
-            for chat in chats:
-                try:
-                    await context.bot.ban_chat_member(chat.id, user_id)
-                    await context.bot.unban_chat_member(chat.id, user_id)
-                    kicked_chats += 1
-                except:
-                    pass
-        finally:
-            session.close()
-        
         user_mention = format_user_mention(user_obj) if user_obj else f"User {user_id}"
-        await update.message.reply_text(
-            f"🌐 {user_mention} has been globally kicked!\n"
-            f"**Reason:** {reason}\n"
-            f"**Kicked from {kicked_chats} chats**",
-            parse_mode='Markdown'
-        )
+        status_text = f"🌐 {user_mention} has been globally kicked!\n**Reason:** {reason}"
+        status_message = await update.message.reply_text(status_text, parse_mode='Markdown')
+        
+        async def kick(chat_id):
+            await context.bot.ban_chat_member(chat_id, user_id)
+            await context.bot.unban_chat_member(chat_id, user_id)
+        
+        async def kick_everywhere():
+            summary = await global_fan_out(kick, status_message, status_text)
+            await status_message.edit_text(
+                f"{status_text}\n**Kicked from {summary.succeeded} chats**{fan_out_failures(summary)}",
+                parse_mode='Markdown'
+            )
+        
+        # Kick from all chats in the background
+        context.application.create_task(kick_everywhere(), update=update)
 
 @is_admin_command
 @is_group_command
@@ -464,7 +473,7 @@ async def mute_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             )
             
             # Add to database
-            db.add_mute(user_id, chat_id, admin_id, duration, reason)
+            await async_db.add_mute(user_id, chat_id, admin_id, duration, reason)
             
             user_mention = format_user_mention(user_obj) if user_obj else f"User {user_id}"
             await update.message.reply_text(
@@ -472,7 +481,7 @@ async def mute_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 f"**Reason:** {reason}",
                 parse_mode='Markdown'
             )
-            
+        
         except BadRequest as e:
             await update.message.reply_text(f"❌ Failed to mute user: {e}")
 
@@ -500,11 +509,11 @@ async def unmute_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             )
             
             # Remove from database
-            db.remove_mute(user_id, chat_id)
+            await async_db.remove_mute(user_id, chat_id)
             
             user_mention = format_user_mention(user_obj) if user_obj else f"User {user_id}"
             await update.message.reply_text(f"🔊 {user_mention} has been unmuted!", parse_mode='Markdown')
-            
+        
         except BadRequest as e:
             await update.message.reply_text(f"❌ Failed to unmute user: {e}")
 
@@ -535,13 +544,13 @@ async def smute_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 until_date=until_date
             )
             
-            db.add_mute(user_id, chat_id, admin_id, duration, "Silent mute")
+            await async_db.add_mute(user_id, chat_id, admin_id, duration, "Silent mute")
             
             # Delete command message
             try:
                 await context.bot.delete_message(chat_id, update.message.message_id)
             except:
                 pass
-                
+        
         except BadRequest:
             pass
\ No newline at end of file
@@ -1,7 +1,8 @@
 from telegram import Update
 from telegram.ext import ContextTypes
-from database import db
+from database import async_db, Admin, Chat
 import logging
+from sqlalchemy import select
 
 logger = logging.getLogger(__name__)
 
@@ -24,12 +25,11 @@ async def verify_admin_message(update: Update, context: ContextTypes.DEFAULT_TYP
     verifier_user = update.effective_user
     
     # Check if the forwarded user is an admin in any chat where the bot is present
-    session = db.get_session()
-    try:
+    async with async_db.get_session() as session:
         # Get all chats where the forwarded user is an admin
-        admin_chats = session.query(db.Admin).filter(
-            db.Admin.user_id == forwarded_user.id
-        ).all()
+        admin_chats = (await session.scalars(select(Admin).where(
+            Admin.user_id == forwarded_user.id
+        ))).all()
         
         if not admin_chats:
             await message.reply_text(
@@ -45,7 +45,7 @@ async def verify_admin_message(update: Update, context: ContextTypes.DEFAULT_TYP
         # Get chat information for admin chats
         admin_chat_info = []
         for admin in admin_chats:
-            chat = session.query(db.Chat).filter(db.Chat.id == admin.chat_id).first()
+            chat = (await session.execute(select(Chat).where(Chat.id == admin.chat_id).limit(1))).scalar()
             if chat:
                 admin_chat_info.append({
                     'chat_title': chat.title or f"Chat {chat.id}",
@@ -85,9 +85,6 @@ async def verify_admin_message(update: Update, context: ContextTypes.DEFAULT_TYP
         logger.info(
             f"Admin verification: User {verifier_user.id} verified admin status of user {forwarded_user.id}"
         )
-        
-    finally:
-        session.close()
 
 async def verify_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
@@ -1,10 +1,11 @@
 from telegram import Update
 from telegram.ext import ContextTypes
 from telegram.error import BadRequest
-from database import db
+from database import async_db, Warning
 from utils import is_admin_command, is_group_command, get_user_from_message, format_user_mention
 from config import Config
 import logging
+from sqlalchemy import func, select
 
 logger = logging.getLogger(__name__)
 
@@ -24,10 +25,10 @@ async def warn_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     if user_id:
         # Add warning to database
-        db.add_warning(user_id, chat_id, admin_id, reason)
+        await async_db.add_warning(user_id, chat_id, admin_id, reason)
         
         # Get current warning count
-        warning_count = db.get_warnings_count(user_id, chat_id)
+        warning_count = await async_db.get_warnings_count(user_id, chat_id)
         
         user_mention = format_user_mention(user_obj) if user_obj else f"User {user_id}"
         
@@ -41,7 +42,7 @@ async def warn_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         if warning_count >= Config.MAX_WARNINGS:
             try:
                 await context.bot.ban_chat_member(chat_id, user_id)
-                db.add_ban(user_id, chat_id, admin_id, f"Exceeded warning limit ({Config.MAX_WARNINGS} warnings)")
+                await async_db.add_ban(user_id, chat_id, admin_id, f"Exceeded warning limit ({Config.MAX_WARNINGS} warnings)")
                 warning_msg += f"\n\n🔨 **User has been banned for exceeding the warning limit!**"
             except BadRequest as e:
                 warning_msg += f"\n\n❌ **Failed to auto-ban user: {e}**"
@@ -62,16 +63,13 @@ async def gwarn_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     if user_id:
         # Add global warning
-        db.add_warning(user_id, 0, admin_id, reason, is_global=True)
+        await async_db.add_warning(user_id, 0, admin_id, reason, is_global=True)
         
         # Get total warning count across all chats
-        session = db.get_session()
-        try:
-            total_warnings = session.query(db.Warning).filter(
-                db.Warning.user_id == user_id
-            ).count()
-        finally:
-            session.close()
+        async with async_db.get_session() as session:
+            total_warnings = await session.scalar(select(func.count(Warning.id)).where(
+                Warning.user_id == user_id
+            ))
         
         user_mention = format_user_mention(user_obj) if user_obj else f"User {user_id}"
         
@@ -97,14 +95,14 @@ async def swarn_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     if user_id:
         # Add warning
-        db.add_warning(user_id, chat_id, admin_id, reason)
+        await async_db.add_warning(user_id, chat_id, admin_id, reason)
         
         # Check if user should be banned
-        warning_count = db.get_warnings_count(user_id, chat_id)
+        warning_count = await async_db.get_warnings_count(user_id, chat_id)
         if warning_count >= Config.MAX_WARNINGS:
             try:
                 await context.bot.ban_chat_member(chat_id, user_id)
-                db.add_ban(user_id, chat_id, admin_id, f"Exceeded warning limit ({Config.MAX_WARNINGS} warnings)")
+                await async_db.add_ban(user_id, chat_id, admin_id, f"Exceeded warning limit ({Config.MAX_WARNINGS} warnings)")
             except BadRequest:
                 pass
         
@@ -127,8 +125,8 @@ async def unwarn_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = update.effective_chat.id
     
     if user_id:
-        if db.remove_warning(user_id, chat_id):
-            warning_count = db.get_warnings_count(user_id, chat_id)
+        if await async_db.remove_warning(user_id, chat_id):
+            warning_count = await async_db.get_warnings_count(user_id, chat_id)
             user_mention = format_user_mention(user_obj) if user_obj else f"User {user_id}"
             
             await update.message.reply_text(
@@ -152,7 +150,7 @@ async def resetwarns_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
     chat_id = update.effective_chat.id
     
     if user_id:
-        removed_count = db.reset_warnings(user_id, chat_id)
+        removed_count = await async_db.reset_warnings(user_id, chat_id)
         user_mention = format_user_mention(user_obj) if user_obj else f"User {user_id}"
         
         if removed_count > 0:
@@ -177,16 +175,15 @@ async def warnings_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = update.effective_chat.id
     
     if user_id:
-        warning_count = db.get_warnings_count(user_id, chat_id)
+        warning_count = await async_db.get_warnings_count(user_id, chat_id)
         user_mention = format_user_mention(user_obj) if user_obj else f"User {user_id}"
         
         # Get recent warnings
-        session = db.get_session()
-        try:
-            recent_warnings = session.query(db.Warning).filter(
-                db.Warning.user_id == user_id,
-                (db.Warning.chat_id == chat_id) | (db.Warning.is_global == True)
-            ).order_by(db.Warning.created_at.desc()).limit(5).all()
+        async with async_db.get_session() as session:
+            recent_warnings = (await session.scalars(select(Warning).where(
+                Warning.user_id == user_id,
+                (Warning.chat_id == chat_id) | (Warning.is_global == True)
+            ).order_by(Warning.created_at.desc()).limit(5))).all()
             
             warning_msg = (
                 f"⚠️ **Warning Status for {user_mention}**\n\n"
@@ -202,7 +199,4 @@ async def warnings_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             else:
                 warning_msg += "\n✅ No warnings found!"
             
-            await update.message.reply_text(warning_msg, parse_mode='Markdown')
-            
-        finally:
-            session.close()
\ No newline at end of file
+            await update.message.reply_text(warning_msg, parse_mode='Markdown')
\ No newline at end of file
@@ -1,13 +1,22 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
-from database import db
+from database import async_db
 from utils import is_admin_command, is_group_command, format_user_mention
+from services.chat_config import chat_configs
+from services.outbound import COSMETIC
+from services.deletion_scheduler import schedule_delete
+from services.join_pipeline import join_pipeline
 import logging
+from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+# Users named in one aggregated captcha or welcome message
+MAX_NAMES_PER_MESSAGE = 30
+
 # Add new tables for welcome system
-from sqlalchemy import Column, Integer, String, Boolean, Text, BigInteger, DateTime
+from sqlalchemy import Column, Integer, String, Boolean, Text, BigInteger, DateTime, Index
+from sqlalchemy import delete, insert, select
 from sqlalchemy.sql import func
 from database import Base
 
@@ -38,11 +47,30 @@ class PendingUsers(Base):
     user_id = Column(BigInteger)
     join_time = Column(DateTime, default=func.now())
     captcha_message_id = Column(Integer)
+    
+    __table_args__ = (
+        Index('ix_pending_users_chat_user', 'chat_id', 'user_id'),
+        Index('ix_pending_users_join_time', 'join_time'),
+    )
 
 def update_welcome_database():
     from database import db as database_instance
     Base.metadata.create_all(bind=database_instance.engine)
 
+async def update_welcome_settings(chat_id: int, **values):
+    """Set welcome settings columns for a chat, creating its row if needed"""
+    async with async_db.get_session() as session:
+        settings = (await session.execute(
+            select(WelcomeSettings).where(WelcomeSettings.chat_id == chat_id).limit(1)
+        )).scalar()
+        if settings:
+            for column, value in values.items():
+                setattr(settings, column, value)
+        else:
+            session.add(WelcomeSettings(chat_id=chat_id, **values))
+        await session.commit()
+    chat_configs.invalidate(chat_id)
+
 @is_admin_command
 @is_group_command
 async def setwelcome_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -68,30 +96,12 @@ async def setwelcome_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
     welcome_text = ' '.join(context.args)
     chat_id = update.effective_chat.id
     
-    session = db.get_session()
-    try:
-        settings = session.query(WelcomeSettings).filter(WelcomeSettings.chat_id == chat_id).first()
-        
-        if settings:
-            settings.welcome_message = welcome_text
-            settings.welcome_enabled = True
-            session.commit()
-        else:
-            settings = WelcomeSettings(
-                chat_id=chat_id,
-                welcome_message=welcome_text,
-                welcome_enabled=True
-            )
-            session.add(settings)
-            session.commit()
-        
-        await update.message.reply_text(
-            f"✅ Welcome message set!\n\n**Preview:**\n{format_welcome_message(welcome_text, update.effective_user, update.effective_chat)}",
-            parse_mode='Markdown'
-        )
+    await update_welcome_settings(chat_id, welcome_message=welcome_text, welcome_enabled=True)
     
-    finally:
-        session.close()
+    await update.message.reply_text(
+        f"✅ Welcome message set!\n\n**Preview:**\n{format_welcome_message(welcome_text, update.effective_user, update.effective_chat)}",
+        parse_mode='Markdown'
+    )
 
 @is_admin_command
 @is_group_command
@@ -108,30 +118,12 @@ async def setgoodbye_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
     goodbye_text = ' '.join(context.args)
     chat_id = update.effective_chat.id
     
-    session = db.get_session()
-    try:
-        settings = session.query(WelcomeSettings).filter(WelcomeSettings.chat_id == chat_id).first()
-        
-        if settings:
-            settings.goodbye_message = goodbye_text
-            settings.goodbye_enabled = True
-            session.commit()
-        else:
-            settings = WelcomeSettings(
-                chat_id=chat_id,
-                goodbye_message=goodbye_text,
-                goodbye_enabled=True
-            )
-            session.add(settings)
-            session.commit()
-        
-        await update.message.reply_text(
-            f"✅ Goodbye message set!\n\n**Preview:**\n{format_welcome_message(goodbye_text, update.effective_user, update.effective_chat)}",
-            parse_mode='Markdown'
-        )
+    await update_welcome_settings(chat_id, goodbye_message=goodbye_text, goodbye_enabled=True)
     
-    finally:
-        session.close()
+    await update.message.reply_text(
+        f"✅ Goodbye message set!\n\n**Preview:**\n{format_welcome_message(goodbye_text, update.effective_user, update.effective_chat)}",
+        parse_mode='Markdown'
+    )
 
 @is_admin_command
 @is_group_command
@@ -140,15 +132,16 @@ async def welcome_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not context.args:
         # Show current settings
         chat_id = update.effective_chat.id
-        session = db.get_session()
-        try:
-            settings = session.query(WelcomeSettings).filter(WelcomeSettings.chat_id == chat_id).first()
-            
-            if not settings:
-                await update.message.reply_text("❌ No welcome settings configured. Use `/setwelcome` to set up.")
-                return
-            
-            welcome_info = f"""👋 **Welcome Settings**
+        async with async_db.get_session() as session:
+            settings = (await session.execute(
+                select(WelcomeSettings).where(WelcomeSettings.chat_id == chat_id).limit(1)
+            )).scalar()
+        
+        if not settings:
+            await update.message.reply_text("❌ No welcome settings configured. Use `/setwelcome` to set up.")
+            return
+        
+        welcome_info = f"""👋 **Welcome Settings**
 
 **Welcome:** {'✅ Enabled' if settings.welcome_enabled else '❌ Disabled'}
 **Goodbye:** {'✅ Enabled' if settings.goodbye_enabled else '❌ Disabled'}
@@ -168,11 +161,8 @@ async def welcome_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 • `/setgoodbye <text>` - Set goodbye message
 • `/captcha on|off` - Toggle captcha
 • `/cleanservice on|off` - Toggle service message deletion"""
-            
-            await update.message.reply_text(welcome_info, parse_mode='Markdown')
         
-        finally:
-            session.close()
+        await update.message.reply_text(welcome_info, parse_mode='Markdown')
         return
     
     # Toggle welcome
@@ -180,22 +170,9 @@ async def welcome_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         status = context.args[0].lower() == 'on'
         chat_id = update.effective_chat.id
         
-        session = db.get_session()
-        try:
-            settings = session.query(WelcomeSettings).filter(WelcomeSettings.chat_id == chat_id).first()
-            
-            if settings:
-                settings.welcome_enabled = status
-                session.commit()
-            else:
-                settings = WelcomeSettings(chat_id=chat_id, welcome_enabled=status)
-                session.add(settings)
-                session.commit()
-            
-            await update.message.reply_text(f"✅ Welcome messages {'enabled' if status else 'disabled'}.")
+        await update_welcome_settings(chat_id, welcome_enabled=status)
         
-        finally:
-            session.close()
+        await update.message.reply_text(f"✅ Welcome messages {'enabled' if status else 'disabled'}.")
 
 @is_admin_command
 @is_group_command
@@ -208,22 +185,9 @@ async def goodbye_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     status = context.args[0].lower() == 'on'
     chat_id = update.effective_chat.id
     
-    session = db.get_session()
-    try:
-        settings = session.query(WelcomeSettings).filter(WelcomeSettings.chat_id == chat_id).first()
-        
-        if settings:
-            settings.goodbye_enabled = status
-            session.commit()
-        else:
-            settings = WelcomeSettings(chat_id=chat_id, goodbye_enabled=status)
-            session.add(settings)
-            session.commit()
-        
-        await update.message.reply_text(f"✅ Goodbye messages {'enabled' if status else 'disabled'}.")
+    await update_welcome_settings(chat_id, goodbye_enabled=status)
     
-    finally:
-        session.close()
+    await update.message.reply_text(f"✅ Goodbye messages {'enabled' if status else 'disabled'}.")
 
 @is_admin_command
 @is_group_command
@@ -236,25 +200,12 @@ async def captcha_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     status = context.args[0].lower() == 'on'
     chat_id = update.effective_chat.id
     
-    session = db.get_session()
-    try:
-        settings = session.query(WelcomeSettings).filter(WelcomeSettings.chat_id == chat_id).first()
-        
-        if settings:
-            settings.captcha_enabled = status
-            session.commit()
-        else:
-            settings = WelcomeSettings(chat_id=chat_id, captcha_enabled=status)
-            session.add(settings)
-            session.commit()
-        
-        await update.message.reply_text(
-            f"✅ Captcha {'enabled' if status else 'disabled'}.\n"
-            f"{'New users will need to solve a captcha to chat.' if status else ''}"
-        )
+    await update_welcome_settings(chat_id, captcha_enabled=status)
     
-    finally:
-        session.close()
+    await update.message.reply_text(
+        f"✅ Captcha {'enabled' if status else 'disabled'}.\n"
+        f"{'New users will need to solve a captcha to chat.' if status else ''}"
+    )
 
 @is_admin_command
 @is_group_command
@@ -267,77 +218,26 @@ async def cleanservice_command(update: Update, context: ContextTypes.DEFAULT_TYP
     status = context.args[0].lower() == 'on'
     chat_id = update.effective_chat.id
     
-    session = db.get_session()
-    try:
-        settings = session.query(WelcomeSettings).filter(WelcomeSettings.chat_id == chat_id).first()
-        
-        if settings:
-            settings.delete_service = status
-            session.commit()
-        else:
-            settings = WelcomeSettings(chat_id=chat_id, delete_service=status)
-            session.add(settings)
-            session.commit()
-        
-        await update.message.reply_text(
-            f"✅ Service message deletion {'enabled' if status else 'disabled'}.\n"
-            f"{'Join/leave messages will be automatically deleted.' if status else ''}"
-        )
+    await update_welcome_settings(chat_id, delete_service=status)
     
-    finally:
-        session.close()
+    await update.message.reply_text(
+        f"✅ Service message deletion {'enabled' if status else 'disabled'}.\n"
+        f"{'Join/leave messages will be automatically deleted.' if status else ''}"
+    )
 
 async def handle_new_member_welcome(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle new member with welcome message and captcha"""
-    chat_id = update.effective_chat.id
-    
-    session = db.get_session()
-    try:
-        settings = session.query(WelcomeSettings).filter(WelcomeSettings.chat_id == chat_id).first()
-        
-        if not settings:
-            return
-        
-        # Delete service message if enabled
-        if settings.delete_service:
-            try:
-                await context.bot.delete_message(chat_id, update.message.message_id)
-            except:
-                pass
-        
-        for new_member in update.message.new_chat_members:
-            # Skip bots
-            if new_member.is_bot:
-                continue
-            
-            # Check if captcha is enabled
-            if settings.captcha_enabled:
-                await handle_captcha(update, context, new_member, settings)
-            elif settings.welcome_enabled and settings.welcome_message:
-                await send_welcome_message(update, context, new_member, settings)
-    
-    finally:
-        session.close()
+    """Queue new members for the join pipeline, which bans, restricts and greets them in batches"""
+    join_pipeline.add(
+        context.bot,
+        update.effective_chat,
+        update.message.new_chat_members,
+        update.message.message_id
+    )
 
-async def handle_captcha(update: Update, context: ContextTypes.DEFAULT_TYPE, user, settings):
-    """Handle captcha for new user"""
+async def send_captcha(bot, chat, users: list, settings):
+    """Send one captcha for users (already restricted) and record them as pending"""
     import random
     
-    chat_id = update.effective_chat.id
-    user_id = user.id
-    
-    # Restrict user until captcha is solved
-    try:
-        await context.bot.restrict_chat_member(
-            chat_id=chat_id,
-            user_id=user_id,
-            permissions=context.bot.get_chat(chat_id).permissions._replace(
-                can_send_messages=False
-            )
-        )
-    except:
-        pass
-    
     # Generate simple math captcha
     num1 = random.randint(1, 10)
     num2 = random.randint(1, 10)
@@ -351,14 +251,16 @@ async def handle_captcha(update: Update, context: ContextTypes.DEFAULT_TYPE, use
     all_answers = [correct_answer] + wrong_answers[:2]
     random.shuffle(all_answers)
     
+    # A captcha shared by several users is marked with user id 0; any of them may answer it
+    target = users[0].id if len(users) == 1 else 0
     for ans in all_answers:
-        buttons.append(InlineKeyboardButton(str(ans), callback_data=f"captcha_{user_id}_{ans}_{correct_answer}"))
+        buttons.append(InlineKeyboardButton(str(ans), callback_data=f"captcha_{target}_{ans}_{correct_answer}"))
     
     keyboard = InlineKeyboardMarkup([buttons])
     
     captcha_text = f"""🔐 **Captcha Verification**
 
-Welcome {format_user_mention(user)}!
+Welcome {format_mentions(users)}!
 
 To prove you're human, please solve this simple math problem:
 **{num1} + {num2} = ?**
@@ -366,83 +268,40 @@ To prove you're human, please solve this simple math problem:
 You have {settings.captcha_time // 60} minutes to solve this, or you'll be kicked."""
     
     try:
-        captcha_msg = await context.bot.send_message(
-            chat_id,
+        captcha_msg = await bot.send_message(
+            chat.id,
             captcha_text,
             parse_mode='Markdown',
             reply_markup=keyboard
         )
         
-        # Store pending user
-        session = db.get_session()
-        try:
-            pending = PendingUsers(
-                chat_id=chat_id,
-                user_id=user_id,
-                captcha_message_id=captcha_msg.message_id
-            )
-            session.add(pending)
-            session.commit()
-        finally:
-            session.close()
-        
-        # Schedule kick if not solved
-        context.job_queue.run_once(
-            lambda context: kick_unverified_user(context, chat_id, user_id, captcha_msg.message_id),
-            settings.captcha_time
-        )
-        
+        # Store pending users; kicked by captcha_sweeper if still pending after captcha_time
+        now = datetime.now()
+        async with async_db.get_session() as session:
+            await session.execute(insert(PendingUsers), [
+                {'chat_id': chat.id, 'user_id': user.id, 'join_time': now, 'captcha_message_id': captcha_msg.message_id}
+                for user in users
+            ])
+            await session.commit()
+    
     except Exception as e:
         logger.error(f"Error sending captcha: {e}")
 
-async def kick_unverified_user(context: ContextTypes.DEFAULT_TYPE, chat_id: int, user_id: int, message_id: int):
-    """Kick user who didn't solve captcha"""
-    session = db.get_session()
-    try:
-        pending = session.query(PendingUsers).filter(
-            PendingUsers.chat_id == chat_id,
-            PendingUsers.user_id == user_id
-        ).first()
-        
-        if pending:
-            # User still pending, kick them
-            try:
-                await context.bot.ban_chat_member(chat_id, user_id)
-                await context.bot.unban_chat_member(chat_id, user_id)
-                await context.bot.delete_message(chat_id, message_id)
-                
-                await context.bot.send_message(
-                    chat_id,
-                    f"⏰ User kicked for not solving captcha in time."
-                )
-            except:
-                pass
-            
-            session.delete(pending)
-            session.commit()
-    
-    finally:
-        session.close()
-
-async def send_welcome_message(update: Update, context: ContextTypes.DEFAULT_TYPE, user, settings):
-    """Send welcome message to new user"""
-    chat = update.effective_chat
-    
-    welcome_text = format_welcome_message(settings.welcome_message, user, chat)
+async def send_welcome(bot, chat, users: list, settings):
+    """Send one welcome message for users"""
+    welcome_text = format_welcome_batch(settings.welcome_message, users, chat)
     
     try:
-        welcome_msg = await context.bot.send_message(
+        welcome_msg = await bot.send_message(
             chat.id,
             welcome_text,
-            parse_mode='Markdown'
+            parse_mode='Markdown',
+            rate_limit_args=COSMETIC
         )
         
         # Delete welcome message after specified time
         if settings.delete_welcome > 0:
-            context.job_queue.run_once(
-                lambda context: context.bot.delete_message(chat.id, welcome_msg.message_id),
-                settings.delete_welcome
-            )
+            schedule_delete(chat.id, welcome_msg.message_id, settings.delete_welcome)
     
     except Exception as e:
         logger.error(f"Error sending welcome message: {e}")
@@ -455,38 +314,47 @@ async def handle_left_member_goodbye(update: Update, context: ContextTypes.DEFAU
     if not left_member or left_member.is_bot:
         return
     
-    session = db.get_session()
-    try:
-        settings = session.query(WelcomeSettings).filter(WelcomeSettings.chat_id == chat_id).first()
-        
-        if not settings:
-            return
-        
-        # Delete service message if enabled
-        if settings.delete_service:
-            try:
-                await context.bot.delete_message(chat_id, update.message.message_id)
-            except:
-                pass
-        
-        # Send goodbye message
-        if settings.goodbye_enabled and settings.goodbye_message:
-            goodbye_text = format_welcome_message(settings.goodbye_message, left_member, update.effective_chat)
-            
-            try:
-                await context.bot.send_message(
-                    chat_id,
-                    goodbye_text,
-                    parse_mode='Markdown'
-                )
-            except Exception as e:
-                logger.error(f"Error sending goodbye message: {e}")
+    settings = (await chat_configs.get(chat_id)).welcome
+    if not settings:
+        return
+    
+    # Delete service message if enabled
+    if settings.delete_service:
+        try:
+            await context.bot.delete_message(chat_id, update.message.message_id)
+        except:
+            pass
     
-    finally:
-        session.close()
+    # Send goodbye message
+    if settings.goodbye_enabled and settings.goodbye_message:
+        goodbye_text = format_welcome_message(settings.goodbye_message, left_member, update.effective_chat)
+        
+        try:
+            await context.bot.send_message(
+                chat_id,
+                goodbye_text,
+                parse_mode='Markdown',
+                rate_limit_args=COSMETIC
+            )
+        except Exception as e:
+            logger.error(f"Error sending goodbye message: {e}")
+
+def join_names(users: list, name) -> str:
+    """name(user) for each user, comma separated; long batches end with 'and N more'"""
+    names = ", ".join(name(user) for user in users[:MAX_NAMES_PER_MESSAGE])
+    if len(users) > MAX_NAMES_PER_MESSAGE:
+        names += f" and {len(users) - MAX_NAMES_PER_MESSAGE} more"
+    return names
+
+def format_mentions(users: list) -> str:
+    return join_names(users, format_user_mention)
 
 def format_welcome_message(template: str, user, chat) -> str:
     """Format welcome message with variables"""
+    return format_welcome_batch(template, [user], chat)
+
+def format_welcome_batch(template: str, users: list, chat) -> str:
+    """Format welcome message with variables; per-user variables list every user in the batch"""
     if not template:
         return ""
     
@@ -497,12 +365,12 @@ def format_welcome_message(template: str, user, chat) -> str:
         member_count = "many"
     
     replacements = {
-        '{first}': user.first_name or '',
-        '{last}': user.last_name or '',
-        '{fullname}': f"{user.first_name or ''} {user.last_name or ''}".strip(),
-        '{username}': f"@{user.username}" if user.username else user.first_name,
-        '{mention}': format_user_mention(user),
-        '{id}': str(user.id),
+        '{first}': join_names(users, lambda user: user.first_name or ''),
+        '{last}': join_names(users, lambda user: user.last_name or ''),
+        '{fullname}': join_names(users, lambda user: f"{user.first_name or ''} {user.last_name or ''}".strip()),
+        '{username}': join_names(users, lambda user: f"@{user.username}" if user.username else user.first_name),
+        '{mention}': format_mentions(users),
+        '{id}': join_names(users, lambda user: str(user.id)),
         '{chatname}': chat.title or 'this chat',
         '{count}': str(member_count)
     }
@@ -517,23 +385,36 @@ def format_welcome_message(template: str, user, chat) -> str:
 async def handle_captcha_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle captcha button press"""
     query = update.callback_query
-    await query.answer()
     
     data = query.data.split('_')
     if len(data) != 4 or data[0] != 'captcha':
+        await query.answer()
         return
     
     user_id = int(data[1])
     selected_answer = int(data[2])
     correct_answer = int(data[3])
+    chat_id = query.message.chat_id
+    captcha_message_id = query.message.message_id
+    shared = user_id == 0
     
     # Check if the user pressing the button is the one who needs to solve captcha
-    if query.from_user.id != user_id:
+    if shared:
+        # A captcha sent for a batch of joins can be answered by any user still pending on it
+        user_id = query.from_user.id
+        async with async_db.get_session() as session:
+            is_pending = await session.scalar(select(PendingUsers.id).where(
+                PendingUsers.chat_id == chat_id,
+                PendingUsers.user_id == user_id,
+                PendingUsers.captcha_message_id == captcha_message_id
+            ).limit(1)) is not None
+    else:
+        is_pending = query.from_user.id == user_id
+    
+    if not is_pending:
         await query.answer("❌ This captcha is not for you!", show_alert=True)
         return
     
-    chat_id = query.message.chat_id
-    
     if selected_answer == correct_answer:
         # Correct answer - remove restrictions
         try:
@@ -544,30 +425,21 @@ async def handle_captcha_callback(update: Update, context: ContextTypes.DEFAULT_
                 permissions=chat.permissions
             )
             
-            await query.edit_message_text(
-                f"✅ Captcha solved! Welcome to the chat, {query.from_user.first_name}!"
-            )
+            solved_text = f"✅ Captcha solved! Welcome to the chat, {query.from_user.first_name}!"
+            if shared:
+                await query.answer(solved_text, show_alert=True)
+            else:
+                await query.answer()
+                await query.edit_message_text(solved_text)
             
             # Remove from pending users
-            session = db.get_session()
-            try:
-                pending = session.query(PendingUsers).filter(
-                    PendingUsers.chat_id == chat_id,
-                    PendingUsers.user_id == user_id
-                ).first()
-                
-                if pending:
-                    session.delete(pending)
-                    session.commit()
-                
-                # Send welcome message now
-                settings = session.query(WelcomeSettings).filter(WelcomeSettings.chat_id == chat_id).first()
-                if settings and settings.welcome_enabled and settings.welcome_message:
-                    welcome_text = format_welcome_message(settings.welcome_message, query.from_user, query.message.chat)
-                    await context.bot.send_message(chat_id, welcome_text, parse_mode='Markdown')
+            await remove_pending_user(chat_id, user_id, captcha_message_id if shared else None)
             
-            finally:
-                session.close()
+            # Send welcome message now
+            settings = (await chat_configs.get(chat_id)).welcome
+            if settings and settings.welcome_enabled and settings.welcome_message:
+                welcome_text = format_welcome_message(settings.welcome_message, query.from_user, query.message.chat)
+                await context.bot.send_message(chat_id, welcome_text, parse_mode='Markdown', rate_limit_args=COSMETIC)
         
         except Exception as e:
             logger.error(f"Error handling correct captcha: {e}")
@@ -578,27 +450,36 @@ async def handle_captcha_callback(update: Update, context: ContextTypes.DEFAULT_
             await context.bot.ban_chat_member(chat_id, user_id)
             await context.bot.unban_chat_member(chat_id, user_id)
             
-            await query.edit_message_text(
-                f"❌ Wrong answer! {query.from_user.first_name} has been kicked."
-            )
+            if shared:
+                await query.answer("❌ Wrong answer! You have been kicked.", show_alert=True)
+            else:
+                await query.answer()
+                await query.edit_message_text(
+                    f"❌ Wrong answer! {query.from_user.first_name} has been kicked."
+                )
             
             # Remove from pending users
-            session = db.get_session()
-            try:
-                pending = session.query(PendingUsers).filter(
-                    PendingUsers.chat_id == chat_id,
-                    PendingUsers.user_id == user_id
-                ).first()
-                
-                if pending:
-                    session.delete(pending)
-                    session.commit()
-            
-            finally:
-                session.close()
+            await remove_pending_user(chat_id, user_id, captcha_message_id if shared else None)
         
         except Exception as e:
             logger.error(f"Error handling wrong captcha: {e}")
 
+async def remove_pending_user(chat_id: int, user_id: int, shared_message_id: int = None):
+    """Delete the user's pending row; a shared captcha message is deleted once nobody is left on it"""
+    async with async_db.get_session() as session:
+        await session.execute(delete(PendingUsers).where(
+            PendingUsers.chat_id == chat_id,
+            PendingUsers.user_id == user_id
+        ))
+        await session.commit()
+        
+        if shared_message_id is not None:
+            remaining = await session.scalar(select(PendingUsers.id).where(
+                PendingUsers.chat_id == chat_id,
+                PendingUsers.captcha_message_id == shared_message_id
+            ).limit(1))
+            if remaining is None:
+                schedule_delete(chat_id, shared_message_id, 0)
+
 # Initialize database
 update_welcome_database()
\ No newline at end of file
@@ -1,8 +1,9 @@
 from telegram import Update
 from telegram.ext import ContextTypes
-from database import db
+from database import async_db, Whitelist
 from utils import is_admin_command, is_group_command, get_user_from_message, format_user_mention
 import logging
+from sqlalchemy import select
 
 logger = logging.getLogger(__name__)
 
@@ -20,7 +21,7 @@ async def whitelist_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     admin_id = update.effective_user.id
     
     if user_id:
-        if db.add_whitelist(user_id, chat_id, admin_id):
+        if await async_db.add_whitelist(user_id, chat_id, admin_id):
             user_mention = format_user_mention(user_obj) if user_obj else f"User {user_id}"
             await update.message.reply_text(
                 f"✅ {user_mention} has been whitelisted in this chat!\n"
@@ -42,7 +43,7 @@ async def gwhitelist_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
     admin_id = update.effective_user.id
     
     if user_id:
-        if db.add_whitelist(user_id, 0, admin_id, is_global=True):
+        if await async_db.add_whitelist(user_id, 0, admin_id, is_global=True):
             user_mention = format_user_mention(user_obj) if user_obj else f"User {user_id}"
             await update.message.reply_text(
                 f"🌐 {user_mention} has been globally whitelisted!\n"
@@ -65,7 +66,7 @@ async def unwhitelist_command(update: Update, context: ContextTypes.DEFAULT_TYPE
     chat_id = update.effective_chat.id
     
     if user_id:
-        if db.remove_whitelist(user_id, chat_id):
+        if await async_db.remove_whitelist(user_id, chat_id):
             user_mention = format_user_mention(user_obj) if user_obj else f"User {user_id}"
             await update.message.reply_text(
                 f"✅ {user_mention} has been removed from the whitelist!",
@@ -85,7 +86,7 @@ async def gunwhitelist_command(update: Update, context: ContextTypes.DEFAULT_TYP
     user_id, user_obj = user_info
     
     if user_id:
-        if db.remove_whitelist(user_id, is_global=True):
+        if await async_db.remove_whitelist(user_id, is_global=True):
             user_mention = format_user_mention(user_obj) if user_obj else f"User {user_id}"
             await update.message.reply_text(
                 f"🌐 {user_mention} has been removed from the global whitelist!",
@@ -100,11 +101,10 @@ async def whitelisted_command(update: Update, context: ContextTypes.DEFAULT_TYPE
     """View a list of whitelisted users"""
     chat_id = update.effective_chat.id
     
-    session = db.get_session()
-    try:
-        whitelisted = session.query(db.Whitelist).filter(
-            (db.Whitelist.chat_id == chat_id) | (db.Whitelist.is_global == True)
-        ).order_by(db.Whitelist.created_at.desc()).limit(20).all()
+    async with async_db.get_session() as session:
+        whitelisted = (await session.scalars(select(Whitelist).where(
+            (Whitelist.chat_id == chat_id) | (Whitelist.is_global == True)
+        ).order_by(Whitelist.created_at.desc()).limit(20))).all()
         
         if not whitelisted:
             await update.message.reply_text("📋 No whitelisted users found.")
@@ -117,9 +117,6 @@ async def whitelisted_command(update: Update, context: ContextTypes.DEFAULT_TYPE
             whitelist_msg += f"   Added: {entry.created_at.strftime('%Y-%m-%d %H:%M')}\n\n"
         
         await update.message.reply_text(whitelist_msg, parse_mode='Markdown')
-        
-    finally:
-        session.close()
 
 @is_admin_command
 @is_group_command
@@ -134,22 +131,21 @@ async def checkwhitelist_command(update: Update, context: ContextTypes.DEFAULT_T
     chat_id = update.effective_chat.id
     
     if user_id:
-        is_whitelisted = db.is_whitelisted(user_id, chat_id)
+        is_whitelisted = await async_db.is_whitelisted(user_id, chat_id)
         user_mention = format_user_mention(user_obj) if user_obj else f"User {user_id}"
         
         if is_whitelisted:
             # Check if global or local
-            session = db.get_session()
-            try:
-                global_whitelist = session.query(db.Whitelist).filter(
-                    db.Whitelist.user_id == user_id,
-                    db.Whitelist.is_global == True
-                ).first()
+            async with async_db.get_session() as session:
+                global_whitelist = (await session.execute(select(Whitelist).where(
+                    Whitelist.user_id == user_id,
+                    Whitelist.is_global == True
+                ).limit(1))).scalar()
                 
-                local_whitelist = session.query(db.Whitelist).filter(
-                    db.Whitelist.user_id == user_id,
-                    db.Whitelist.chat_id == chat_id
-                ).first()
+                local_whitelist = (await session.execute(select(Whitelist).where(
+                    Whitelist.user_id == user_id,
+                    Whitelist.chat_id == chat_id
+                ).limit(1))).scalar()
                 
                 status_msg = f"✅ {user_mention} is whitelisted!\n\n"
                 
@@ -162,9 +158,6 @@ async def checkwhitelist_command(update: Update, context: ContextTypes.DEFAULT_T
                     status_msg += f"Added: {local_whitelist.created_at.strftime('%Y-%m-%d %H:%M')}\n"
                 
                 await update.message.reply_text(status_msg, parse_mode='Markdown')
-                
-            finally:
-                session.close()
         else:
             await update.message.reply_text(
                 f"❌ {user_mention} is not whitelisted.",
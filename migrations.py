@@ -0,0 +1,43 @@
+"""
+Schema migrations for existing databases.
+
+Base.metadata.create_all() only creates missing tables, so indexes declared on
+models after a table was first created never reach deployed databases. The
+functions here bring an existing database up to the declared schema.
+"""
+
+import logging
+from sqlalchemy import inspect
+
+from database import Base
+
+logger = logging.getLogger(__name__)
+
+def ensure_indexes(engine) -> list:
+    """
+    Create every index declared on the models that is missing from the database.
+    Import the handler modules first so their tables are registered on Base.
+    Returns the names of the indexes that were created.
+    """
+    inspector = inspect(engine)
+    created = []
+    
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in sorted(table.indexes, key=lambda index: index.name):
+            if index.name not in existing:
+                index.create(bind=engine)
+                created.append(index.name)
+    
+    if created:
+        logger.info(f"Created {len(created)} missing indexes: {', '.join(created)}")
+    
+    return created
+
+def run_migrations(engine) -> list:
+    """Create missing tables, then missing indexes"""
+    Base.metadata.create_all(bind=engine)
+    return ensure_indexes(engine)
@@ -0,0 +1,143 @@
+"""
+Write-behind buffer for user activity.
+
+Every group message used to upsert its sender just to bump last_active and
+re-store an unchanged name, one commit per message. UserActivityBuffer keeps the
+latest activity per user in memory and writes it out as bulk upserts on an
+interval or once enough users are pending, so busy chats cost one commit per
+flush instead of one per message.
+"""
+
+import asyncio
+import logging
+from collections import OrderedDict
+from datetime import datetime
+
+from config import Config
+from database import async_db
+
+logger = logging.getLogger(__name__)
+
+class UserActivityBuffer:
+    """Coalesces user activity by user id and flushes it in batches"""
+    
+    def __init__(self, database, flush_interval: float, max_pending: int, max_profiles: int = 100000):
+        self.database = database
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_profiles = max_profiles
+        
+        # user_id -> [profile, last_active, profile_changed]
+        self._pending = {}
+        # user_id -> last profile written, so unchanged names are not rewritten
+        self._profiles = OrderedDict()
+        self._flush_lock = asyncio.Lock()
+        self._flush_task = None
+        self._timer_task = None
+        
+        self.records = 0
+        self.flushes = 0
+        self.rows_written = 0
+    
+    def record(self, user_id: int, username: str = None, first_name: str = None, last_name: str = None):
+        """Note that user_id was active now; flushed later in a batch"""
+        self.records += 1
+        profile = (username, first_name, last_name)
+        
+        entry = self._pending.get(user_id)
+        if entry:
+            entry[2] = entry[2] or entry[0] != profile
+            entry[0] = profile
+            entry[1] = datetime.now()
+        else:
+            changed = self._profiles.get(user_id) != profile
+            self._pending[user_id] = [profile, datetime.now(), changed]
+        
+        if len(self._pending) >= self.max_pending and not (self._flush_task and not self._flush_task.done()):
+            self._flush_task = asyncio.get_running_loop().create_task(self.flush())
+    
+    def pending_count(self) -> int:
+        return len(self._pending)
+    
+    async def flush(self) -> int:
+        """Write all pending activity; returns the number of users written"""
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+            
+            batch, self._pending = self._pending, {}
+            changed, touched = [], []
+            for user_id, (profile, last_active, profile_changed) in batch.items():
+                row = {
+                    'id': user_id,
+                    'username': profile[0],
+                    'first_name': profile[1],
+                    'last_name': profile[2],
+                    'last_active': last_active,
+                }
+                (changed if profile_changed else touched).append(row)
+            
+            try:
+                await self.database.upsert_users(changed, update_profile=True)
+                await self.database.upsert_users(touched, update_profile=False)
+            except Exception as e:
+                logger.error(f"Failed to flush activity for {len(batch)} users: {e}")
+                # Put the batch back without clobbering newer activity
+                for user_id, entry in batch.items():
+                    newer = self._pending.get(user_id)
+                    if newer:
+                        newer[2] = newer[2] or entry[2]
+                    else:
+                        self._pending[user_id] = entry
+                return 0
+            
+            for user_id, (profile, _, _) in batch.items():
+                self._profiles[user_id] = profile
+                self._profiles.move_to_end(user_id)
+            while len(self._profiles) > self.max_profiles:
+                self._profiles.popitem(last=False)
+            
+            self.flushes += 1
+            self.rows_written += len(batch)
+            return len(batch)
+    
+    async def _run_timer(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+    
+    def start(self):
+        """Start the periodic flush on the running event loop"""
+        if not self._timer_task:
+            self._timer_task = asyncio.get_running_loop().create_task(self._run_timer())
+    
+    async def stop(self):
+        """Stop the periodic flush and drain everything still pending"""
+        if self._timer_task:
+            self._timer_task.cancel()
+            try:
+                await self._timer_task
+            except asyncio.CancelledError:
+                pass
+            self._timer_task = None
+        
+        if self._flush_task:
+            await self._flush_task
+            self._flush_task = None
+        
+        await self.flush()
+        logger.info(f"User activity buffer drained ({self.records} records, {self.flushes} flushes)")
+    
+    def stats(self) -> dict:
+        return {
+            'records': self.records,
+            'flushes': self.flushes,
+            'rows_written': self.rows_written,
+            'pending': len(self._pending),
+        }
+
+user_activity = UserActivityBuffer(
+    async_db,
+    flush_interval=Config.USER_ACTIVITY_FLUSH_INTERVAL,
+    max_pending=Config.USER_ACTIVITY_MAX_PENDING
+)
@@ -0,0 +1,163 @@
+"""
+Captcha expiry.
+
+handle_captcha used to schedule one job_queue job per joining user to kick
+them if the captcha was not solved. During a raid that meant thousands of
+jobs, and a restart dropped them all, leaving their pending_users rows behind
+forever. The pending_users rows are now the only record: CaptchaSweeper runs
+one periodic pass that finds expired rows through the join_time index, kicks
+those users on a bounded number of workers, hands their captcha messages to
+the deletion scheduler, posts one notice per chat and deletes the rows. The first pass runs at startup, so users whose captcha
+expired while the bot was down are handled too.
+"""
+
+import asyncio
+import logging
+from collections import Counter
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, delete, func, or_, select
+
+from config import Config
+from database import async_db
+from services.fanout import fan_out
+from services.outbound import COSMETIC
+from services.deletion_scheduler import schedule_delete
+
+logger = logging.getLogger(__name__)
+
+# captcha_time of chats without welcome settings (the column default)
+DEFAULT_CAPTCHA_TIME = 300
+# Expired rows handled per pass; the next pass continues with the rest
+SWEEP_BATCH = 1000
+
+class CaptchaSweeper:
+    """Periodically kicks users whose captcha expired and removes their pending_users rows"""
+    
+    def __init__(self, database=async_db, interval: float = 10):
+        self.database = database
+        self.interval = interval
+        self._bot = None
+        self._task = None
+        
+        self.sweeps = 0
+        self.kicked = 0
+        self.failed = 0
+    
+    async def find_expired(self, now: datetime) -> list:
+        """(row id, chat_id, user_id, captcha message id) of pending users whose captcha time is up"""
+        from handlers.welcome import PendingUsers, WelcomeSettings
+        
+        async with self.database.get_session() as session:
+            # Expiry depends on each chat's captcha_time. Chats use a handful of
+            # distinct values, so the query compares join_time with one cutoff per
+            # value and only expired rows count against the batch limit.
+            timeouts = set(await session.scalars(select(WelcomeSettings.captcha_time).distinct()))
+            timeouts.discard(None)
+            timeouts.add(DEFAULT_CAPTCHA_TIME)
+            captcha_time = func.coalesce(WelcomeSettings.captcha_time, DEFAULT_CAPTCHA_TIME)
+            expired = or_(
+                PendingUsers.join_time.is_(None),
+                *(
+                    and_(captcha_time == timeout, PendingUsers.join_time <= now - timedelta(seconds=timeout))
+                    for timeout in sorted(timeouts)
+                ),
+            )
+            
+            rows = (await session.execute(
+                select(
+                    PendingUsers.id,
+                    PendingUsers.chat_id,
+                    PendingUsers.user_id,
+                    PendingUsers.captcha_message_id,
+                )
+                .outerjoin(WelcomeSettings, WelcomeSettings.chat_id == PendingUsers.chat_id)
+                .where(expired)
+                .order_by(PendingUsers.join_time)
+                .limit(SWEEP_BATCH)
+            )).all()
+        
+        return [(row.id, row.chat_id, row.user_id, row.captcha_message_id) for row in rows]
+    
+    async def sweep(self, now: datetime = None) -> int:
+        """Kick every user whose captcha expired; returns how many rows were handled"""
+        from handlers.welcome import PendingUsers
+        
+        if now is None:
+            now = datetime.now()
+        expired = await self.find_expired(now)
+        self.sweeps += 1
+        if not expired:
+            return 0
+        
+        bot = self._bot
+        
+        async def kick(key):
+            _, chat_id, user_id, _ = key
+            await bot.ban_chat_member(chat_id, user_id)
+            await bot.unban_chat_member(chat_id, user_id)
+        
+        summary = await fan_out(expired, kick, concurrency=Config.FANOUT_CONCURRENCY, rate=Config.FANOUT_RATE)
+        
+        kicked_per_chat = Counter()
+        for key, error in summary.results.items():
+            if error is None:
+                kicked_per_chat[key[1]] += 1
+            else:
+                logger.warning(f"Failed to kick unverified user {key[2]} from chat {key[1]}: {error}")
+        self.kicked += sum(kicked_per_chat.values())
+        self.failed += summary.failed
+        
+        # Rows are removed whether or not the kick worked (user left, bot removed), so the table stays small
+        async with self.database.get_session() as session:
+            await session.execute(delete(PendingUsers).where(PendingUsers.id.in_([key[0] for key in expired])))
+            await session.commit()
+        
+        # Deleted together with other due messages in deleteMessages batches
+        for _, chat_id, _, message_id in expired:
+            if message_id:
+                schedule_delete(chat_id, message_id, 0)
+        
+        for chat_id, count in kicked_per_chat.items():
+            text = ("⏰ User kicked for not solving captcha in time." if count == 1
+                    else f"⏰ {count} users kicked for not solving captcha in time.")
+            try:
+                await bot.send_message(chat_id, text, rate_limit_args=COSMETIC)
+            except Exception as e:
+                logger.warning(f"Failed to send captcha notice to chat {chat_id}: {e}")
+        
+        return len(expired)
+    
+    async def _run(self):
+        while True:
+            try:
+                handled = await self.sweep()
+            except Exception as e:
+                logger.error(f"Captcha sweep failed: {e}")
+                handled = 0
+            # A full batch means more rows are waiting
+            if handled < SWEEP_BATCH:
+                await asyncio.sleep(self.interval)
+    
+    def start(self, bot):
+        if not self._task:
+            self._bot = bot
+            self._task = asyncio.get_running_loop().create_task(self._run())
+    
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    def stats(self) -> dict:
+        return {
+            'sweeps': self.sweeps,
+            'kicked': self.kicked,
+            'failed': self.failed,
+        }
+
+captcha_sweeper = CaptchaSweeper(interval=Config.CAPTCHA_SWEEP_INTERVAL)
@@ -0,0 +1,91 @@
+"""
+Per-chat configuration snapshots.
+
+A chat's configuration is spread over chat_settings, welcome_settings,
+report_settings and the locked rows of media_filters, and the handlers that
+need it (night mode and locks on every message, welcome and goodbye on every
+join and leave, /report) used to query those tables on each update.
+ChatConfig holds all four for one chat. It is loaded lazily in a single query
+and kept in memory until an admin command that writes one of the tables calls
+chat_configs.invalidate(), so the message path reads configuration without
+touching the database.
+"""
+
+from sqlalchemy import select, literal
+
+from database import async_db
+from services.message_classifier import ChatLocks
+
+class ChatConfig:
+    """Configuration of one chat; a settings row is None if the chat never configured it"""
+    
+    def __init__(self, chat_id: int, chat_settings=None, welcome=None, reports=None, locks: ChatLocks = None):
+        self.chat_id = chat_id
+        self.chat_settings = chat_settings  # ChatSettings row
+        self.welcome = welcome  # WelcomeSettings row
+        self.reports = reports  # ReportSettings row
+        self.locks = locks or ChatLocks()
+
+def build_chat_config_query(chat_id: int):
+    """Single SELECT of every settings row for a chat, one result row per locked type"""
+    from handlers.advanced_features import ChatSettings
+    from handlers.welcome import WelcomeSettings
+    from handlers.reports import ReportSettings
+    from handlers.filters import MediaFilter
+    
+    target = select(literal(chat_id).label('chat_id')).subquery('target')
+    
+    return select(
+        ChatSettings,
+        WelcomeSettings,
+        ReportSettings,
+        MediaFilter.media_type,
+        MediaFilter.action,
+    ).select_from(target).outerjoin(
+        ChatSettings, ChatSettings.chat_id == target.c.chat_id
+    ).outerjoin(
+        WelcomeSettings, WelcomeSettings.chat_id == target.c.chat_id
+    ).outerjoin(
+        ReportSettings, ReportSettings.chat_id == target.c.chat_id
+    ).outerjoin(
+        MediaFilter, (MediaFilter.chat_id == target.c.chat_id) & (MediaFilter.is_locked == True)
+    )
+
+async def load_chat_config(chat_id: int) -> ChatConfig:
+    async with async_db.get_session() as session:
+        rows = (await session.execute(build_chat_config_query(chat_id))).all()
+    
+    first = rows[0]
+    locks = {row.media_type: row.action or 'delete' for row in rows if row.media_type}
+    return ChatConfig(
+        chat_id=chat_id,
+        chat_settings=first.ChatSettings,
+        welcome=first.WelcomeSettings,
+        reports=first.ReportSettings,
+        locks=ChatLocks(locks),
+    )
+
+class ChatConfigCache:
+    """ChatConfig per chat, reloaded after an admin command changes it"""
+    
+    def __init__(self):
+        self.configs = {}
+        self.loads = 0
+        # Bumped on invalidation so a load that raced a settings change is not kept
+        self.version = 0
+    
+    async def get(self, chat_id: int) -> ChatConfig:
+        config = self.configs.get(chat_id)
+        if config is None:
+            version = self.version
+            config = await load_chat_config(chat_id)
+            if version == self.version:
+                self.configs[chat_id] = config
+            self.loads += 1
+        return config
+    
+    def invalidate(self, chat_id: int):
+        self.version += 1
+        self.configs.pop(chat_id, None)
+
+chat_configs = ChatConfigCache()
@@ -0,0 +1,197 @@
+"""
+Delayed message deletion.
+
+Flood and filter notices, night mode warnings, purge confirmations and welcome
+messages are deleted a few seconds after they are sent. Each call site used to
+schedule its own job_queue.run_once() job for one message, so a raid created
+thousands of jobs, and every pending deletion was lost on restart.
+
+schedule_delete() pushes the message onto one heap ordered by due time. A
+single background task wakes when the earliest entry is due, takes everything
+that is due by then, groups it by chat and deletes it with deleteMessages
+batches through the fan-out executor. New entries are written to the
+scheduled_deletions table in bulk on each pass and the rows of the entries
+the pass handled are removed by id, so pending deletions are reloaded by
+start() after a restart.
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import delete, insert, select
+
+from config import Config
+from database import async_db, ScheduledDeletion
+from services.fanout import fan_out, batched, DELETE_BATCH_SIZE
+
+logger = logging.getLogger(__name__)
+
+# Shortest sleep between passes, so deletions due close together share a pass
+MIN_TICK = 0.5
+# Longest the background task sleeps when nothing is scheduled
+IDLE_WAKEUP = 3600
+# Row ids per DELETE statement, well under the bound parameter limits
+ROW_BATCH_SIZE = 500
+
+class DeletionScheduler:
+    """Heap of pending deletions, persisted in scheduled_deletions and deleted in per-chat batches"""
+    
+    def __init__(self, database=async_db):
+        self.database = database
+        # (due timestamp, sequence, chat_id, message_id)
+        self._heap = []
+        self._sequence = itertools.count()
+        # Entries not written to the database yet
+        self._unsaved = []
+        # Sequence -> scheduled_deletions row id, for entries written to the database
+        self._row_ids = {}
+        self._bot = None
+        self._wakeup = None
+        self._task = None
+        
+        self.scheduled = 0
+        self.deleted = 0
+        self.failed = 0
+        self.batches = 0
+    
+    def schedule(self, chat_id: int, message_id: int, delay: float):
+        entry = (time.time() + delay, next(self._sequence), chat_id, message_id)
+        earliest = self._heap[0][0] if self._heap else None
+        heapq.heappush(self._heap, entry)
+        self._unsaved.append(entry)
+        self.scheduled += 1
+        # Wake the task to persist the first new entry, or to run an earlier deletion
+        if self._wakeup is not None and (len(self._unsaved) == 1 or earliest is None or entry[0] < earliest):
+            self._wakeup.set()
+    
+    def pending_count(self) -> int:
+        return len(self._heap)
+    
+    def pop_due(self, now: float) -> list:
+        """Remove and return every entry due by now"""
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            due.append(heapq.heappop(self._heap))
+        return due
+    
+    async def run_due(self, now: float = None) -> int:
+        """Delete everything due by now and sync the table; returns the number of messages"""
+        if now is None:
+            now = time.time()
+        # Without a bot nothing can be deleted, so due entries stay queued
+        due = self.pop_due(now) if self._bot is not None else []
+        
+        if due:
+            message_ids = defaultdict(set)
+            for _, _, chat_id, message_id in due:
+                message_ids[chat_id].add(message_id)
+            keys = [(chat_id, batch) for chat_id, ids in message_ids.items()
+                    for batch in batched(sorted(ids), DELETE_BATCH_SIZE)]
+            summary = await fan_out(
+                keys,
+                lambda key: self._bot.delete_messages(*key),
+                concurrency=Config.FANOUT_CONCURRENCY,
+                rate=Config.FANOUT_RATE,
+            )
+            self.batches += len(keys)
+            for (chat_id, batch), error in summary.results.items():
+                if error is None:
+                    self.deleted += len(batch)
+                else:
+                    self.failed += len(batch)
+                    logger.warning(f"Failed to delete {len(batch)} scheduled messages in chat {chat_id}: {error}")
+        
+        if due or self._unsaved:
+            await self.save(due)
+        return len(due)
+    
+    async def save(self, handled: list = ()):
+        """Write new entries that are still pending and drop the rows of the handled entries"""
+        handled_sequences = {entry[1] for entry in handled}
+        # Handled before they were written, so there is nothing to store or remove
+        unsaved = [entry for entry in self._unsaved if entry[1] not in handled_sequences]
+        self._unsaved = []
+        handled_rows = [self._row_ids[sequence] for sequence in handled_sequences if sequence in self._row_ids]
+        
+        async with self.database.get_session() as session:
+            if unsaved:
+                row_ids = (await session.scalars(
+                    insert(ScheduledDeletion).returning(ScheduledDeletion.id, sort_by_parameter_order=True),
+                    [
+                        {'chat_id': chat_id, 'message_id': message_id, 'delete_at': datetime.fromtimestamp(due)}
+                        for due, _, chat_id, message_id in unsaved
+                    ]
+                )).all()
+                self._row_ids.update(zip((entry[1] for entry in unsaved), row_ids))
+            for batch in batched(handled_rows, ROW_BATCH_SIZE):
+                await session.execute(delete(ScheduledDeletion).where(ScheduledDeletion.id.in_(batch)))
+            await session.commit()
+        for sequence in handled_sequences:
+            self._row_ids.pop(sequence, None)
+    
+    async def load(self) -> int:
+        """Queue the deletions persisted before a restart; returns how many were loaded"""
+        async with self.database.get_session() as session:
+            rows = (await session.execute(
+                select(ScheduledDeletion.id, ScheduledDeletion.chat_id, ScheduledDeletion.message_id, ScheduledDeletion.delete_at)
+            )).all()
+        for row_id, chat_id, message_id, delete_at in rows:
+            sequence = next(self._sequence)
+            heapq.heappush(self._heap, (delete_at.timestamp(), sequence, chat_id, message_id))
+            self._row_ids[sequence] = row_id
+        return len(rows)
+    
+    async def _run(self):
+        while True:
+            try:
+                await self.run_due()
+            except Exception as e:
+                logger.error(f"Failed to run scheduled deletions: {e}")
+            
+            delay = self._heap[0][0] - time.time() if self._heap else IDLE_WAKEUP
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=min(max(delay, MIN_TICK), IDLE_WAKEUP))
+            except asyncio.TimeoutError:
+                pass
+    
+    async def start(self, bot):
+        if not self._task:
+            self._bot = bot
+            loaded = await self.load()
+            if loaded:
+                logger.info(f"Recovered {loaded} scheduled message deletions")
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+    
+    async def stop(self):
+        """Stop the task and persist everything still pending, due or not, for the next start()"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self._wakeup = None
+        await self.save()
+    
+    def stats(self) -> dict:
+        return {
+            'pending': len(self._heap),
+            'scheduled': self.scheduled,
+            'deleted': self.deleted,
+            'failed': self.failed,
+            'batches': self.batches,
+        }
+
+deletions = DeletionScheduler()
+
+def schedule_delete(chat_id: int, message_id: int, delay: float):
+    """Delete message_id in chat_id after delay seconds, surviving restarts"""
+    deletions.schedule(chat_id, message_id, delay)
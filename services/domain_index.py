@@ -0,0 +1,125 @@
+"""
+Per-chat URL filter index.
+
+check_url_filters used to test every extracted URL against every URLFilter row
+with a substring test, which costs urls x filters per message and also matched
+"evil.com" inside "notevil.com". DomainIndex stores the chat's blocked and
+allowed domains in a trie keyed by reversed labels (com -> example -> ads), so
+a lookup walks at most one node per label of the URL's host and only ever
+matches whole labels: a filter for example.com covers example.com and its
+subdomains, never notevil.com.
+
+The most specific matching entry decides; between a blocked and an allowed
+entry for the same domain, the allowed one wins.
+"""
+
+import logging
+
+from database import async_db
+
+logger = logging.getLogger(__name__)
+
+# Trie key for the entry stored at a node; labels are never empty
+ENTRY = ''
+
+def normalize_domain(domain: str) -> str:
+    """Lowercase host name without scheme, port, wildcard prefix or trailing dot"""
+    domain = (domain or '').strip().lower()
+    if '://' in domain:
+        domain = domain.split('://', 1)[1]
+    for separator in '/?#':
+        domain = domain.split(separator, 1)[0]
+    domain = domain.rsplit('@', 1)[-1]
+    if domain.startswith('[') or domain.count(':') > 1:
+        return domain  # IPv6 literal
+    domain = domain.split(':', 1)[0]
+    while domain.startswith('*.') or domain.startswith('.'):
+        domain = domain[2:] if domain.startswith('*.') else domain[1:]
+    return domain.rstrip('.')
+
+def domain_suffixes(domain: str):
+    """example.co.uk -> example.co.uk, co.uk, uk"""
+    labels = domain.split('.')
+    for i in range(len(labels)):
+        yield '.'.join(labels[i:])
+
+def in_domain_set(domain: str, domains: frozenset) -> bool:
+    """True if domain or any parent domain is in domains"""
+    return any(suffix in domains for suffix in domain_suffixes(domain))
+
+class DomainRule:
+    """Action for one filtered domain"""
+    
+    def __init__(self, domain: str, action: str = 'delete', is_whitelist: bool = False):
+        self.domain = domain
+        self.action = action
+        self.is_whitelist = is_whitelist
+
+class DomainIndex:
+    """Reversed-label trie of domain rules with most-specific-match lookup"""
+    
+    def __init__(self, rules=()):
+        self.root = {}
+        self.size = 0
+        for rule in rules:
+            self.add(rule)
+    
+    def add(self, rule: DomainRule):
+        domain = normalize_domain(rule.domain)
+        if not domain:
+            return
+        node = self.root
+        for label in reversed(domain.split('.')):
+            node = node.setdefault(label, {})
+        existing = node.get(ENTRY)
+        if existing is None:
+            self.size += 1
+        # Allowed beats blocked for the same domain
+        if existing is None or (rule.is_whitelist and not existing.is_whitelist):
+            node[ENTRY] = rule
+    
+    def lookup(self, domain: str):
+        """Most specific rule covering domain (a normalized host name), or None"""
+        node = self.root
+        found = None
+        for label in reversed(domain.split('.')):
+            node = node.get(label)
+            if node is None:
+                break
+            found = node.get(ENTRY, found)
+        return found
+    
+    def __len__(self):
+        return self.size
+
+class DomainIndexCache:
+    """DomainIndex per chat, built from its URLFilter rows and rebuilt after changes"""
+    
+    def __init__(self):
+        self.indexes = {}
+        self.builds = 0
+        # Bumped on invalidation so a build that raced a filter change is not kept
+        self.version = 0
+    
+    async def get(self, chat_id: int) -> DomainIndex:
+        index = self.indexes.get(chat_id)
+        if index is None:
+            from handlers.filters import URLFilter
+            
+            version = self.version
+            rows = await async_db.run_sync(
+                lambda session: session.query(URLFilter.domain, URLFilter.action, URLFilter.is_whitelist)
+                .filter(URLFilter.chat_id == chat_id)
+                .all()
+            )
+            index = DomainIndex(DomainRule(domain, action or 'delete', bool(is_whitelist)) for domain, action, is_whitelist in rows)
+            if version == self.version:
+                self.indexes[chat_id] = index
+            self.builds += 1
+        return index
+    
+    def invalidate(self, chat_id: int):
+        self.version += 1
+        self.indexes.pop(chat_id, None)
+
+url_filter_indexes = DomainIndexCache()
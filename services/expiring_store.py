@@ -0,0 +1,118 @@
+"""
+Bounded in-memory store for short-lived per-chat and per-user state.
+
+Handlers used to keep state like report cooldowns and night mode warnings in
+plain module-level dicts that were never pruned, so a bot serving many chats
+grew without limit. ExpiringStore gives every entry the same TTL and keeps
+entries in expiry order, so expired entries are always at the front: each
+write drops a few of them, every entry is dropped at most once (O(1)
+amortized), and a hard capacity evicts the oldest entries when it is reached.
+"""
+
+import time
+from collections import OrderedDict
+
+MISSING = object()
+
+# Expired entries dropped per write; more than one so a backlog always shrinks
+SWEEP_BATCH = 2
+
+class ExpiringStore:
+    """Mapping with a fixed TTL per entry and a maximum number of entries"""
+    
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        
+        # key -> (value, expires_at), oldest (soonest to expire) first
+        self._entries = OrderedDict()
+        
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+    
+    def get(self, key, default=None, now: float = None):
+        """Value stored for key, or default if it is missing or expired"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        
+        if now is None:
+            now = time.monotonic()
+        if entry[1] <= now:
+            del self._entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return default
+        
+        self.hits += 1
+        return entry[0]
+    
+    def set(self, key, value, now: float = None):
+        """Store value for key; its TTL starts over"""
+        if now is None:
+            now = time.monotonic()
+        
+        entries = self._entries
+        if key in entries:
+            del entries[key]
+        entries[key] = (value, now + self.ttl)
+        
+        for _ in range(SWEEP_BATCH):
+            oldest = next(iter(entries))
+            if entries[oldest][1] > now:
+                break
+            del entries[oldest]
+            self.expirations += 1
+        
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+            self.evictions += 1
+    
+    def add(self, key, now: float = None) -> bool:
+        """Store key as a member; False if it was already present and unexpired"""
+        if self.get(key, MISSING, now) is not MISSING:
+            return False
+        self.set(key, True, now)
+        return True
+    
+    def pop(self, key, default=None):
+        entry = self._entries.pop(key, None)
+        return default if entry is None else entry[0]
+    
+    def sweep(self, now: float = None) -> int:
+        """Drop every expired entry; returns how many were dropped"""
+        if now is None:
+            now = time.monotonic()
+        
+        entries = self._entries
+        dropped = 0
+        while entries:
+            oldest = next(iter(entries))
+            if entries[oldest][1] > now:
+                break
+            del entries[oldest]
+            dropped += 1
+        self.expirations += dropped
+        return dropped
+    
+    def clear(self):
+        self._entries.clear()
+    
+    def __contains__(self, key):
+        return self.get(key, MISSING) is not MISSING
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    def stats(self) -> dict:
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'expirations': self.expirations,
+            'evictions': self.evictions,
+        }
@@ -0,0 +1,162 @@
+"""
+Concurrent, rate-limited Telegram actions over many chats or message batches.
+
+gban, sgban, gkick and gunban used to load every Chat row and await one
+Telegram call per chat in turn, silently dropping every error, so a global
+ban over thousands of chats took minutes and held up the handler. fan_out()
+runs an action for a stream of chat ids on a bounded number of workers, paced
+to a global request rate. A RetryAfter from Telegram pauses every worker for
+the requested time before the chat is retried, network errors are retried
+with backoff, and the outcome for every chat is collected in a FanOutSummary.
+/purge uses the same executor for its batches of message ids.
+"""
+
+import asyncio
+import logging
+import time
+from collections import Counter
+
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TelegramError
+
+from services.outbound import retry_after_seconds
+
+logger = logging.getLogger(__name__)
+
+# Attempts per key before a RetryAfter or network error counts as a failure
+MAX_ATTEMPTS = 3
+# Seconds before the first network error retry; doubled after each attempt
+NETWORK_BACKOFF = 1.0
+
+# deleteMessages accepts at most this many message ids per call
+DELETE_BATCH_SIZE = 100
+
+class FanOutSummary:
+    """Outcome per key (chat id or batch) of a fan-out: None where the action succeeded, else the error message"""
+    
+    def __init__(self):
+        self.results = {}
+        self.retries = 0
+    
+    @property
+    def succeeded(self) -> int:
+        return sum(1 for error in self.results.values() if error is None)
+    
+    @property
+    def failed(self) -> int:
+        return len(self.results) - self.succeeded
+    
+    def errors(self, limit: int = 5) -> list:
+        """Most common error messages as (message, key count) pairs"""
+        return Counter(error for error in self.results.values() if error is not None).most_common(limit)
+    
+    def __len__(self):
+        return len(self.results)
+
+class RequestPacer:
+    """Spaces calls 1/rate seconds apart across all workers; pause() holds them all back"""
+    
+    def __init__(self, rate: float):
+        self.interval = 1 / rate if rate else 0.0
+        self._next_slot = 0.0
+    
+    async def wait(self):
+        now = time.monotonic()
+        slot = max(self._next_slot, now)
+        self._next_slot = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+    
+    def pause(self, seconds: float):
+        self._next_slot = max(self._next_slot, time.monotonic() + seconds)
+
+async def run_with_retries(action, key, pacer: RequestPacer, summary: FanOutSummary):
+    """Await action(key); returns None on success or the error message"""
+    for attempt in range(MAX_ATTEMPTS):
+        if attempt:
+            summary.retries += 1
+        await pacer.wait()
+        try:
+            await action(key)
+            return None
+        except (BadRequest, Forbidden) as e:
+            # Bot not in the chat, missing rights, user not found: retrying will not help
+            return e.message
+        except RetryAfter as e:
+            logger.warning(f"Flood limit hit for {key}, pausing for {e.retry_after}s")
+            pacer.pause(retry_after_seconds(e))
+            error = e.message
+        except NetworkError as e:
+            await asyncio.sleep(NETWORK_BACKOFF * 2 ** attempt)
+            error = e.message
+        except TelegramError as e:
+            return e.message
+        except Exception as e:
+            logger.error(f"Fan-out action failed for {key}: {e}")
+            return str(e)
+    return error
+
+async def fan_out(keys, action, concurrency: int = 8, rate: float = 25.0,
+                  progress=None, progress_interval: float = 3.0) -> FanOutSummary:
+    """
+    Await action(key) for every key from keys (an iterable or async iterable of
+    hashables, such as chat ids), with at most concurrency calls in flight and
+    rate calls per second overall. While it runs, progress(summary) is awaited
+    every progress_interval seconds.
+    """
+    summary = FanOutSummary()
+    pacer = RequestPacer(rate)
+    queue = asyncio.Queue(maxsize=concurrency * 2)
+    
+    async def worker():
+        while True:
+            key = await queue.get()
+            if key is None:
+                return
+            summary.results[key] = await run_with_retries(action, key, pacer, summary)
+    
+    async def report_progress():
+        while True:
+            await asyncio.sleep(progress_interval)
+            try:
+                await progress(summary)
+            except Exception as e:
+                logger.warning(f"Failed to report fan-out progress: {e}")
+    
+    workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+    reporter = asyncio.create_task(report_progress()) if progress else None
+    try:
+        if hasattr(keys, '__aiter__'):
+            async for key in keys:
+                await queue.put(key)
+        else:
+            for key in keys:
+                await queue.put(key)
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers)
+    finally:
+        for task in workers:
+            task.cancel()
+        if reporter:
+            reporter.cancel()
+    
+    return summary
+
+def batched(items: list, size: int) -> list:
+    """Split items into tuples of at most size items"""
+    return [tuple(items[i:i + size]) for i in range(0, len(items), size)]
+
+async def purge_messages(bot, chat_id: int, message_ids: list, **options) -> FanOutSummary:
+    """
+    Delete message_ids with deleteMessages calls of up to DELETE_BATCH_SIZE ids,
+    run through fan_out() with options; the summary is keyed by batch.
+    """
+    return await fan_out(
+        batched(message_ids, DELETE_BATCH_SIZE),
+        lambda batch: bot.delete_messages(chat_id, batch),
+        **options
+    )
+
+def purged_count(summary: FanOutSummary) -> int:
+    """Message ids in the batches Telegram accepted, including ids that no longer existed"""
+    return sum(len(batch) for batch, error in summary.results.items() if error is None)
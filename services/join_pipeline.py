@@ -0,0 +1,197 @@
+"""
+Batched processing of new chat members.
+
+The join handlers used to go through new_chat_members one member at a time:
+a global ban query, a user upsert with its own commit, a restrict call and a
+captcha or welcome message per member, each awaited in turn, so a raid of 500
+joins meant thousands of sequential database and API operations and 500
+messages in the chat.
+
+JoinPipeline buffers joins per chat for JOIN_BATCH_WINDOW seconds (or until
+JOIN_BATCH_MAX members are waiting) and handles each batch together: one
+Chat lookup for under attack mode, one IN query against the bans, one bulk
+user upsert, kicks, bans and captcha restrictions run concurrently through
+fan_out() and the outbound rate limiter, the service messages deleted in a
+deleteMessages batch, and one captcha or welcome message for the whole batch.
+"""
+
+import asyncio
+import logging
+from datetime import datetime
+
+from telegram import ChatPermissions
+
+from config import Config
+from database import async_db, Chat
+from services.chat_config import chat_configs
+from services.fanout import fan_out
+from services.deletion_scheduler import schedule_delete
+
+logger = logging.getLogger(__name__)
+
+CAPTCHA_PERMISSIONS = ChatPermissions(can_send_messages=False)
+
+class JoinBatch:
+    """Members that joined one chat within the current window"""
+    
+    def __init__(self, bot, chat):
+        self.bot = bot
+        self.chat = chat
+        # user id -> User, so a member reported twice is handled once
+        self.members = {}
+        self.service_message_ids = set()
+        self.timer = None
+
+class JoinPipeline:
+    """Buffers new members per chat and processes them in batches"""
+    
+    def __init__(self, database=async_db, window: float = 2.0, max_batch: int = 200,
+                 concurrency: int = 8, rate: float = 25.0):
+        self.database = database
+        self.window = window
+        self.max_batch = max_batch
+        self.concurrency = concurrency
+        self.rate = rate
+        self._batches = {}
+        self._tasks = set()
+        
+        self.joins = 0
+        self.batches = 0
+        self.largest_batch = 0
+    
+    def add(self, bot, chat, members, service_message_id: int = None):
+        """Queue members that joined chat; the batch is processed when the window closes"""
+        batch = self._batches.get(chat.id)
+        if batch is None:
+            batch = self._batches[chat.id] = JoinBatch(bot, chat)
+            batch.timer = self._spawn(self._flush_later(chat.id, batch))
+        
+        for member in members:
+            if member.id != bot.id:
+                batch.members[member.id] = member
+                self.joins += 1
+        if service_message_id:
+            batch.service_message_ids.add(service_message_id)
+        
+        if len(batch.members) >= self.max_batch:
+            # Detach the full batch now so the next joins start a new one
+            batch.timer.cancel()
+            del self._batches[chat.id]
+            self._spawn(self._process(batch))
+    
+    def pending_count(self) -> int:
+        return sum(len(batch.members) for batch in self._batches.values())
+    
+    def _spawn(self, coroutine):
+        task = asyncio.get_running_loop().create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+    
+    async def _flush_later(self, chat_id: int, batch: JoinBatch):
+        await asyncio.sleep(self.window)
+        if self._batches.get(chat_id) is batch:
+            await self.flush(chat_id)
+    
+    async def flush(self, chat_id: int):
+        """Process the members buffered for chat_id now"""
+        batch = self._batches.pop(chat_id, None)
+        if batch is not None:
+            await self._process(batch)
+    
+    async def _process(self, batch: JoinBatch):
+        self.batches += 1
+        self.largest_batch = max(self.largest_batch, len(batch.members))
+        try:
+            await self.process(batch)
+        except Exception as e:
+            logger.error(f"Failed to process {len(batch.members)} new members in chat {batch.chat.id}: {e}")
+    
+    async def process(self, batch: JoinBatch):
+        from handlers.welcome import send_captcha, send_welcome
+        
+        bot, chat = batch.bot, batch.chat
+        members = list(batch.members.values())
+        db_chat = await self.database.run_sync(lambda session: session.get(Chat, chat.id))
+        
+        if db_chat and db_chat.under_attack:
+            # Kick everyone who joined while the chat is under attack
+            summary = await self._apply(bot, chat.id, [('kick', member.id) for member in members])
+            logger.info(f"Kicked {summary.succeeded} new members due to under attack mode in chat {chat.id}")
+            for message_id in batch.service_message_ids:
+                schedule_delete(chat.id, message_id, 0)
+            return
+        
+        banned = await self.database.banned_user_ids([member.id for member in members])
+        now = datetime.now()
+        await self.database.upsert_users([
+            {
+                'id': member.id,
+                'username': member.username,
+                'first_name': member.first_name,
+                'last_name': member.last_name,
+                'last_active': now,
+            }
+            for member in members if member.id not in banned
+        ])
+        
+        settings = (await chat_configs.get(chat.id)).welcome
+        humans = [member for member in members if member.id not in banned and not member.is_bot]
+        captcha = bool(settings and settings.captcha_enabled and humans)
+        
+        keys = [('ban', user_id) for user_id in banned]
+        if captcha:
+            keys += [('restrict', member.id) for member in humans]
+        if keys:
+            summary = await self._apply(bot, chat.id, keys)
+            if banned:
+                logger.info(f"Banned {len(banned)} globally banned new members in chat {chat.id}")
+            for (action, user_id), error in summary.results.items():
+                if error is not None:
+                    logger.error(f"Failed to {action} new member {user_id} in chat {chat.id}: {error}")
+        
+        if not settings:
+            return
+        if settings.delete_service:
+            for message_id in batch.service_message_ids:
+                schedule_delete(chat.id, message_id, 0)
+        
+        if captcha:
+            await send_captcha(bot, chat, humans, settings)
+        elif humans and settings.welcome_enabled and settings.welcome_message:
+            await send_welcome(bot, chat, humans, settings)
+    
+    async def _apply(self, bot, chat_id: int, keys: list):
+        async def action(key):
+            kind, user_id = key
+            if kind == 'restrict':
+                await bot.restrict_chat_member(chat_id, user_id, permissions=CAPTCHA_PERMISSIONS)
+            else:
+                await bot.ban_chat_member(chat_id, user_id)
+                if kind == 'kick':
+                    await bot.unban_chat_member(chat_id, user_id)
+        
+        return await fan_out(keys, action, concurrency=self.concurrency, rate=self.rate)
+    
+    async def stop(self):
+        """Process every buffered batch and wait for running ones"""
+        for chat_id in list(self._batches):
+            self._batches[chat_id].timer.cancel()
+            await self.flush(chat_id)
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+    
+    def stats(self) -> dict:
+        return {
+            'joins': self.joins,
+            'batches': self.batches,
+            'largest_batch': self.largest_batch,
+            'pending': self.pending_count(),
+        }
+
+join_pipeline = JoinPipeline(
+    window=Config.JOIN_BATCH_WINDOW,
+    max_batch=Config.JOIN_BATCH_MAX,
+    concurrency=Config.FANOUT_CONCURRENCY,
+    rate=Config.FANOUT_RATE,
+)
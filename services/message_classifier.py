@@ -0,0 +1,102 @@
+"""
+Per-update message classification.
+
+The message checks used to inspect the same message separately:
+check_media_filters walked an if/elif chain over message attributes and then
+queried media_filters, check_url_filters ran the URL regex, check_word_filters
+lowercased the text, and utils.get_file_id_from_message repeated the attribute
+chain. classify_message() works all of that out once per update. The result is
+cached on the callback context, which python-telegram-bot shares between every
+handler processing one update; Update objects themselves are frozen and
+slotted and cannot carry it.
+
+Chat locks are kept in memory as a bitmask over LOCK_TYPES (part of the
+chat's ChatConfig), so checking a message against them is a single AND.
+"""
+
+import re
+
+# Attachment attributes in precedence order; GIFs carry a document as well, so animation comes first
+MEDIA_TYPES = ('photo', 'animation', 'video', 'document', 'audio', 'sticker', 'voice', 'video_note')
+OTHER_TYPES = ('contact', 'location', 'poll')
+
+LOCK_TYPES = (
+    'url', 'photo', 'video', 'document', 'sticker', 'voice', 'video_note',
+    'animation', 'contact', 'location', 'poll', 'forward', 'reply',
+)
+LOCK_BITS = {lock_type: 1 << position for position, lock_type in enumerate(LOCK_TYPES)}
+
+URL_PATTERN = re.compile(r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+')
+
+def message_media(message) -> tuple:
+    """(media type, file id) of the message's attachment, or (None, None)"""
+    for media_type in MEDIA_TYPES:
+        media = getattr(message, media_type, None)
+        if media:
+            if media_type == 'photo':
+                media = media[-1]  # Highest resolution
+            return media_type, media.file_id
+    return None, None
+
+class MessageClass:
+    """Everything the message checks need to know about one message"""
+    
+    def __init__(self, message, update_id: int = None):
+        self.update_id = update_id
+        self.text = message.text
+        self.text_lower = message.text.lower() if message.text else ''
+        self.entities = message.entities if message.text else message.caption_entities
+        self.media_type, self.file_id = message_media(message)
+        self.is_forward = message.forward_origin is not None
+        self.is_reply = message.reply_to_message is not None
+        
+        text = self.text or ''
+        self.urls = URL_PATTERN.findall(text) if 'http' in text else []
+        
+        self.message_type = self.media_type
+        if self.message_type is None:
+            self.message_type = next((kind for kind in OTHER_TYPES if getattr(message, kind, None)), None)
+        if self.message_type is None:
+            if self.is_forward:
+                self.message_type = 'forward'
+            elif self.is_reply:
+                self.message_type = 'reply'
+            elif self.text:
+                self.message_type = 'text'
+        
+        # Every lock this message falls under, e.g. a forwarded photo with a link
+        self.lock_bits = LOCK_BITS.get(self.message_type, 0)
+        if self.is_forward:
+            self.lock_bits |= LOCK_BITS['forward']
+        if self.is_reply:
+            self.lock_bits |= LOCK_BITS['reply']
+        if self.urls:
+            self.lock_bits |= LOCK_BITS['url']
+
+def classify_message(update, context=None) -> MessageClass:
+    """Classify update.effective_message once, reusing the result cached on context"""
+    message_class = getattr(context, 'message_class', None)
+    if message_class is not None and message_class.update_id == update.update_id:
+        return message_class
+    
+    message_class = MessageClass(update.effective_message, update.update_id)
+    if context is not None:
+        context.message_class = message_class
+    return message_class
+
+class ChatLocks:
+    """Locked message types of one chat as a bitmask, with their actions"""
+    
+    def __init__(self, actions: dict = None):
+        # lock type -> action
+        self.actions = actions or {}
+        self.mask = 0
+        for lock_type in self.actions:
+            self.mask |= LOCK_BITS.get(lock_type, 0)
+    
+    def first_locked(self, lock_bits: int):
+        """The first locked type among lock_bits, or None"""
+        matched = lock_bits & self.mask
+        if not matched:
+            return None
+        return next(lock_type for lock_type in LOCK_TYPES if matched & LOCK_BITS[lock_type])
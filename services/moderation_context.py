@@ -0,0 +1,116 @@
+"""
+Per-update moderation context.
+
+The combined message handler runs several checks (night mode, flood, filters,
+mutes, silence) that each used to ask the database the same questions about the
+sender and the chat. ModerationContext answers all of them with one batched
+query, built once per update and passed to every check. Chat settings and
+locks are taken from the cached ChatConfig rather than queried per update.
+"""
+
+from datetime import datetime
+from sqlalchemy import select, exists, literal
+from telegram import Update
+
+from config import Config
+from database import async_db, Admin, Ban, Mute, Whitelist, Chat
+from services.status_cache import status_cache
+from services.chat_config import chat_configs
+
+class ModerationContext:
+    """Sender status, chat flags and chat settings for a single update"""
+    
+    def __init__(self, chat_id: int, user_id: int, is_admin: bool = False, is_whitelisted: bool = False,
+                 is_muted: bool = False, is_banned: bool = False, chat=None, chat_settings=None,
+                 has_word_filters: bool = False, has_url_filters: bool = False, has_locks: bool = False):
+        self.chat_id = chat_id
+        self.user_id = user_id
+        self.is_admin = is_admin
+        self.is_whitelisted = is_whitelisted
+        self.is_muted = is_muted
+        self.is_banned = is_banned
+        self.chat = chat  # Chat row or None if the chat is not registered
+        self.chat_settings = chat_settings  # ChatSettings row or None
+        self.has_word_filters = has_word_filters
+        self.has_url_filters = has_url_filters
+        self.has_locks = has_locks
+    
+    @property
+    def is_registered(self) -> bool:
+        return self.chat is not None
+    
+    @property
+    def is_silenced(self) -> bool:
+        return bool(self.chat and self.chat.is_silenced)
+    
+    @property
+    def under_attack(self) -> bool:
+        return bool(self.chat and self.chat.under_attack)
+    
+    @property
+    def is_exempt(self) -> bool:
+        """Admins and whitelisted users skip flood and content filters"""
+        return self.is_admin or self.is_whitelisted
+
+def build_moderation_query(chat_id: int, user_id: int):
+    """Single SELECT resolving every per-message status check"""
+    from handlers.filters import WordFilter, URLFilter
+    
+    target = select(literal(chat_id).label('chat_id')).subquery('target')
+    
+    return select(
+        exists().where(Admin.user_id == user_id, Admin.chat_id == chat_id).label('is_admin'),
+        exists().where(
+            Whitelist.user_id == user_id,
+            (Whitelist.chat_id == chat_id) | (Whitelist.is_global == True)
+        ).label('is_whitelisted'),
+        exists().where(
+            Mute.user_id == user_id,
+            Mute.chat_id == chat_id,
+            Mute.until > datetime.now()
+        ).label('is_muted'),
+        exists().where(
+            Ban.user_id == user_id,
+            (Ban.chat_id == chat_id) | (Ban.is_global == True)
+        ).label('is_banned'),
+        exists().where(WordFilter.chat_id == chat_id).label('has_word_filters'),
+        exists().where(URLFilter.chat_id == chat_id).label('has_url_filters'),
+        Chat,
+    ).select_from(target).outerjoin(
+        Chat, Chat.id == target.c.chat_id
+    )
+
+async def load_moderation_context(chat_id: int, user_id: int) -> ModerationContext:
+    """Resolve the moderation context for a user in a chat in one round trip"""
+    version = status_cache.version
+    async with async_db.get_session() as session:
+        row = (await session.execute(build_moderation_query(chat_id, user_id))).one()
+    # Chat settings and locks come from the in-memory chat config
+    config = await chat_configs.get(chat_id)
+    
+    # Later is_admin/is_whitelisted/is_banned calls for this sender can skip the database
+    status_cache.put(('admin', user_id, chat_id), bool(row.is_admin), version)
+    status_cache.put(('whitelist', user_id, chat_id), bool(row.is_whitelisted), version)
+    status_cache.put(('ban', user_id, chat_id), bool(row.is_banned), version)
+    
+    return ModerationContext(
+        chat_id=chat_id,
+        user_id=user_id,
+        is_admin=user_id == Config.SUPER_ADMIN_ID or bool(row.is_admin),
+        is_whitelisted=bool(row.is_whitelisted),
+        is_muted=bool(row.is_muted),
+        is_banned=bool(row.is_banned),
+        chat=row.Chat,
+        chat_settings=config.chat_settings,
+        has_word_filters=bool(row.has_word_filters),
+        has_url_filters=bool(row.has_url_filters),
+        has_locks=bool(config.locks.mask),
+    )
+
+async def get_moderation_context(update: Update, moderation: ModerationContext = None):
+    """Return moderation if already built for this update, otherwise load it"""
+    if moderation is not None:
+        return moderation
+    if not update.effective_chat or not update.effective_user:
+        return None
+    return await load_moderation_context(update.effective_chat.id, update.effective_user.id)
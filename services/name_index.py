@@ -0,0 +1,151 @@
+"""
+Per-chat index of custom command and note names.
+
+handle_custom_command and handle_note_shortcut used to query the database
+for every message starting with '/' or '#', which in a busy group is mostly
+commands meant for other bots and ordinary hashtags. NameIndex keeps the
+set of names each chat has defined, loaded lazily in one query the first
+time the chat is seen; a chat without any keeps an empty set, so a miss is
+a dict lookup and a set membership test. Only a hit goes back to the
+database, for the row with the response or note content, and the most
+recently used rows are held in an LRU bounded by their total size so a few
+large notes cannot bloat memory. /addcmd, /delcmd, /save and /clear call
+invalidate() after writing.
+"""
+
+from collections import OrderedDict
+
+from config import Config
+from database import async_db
+
+class NameIndex:
+    """Names defined per chat, with their rows loaded on demand"""
+    
+    def __init__(self, load_names, load_entry, entry_size, max_chats: int, max_body_bytes: int, database=async_db):
+        # load_names(session, chat_id) -> names; load_entry(session, chat_id, name) -> row or None
+        self.load_names = load_names
+        self.load_entry = load_entry
+        self.entry_size = entry_size
+        self.max_chats = max_chats
+        self.max_body_bytes = max_body_bytes
+        self.database = database
+        
+        # chat_id -> frozenset of names, least recently used first
+        self._names = OrderedDict()
+        # (chat_id, name) -> (row, size), least recently used first
+        self._entries = OrderedDict()
+        self.body_bytes = 0
+        # Bumped on invalidation so a load that raced a write is not kept
+        self.version = 0
+        
+        self.hits = 0
+        self.misses = 0
+        self.name_loads = 0
+        self.entry_loads = 0
+    
+    async def names(self, chat_id: int) -> frozenset:
+        names = self._names.get(chat_id)
+        if names is not None:
+            self._names.move_to_end(chat_id)
+            return names
+        
+        version = self.version
+        names = frozenset(await self.database.run_sync(lambda session: self.load_names(session, chat_id)))
+        self.name_loads += 1
+        if version == self.version:
+            self._names[chat_id] = names
+            if len(self._names) > self.max_chats:
+                self._names.popitem(last=False)
+        return names
+    
+    async def get(self, chat_id: int, name: str):
+        """Row defining name in chat_id, or None"""
+        if name not in await self.names(chat_id):
+            self.misses += 1
+            return None
+        self.hits += 1
+        
+        key = (chat_id, name)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            return entry[0]
+        
+        version = self.version
+        row = await self.database.run_sync(lambda session: self.load_entry(session, chat_id, name))
+        self.entry_loads += 1
+        if row is not None and version == self.version:
+            self._store(key, row)
+        return row
+    
+    def _store(self, key, row):
+        size = self.entry_size(row)
+        if size > self.max_body_bytes:
+            return
+        # Two concurrent loads of one row store it twice
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self.body_bytes -= previous[1]
+        self._entries[key] = (row, size)
+        self.body_bytes += size
+        while self.body_bytes > self.max_body_bytes:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self.body_bytes -= evicted
+    
+    def invalidate(self, chat_id: int, name: str = None):
+        """Forget chat_id's names, and the row of name (every row of the chat if None)"""
+        self.version += 1
+        self._names.pop(chat_id, None)
+        keys = [(chat_id, name)] if name is not None else [key for key in self._entries if key[0] == chat_id]
+        for key in keys:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self.body_bytes -= entry[1]
+    
+    def stats(self) -> dict:
+        return {
+            'chats': len(self._names),
+            'entries': len(self._entries),
+            'body_bytes': self.body_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'name_loads': self.name_loads,
+            'entry_loads': self.entry_loads,
+        }
+
+def load_command_names(session, chat_id: int) -> list:
+    from handlers.advanced_features import CustomCommand
+    return [name for (name,) in session.query(CustomCommand.command).filter(CustomCommand.chat_id == chat_id)]
+
+def load_custom_command(session, chat_id: int, name: str):
+    from handlers.advanced_features import CustomCommand
+    return session.query(CustomCommand).filter(
+        CustomCommand.chat_id == chat_id,
+        CustomCommand.command == name
+    ).first()
+
+def load_note_names(session, chat_id: int) -> list:
+    from handlers.notes import Note
+    return [name for (name,) in session.query(Note.name).filter(Note.chat_id == chat_id)]
+
+def load_note(session, chat_id: int, name: str):
+    from handlers.notes import Note
+    return session.query(Note).filter(
+        Note.chat_id == chat_id,
+        Note.name == name
+    ).first()
+
+command_index = NameIndex(
+    load_command_names,
+    load_custom_command,
+    lambda command: len(command.response or ''),
+    max_chats=Config.NAME_INDEX_MAX_CHATS,
+    max_body_bytes=Config.NAME_INDEX_BODY_BYTES,
+)
+note_index = NameIndex(
+    load_note_names,
+    load_note,
+    lambda note: len(note.content or '') + len(note.file_id or ''),
+    max_chats=Config.NAME_INDEX_MAX_CHATS,
+    max_body_bytes=Config.NAME_INDEX_BODY_BYTES,
+)
@@ -0,0 +1,177 @@
+"""
+Night mode scheduling.
+
+check_night_mode runs first for every message and used to re-parse the chat's
+night_mode_start/night_mode_end with strptime on each one, comparing them with
+the server's local clock. NightModeScheduler turns a chat's settings into a
+NightSchedule once: whether night mode is active and the epoch second of the
+next on/off transition, computed in the chat's configured timezone. Until that
+transition the per-message check is a single comparison. A background task
+advances schedules at their boundaries.
+"""
+
+import asyncio
+import heapq
+import logging
+import sys
+import time
+from datetime import datetime, timedelta
+
+import pytz
+
+logger = logging.getLogger(__name__)
+
+NEVER = sys.maxsize
+
+# Longest the background task sleeps when no transition is scheduled
+IDLE_WAKEUP = 3600
+
+def parse_clock(value: str) -> tuple:
+    """'22:00' -> (22, 0)"""
+    hour, minute = value.split(':')
+    return int(hour), int(minute)
+
+def get_timezone(name: str):
+    try:
+        return pytz.timezone(name or 'UTC')
+    except pytz.UnknownTimeZoneError:
+        logger.warning(f"Unknown timezone {name!r}, using UTC for night mode")
+        return pytz.utc
+
+class NightSchedule:
+    """Night window of one chat and its next transition"""
+    
+    def __init__(self, start: str, end: str, timezone: str = 'UTC'):
+        self.start = parse_clock(start)
+        self.end = parse_clock(end)
+        self.timezone = get_timezone(timezone)
+        self.is_night = False
+        self.next_transition = 0  # epoch seconds
+    
+    def _timestamp(self, day, clock: tuple) -> int:
+        local = self.timezone.localize(datetime(day.year, day.month, day.day, *clock))
+        return int(self.timezone.normalize(local).timestamp())
+    
+    def advance(self, now: float):
+        """Set is_night and next_transition for the time now"""
+        if self.start == self.end:
+            self.is_night = False
+            self.next_transition = NEVER
+            return
+        
+        today = datetime.fromtimestamp(now, self.timezone).date()
+        overnight = self.end < self.start
+        self.is_night = False
+        self.next_transition = NEVER
+        # Yesterday's window may still be running; tomorrow's may be the next one
+        for offset in (-1, 0, 1):
+            day = today + timedelta(days=offset)
+            start = self._timestamp(day, self.start)
+            end = self._timestamp(day + timedelta(days=1) if overnight else day, self.end)
+            if start <= now < end:
+                self.is_night = True
+                self.next_transition = end
+                return
+            if now < start:
+                self.next_transition = min(self.next_transition, start)
+
+class NightModeScheduler:
+    """NightSchedule per chat, advanced by a background task at each transition"""
+    
+    def __init__(self):
+        self.schedules = {}
+        # (transition timestamp, chat_id); entries for replaced schedules are skipped
+        self._heap = []
+        self._wakeup = None
+        self._task = None
+        self.transitions = 0
+    
+    def is_night(self, chat_id: int, settings, now: float = None) -> bool:
+        """Whether night mode is active in the chat; settings is its ChatSettings row"""
+        if now is None:
+            now = time.time()
+        schedule = self.schedules.get(chat_id)
+        if schedule is None:
+            schedule = self._build(chat_id, settings, now)
+        if now >= schedule.next_transition:
+            # The background task has not got to it yet
+            self._advance(chat_id, schedule, now)
+        return schedule.is_night
+    
+    def night_end(self, chat_id: int) -> int:
+        """When the chat's current night ends (epoch seconds), which also identifies the night"""
+        schedule = self.schedules.get(chat_id)
+        return schedule.next_transition if schedule is not None and schedule.is_night else None
+    
+    def invalidate(self, chat_id: int):
+        """Forget a chat's schedule after its night mode settings change"""
+        self.schedules.pop(chat_id, None)
+    
+    def advance_due(self, now: float = None) -> int:
+        """Advance every schedule whose transition is due; returns how many changed"""
+        if now is None:
+            now = time.time()
+        advanced = 0
+        while self._heap and self._heap[0][0] <= now:
+            when, chat_id = heapq.heappop(self._heap)
+            schedule = self.schedules.get(chat_id)
+            if schedule is not None and schedule.next_transition == when:
+                self._advance(chat_id, schedule, now)
+                advanced += 1
+        return advanced
+    
+    def _build(self, chat_id: int, settings, now: float) -> NightSchedule:
+        if settings is not None and settings.night_mode_enabled:
+            schedule = NightSchedule(settings.night_mode_start, settings.night_mode_end, settings.timezone)
+        else:
+            schedule = NightSchedule('00:00', '00:00')  # never night
+        schedule.advance(now)
+        self.schedules[chat_id] = schedule
+        self._push(chat_id, schedule)
+        return schedule
+    
+    def _advance(self, chat_id: int, schedule: NightSchedule, now: float):
+        was_night = schedule.is_night
+        schedule.advance(now)
+        self._push(chat_id, schedule)
+        if schedule.is_night != was_night:
+            self.transitions += 1
+    
+    def _push(self, chat_id: int, schedule: NightSchedule):
+        if schedule.next_transition == NEVER:
+            return
+        earliest = self._heap[0][0] if self._heap else NEVER
+        heapq.heappush(self._heap, (schedule.next_transition, chat_id))
+        if schedule.next_transition < earliest and self._wakeup is not None:
+            self._wakeup.set()
+    
+    async def _run(self):
+        while True:
+            try:
+                self.advance_due()
+            except Exception as e:
+                logger.error(f"Failed to advance night mode schedules: {e}")
+            
+            delay = self._heap[0][0] - time.time() if self._heap else IDLE_WAKEUP
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=min(max(delay, 0), IDLE_WAKEUP))
+            except asyncio.TimeoutError:
+                pass
+    
+    def start(self):
+        if not self._task:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+    
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self._wakeup = None
+
+night_mode = NightModeScheduler()
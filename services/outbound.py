@@ -0,0 +1,239 @@
+"""
+Outbound Telegram API request scheduling.
+
+Handlers call context.bot directly and independently, so during a raid the
+flood actions, report notifications, captchas and welcome messages all burst
+at once, Telegram answers with 429 (RetryAfter) and the handlers drop the
+errors. OutboundScheduler is installed as the application's rate limiter,
+which python-telegram-bot calls for every Bot API request, so every call made
+through context.bot passes through it:
+
+- a global token bucket (OUTBOUND_GLOBAL_RATE requests per second) hands out
+  its tokens in priority order: moderation actions first, then ordinary
+  requests, then cosmetic messages tagged with rate_limit_args
+- messages sent to a group also take a token from that group's bucket
+  (OUTBOUND_GROUP_RATE per minute), so one busy chat cannot starve the others
+- identical pending deleteMessage calls are coalesced into one request
+- a RetryAfter pauses the global bucket for the requested time and the request
+  is retried up to OUTBOUND_MAX_RETRIES times
+
+Queue depth, retries, coalesced deletes and queue latency are in stats().
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import deque
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_MODERATION = 0
+PRIORITY_DEFAULT = 1
+PRIORITY_COSMETIC = 2
+PRIORITY_NAMES = {PRIORITY_MODERATION: 'moderation', PRIORITY_DEFAULT: 'default', PRIORITY_COSMETIC: 'cosmetic'}
+
+# Pass as rate_limit_args to a Bot method to queue the request behind everything else
+COSMETIC = {'priority': PRIORITY_COSMETIC}
+
+MODERATION_ENDPOINTS = frozenset({
+    'banChatMember', 'unbanChatMember', 'restrictChatMember', 'banChatSenderChat',
+    'deleteMessage', 'deleteMessages', 'answerCallbackQuery', 'getChatMember',
+})
+
+# Requests that post a message to the chat and count towards its group limit
+MESSAGE_ENDPOINTS = frozenset({'forwardMessage', 'forwardMessages', 'copyMessage', 'copyMessages'})
+
+# Queue wait samples kept for the latency figures in stats()
+LATENCY_SAMPLES = 1000
+
+# Group buckets kept before refilled ones are swept
+GROUP_BUCKET_SWEEP_SIZE = 10000
+
+def retry_after_seconds(error: RetryAfter) -> float:
+    retry_after = error.retry_after
+    if hasattr(retry_after, 'total_seconds'):
+        return retry_after.total_seconds()
+    return float(retry_after)
+
+def request_priority(endpoint: str, rate_limit_args) -> int:
+    if rate_limit_args and 'priority' in rate_limit_args:
+        return rate_limit_args['priority']
+    if endpoint in MODERATION_ENDPOINTS:
+        return PRIORITY_MODERATION
+    return PRIORITY_DEFAULT
+
+def is_group_message(endpoint: str, chat_id) -> bool:
+    if not isinstance(chat_id, int) or chat_id >= 0:
+        return False
+    return endpoint.startswith('send') or endpoint in MESSAGE_ENDPOINTS
+
+class TokenBucket:
+    """rate tokens per second, holding at most capacity"""
+    
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+    
+    def delay(self, now: float) -> float:
+        """Seconds until a token is available; 0 if one is available now"""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if now < self.paused_until:
+            return self.paused_until - now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+    
+    def take(self):
+        self.tokens -= 1
+    
+    def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+class OutboundScheduler(BaseRateLimiter):
+    """Rate limiter for Application.builder().rate_limiter() with priorities and coalescing"""
+    
+    def __init__(self, global_rate: float = 30, group_rate_per_minute: float = 20, max_retries: int = 3):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.group_rate_per_minute = group_rate_per_minute
+        self.group_buckets = {}
+        self._sweep_size = GROUP_BUCKET_SWEEP_SIZE
+        self.max_retries = max_retries
+        
+        # (priority, sequence, future) of requests waiting for a global token
+        self._waiting = []
+        self._sequence = itertools.count()
+        self._dispatcher = None
+        # (chat_id, message_id) -> task of the pending deleteMessage
+        self._pending_deletes = {}
+        
+        self.requests = 0
+        self.retries = 0
+        self.coalesced = 0
+        self.waiting_for_chat = 0
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)
+    
+    async def initialize(self):
+        pass
+    
+    async def shutdown(self):
+        if self._dispatcher:
+            self._dispatcher.cancel()
+            self._dispatcher = None
+    
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        chat_id = data.get('chat_id')
+        if endpoint == 'deleteMessage':
+            key = (chat_id, data.get('message_id'))
+            pending = self._pending_deletes.get(key)
+            if pending is not None:
+                self.coalesced += 1
+                return await asyncio.shield(pending)
+            task = asyncio.ensure_future(self._send(callback, args, kwargs, endpoint, chat_id, rate_limit_args))
+            self._pending_deletes[key] = task
+            task.add_done_callback(lambda _: self._pending_deletes.pop(key, None))
+            return await asyncio.shield(task)
+        return await self._send(callback, args, kwargs, endpoint, chat_id, rate_limit_args)
+    
+    async def _send(self, callback, args, kwargs, endpoint, chat_id, rate_limit_args):
+        priority = request_priority(endpoint, rate_limit_args)
+        group = is_group_message(endpoint, chat_id)
+        self.requests += 1
+        
+        for attempt in range(self.max_retries + 1):
+            queued = time.monotonic()
+            if group:
+                await self._acquire_group(chat_id)
+            await self._acquire_global(priority)
+            self._latencies.append(time.monotonic() - queued)
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                if attempt == self.max_retries:
+                    raise
+                self.retries += 1
+                logger.warning(f"{endpoint} hit the flood limit, pausing requests for {e.retry_after}s")
+                self.global_bucket.pause(retry_after_seconds(e))
+    
+    async def _acquire_group(self, chat_id: int):
+        bucket = self.group_buckets.get(chat_id)
+        if bucket is None:
+            if len(self.group_buckets) >= self._sweep_size:
+                self.sweep()
+                self._sweep_size = max(GROUP_BUCKET_SWEEP_SIZE, 2 * len(self.group_buckets))
+            bucket = self.group_buckets[chat_id] = TokenBucket(self.group_rate_per_minute / 60, self.group_rate_per_minute)
+        self.waiting_for_chat += 1
+        try:
+            while True:
+                delay = bucket.delay(time.monotonic())
+                if not delay:
+                    bucket.take()
+                    return
+                await asyncio.sleep(delay)
+        finally:
+            self.waiting_for_chat -= 1
+    
+    async def _acquire_global(self, priority: int):
+        if not self._waiting and not self.global_bucket.delay(time.monotonic()):
+            self.global_bucket.take()
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiting, (priority, next(self._sequence), future))
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.ensure_future(self._dispatch())
+        await future
+    
+    async def _dispatch(self):
+        """Hand out global tokens to waiting requests, highest priority first"""
+        while self._waiting:
+            delay = self.global_bucket.delay(time.monotonic())
+            if delay:
+                await asyncio.sleep(delay)
+                continue
+            _, _, future = heapq.heappop(self._waiting)
+            if not future.done():  # the caller may have been cancelled
+                self.global_bucket.take()
+                future.set_result(None)
+    
+    def sweep(self, now: float = None) -> int:
+        """Drop group buckets that have refilled completely; returns how many were dropped"""
+        if now is None:
+            now = time.monotonic()
+        idle = [chat_id for chat_id, bucket in self.group_buckets.items()
+                if not bucket.delay(now) and bucket.tokens >= bucket.capacity]
+        for chat_id in idle:
+            del self.group_buckets[chat_id]
+        return len(idle)
+    
+    def stats(self) -> dict:
+        depth = {name: 0 for name in PRIORITY_NAMES.values()}
+        for priority, _, _ in self._waiting:
+            depth[PRIORITY_NAMES.get(priority, 'default')] += 1
+        latencies = sorted(self._latencies)
+        return {
+            'requests': self.requests,
+            'queued': len(self._waiting) + self.waiting_for_chat,
+            'queued_by_priority': depth,
+            'waiting_for_chat': self.waiting_for_chat,
+            'retries': self.retries,
+            'coalesced': self.coalesced,
+            'latency_p50': latencies[len(latencies) // 2] if latencies else 0.0,
+            'latency_p99': latencies[int(len(latencies) * 0.99)] if latencies else 0.0,
+            'latency_max': latencies[-1] if latencies else 0.0,
+        }
+
+outbound = OutboundScheduler(
+    global_rate=Config.OUTBOUND_GLOBAL_RATE,
+    group_rate_per_minute=Config.OUTBOUND_GROUP_RATE,
+    max_retries=Config.OUTBOUND_MAX_RETRIES,
+)
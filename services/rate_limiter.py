@@ -0,0 +1,70 @@
+"""
+Compact per-key rate limiting.
+
+SlidingWindowLimiter keeps a fixed-size counter per key instead of a
+timestamp per message, so memory stays O(1) per tracked user no matter how
+fast they post. Time is integer milliseconds from the monotonic clock, and
+keys that have been idle for two windows are swept periodically.
+"""
+
+import time
+
+def monotonic_ms() -> int:
+    return time.monotonic_ns() // 1_000_000
+
+class SlidingWindowLimiter:
+    """
+    Sliding-window counter: the count for the current fixed window plus the
+    previous window's count weighted by how much of it still overlaps the
+    sliding window.
+    """
+    
+    def __init__(self, sweep_interval_ms: int = 60_000):
+        # key -> [window_start_ms, previous_count, current_count]
+        self.counters = {}
+        self.sweep_interval_ms = sweep_interval_ms
+        self._max_window_ms = 0
+        self._next_sweep = monotonic_ms() + sweep_interval_ms
+    
+    def hit(self, key, limit: int, window_ms: int, now: int = None) -> bool:
+        """Count one event for key; True if it pushes key over limit events per window"""
+        if now is None:
+            now = monotonic_ms()
+        if now >= self._next_sweep:
+            self.sweep(now)
+        if window_ms > self._max_window_ms:
+            self._max_window_ms = window_ms
+        
+        window_start = now - now % window_ms
+        counter = self.counters.get(key)
+        if counter is None:
+            self.counters[key] = [window_start, 0, 1]
+            return 1 > limit
+        
+        if counter[0] != window_start:
+            # Roll forward; a gap of more than one window forgets the old count
+            counter[1] = counter[2] if window_start - counter[0] == window_ms else 0
+            counter[0] = window_start
+            counter[2] = 0
+        counter[2] += 1
+        
+        weight = window_ms - (now - window_start)
+        return counter[1] * weight // window_ms + counter[2] > limit
+    
+    def reset(self, key):
+        self.counters.pop(key, None)
+    
+    def sweep(self, now: int = None) -> int:
+        """Drop keys idle long enough that their count has decayed to zero"""
+        if now is None:
+            now = monotonic_ms()
+        self._next_sweep = now + self.sweep_interval_ms
+        
+        cutoff = now - 2 * self._max_window_ms
+        idle = [key for key, counter in self.counters.items() if counter[0] <= cutoff]
+        for key in idle:
+            del self.counters[key]
+        return len(idle)
+    
+    def __len__(self):
+        return len(self.counters)
@@ -0,0 +1,145 @@
+"""
+Weighted spam scoring.
+
+check_spam_patterns used to run re.search for every SPAM_PATTERNS entry on
+every text message. Each pattern had the form "(keywords).*(keywords)", and the
+.* makes the regex engine rescan the rest of the line for every occurrence of a
+first keyword, so long messages full of near-misses cost quadratic time.
+
+SpamScorer indexes the keywords of all rules once, finds every keyword
+occurrence with plain substring searches, and then checks each rule's keyword
+order in one pass over those occurrences, sorted by position. Nothing is ever
+rescanned, so the cost grows linearly with the message length. A message's score is the sum of the weights
+of the rules it matches; chats can add weighted rules of their own on top of
+the built-in ones.
+"""
+
+import logging
+
+from database import async_db
+
+logger = logging.getLogger(__name__)
+
+NEVER = float('inf')
+
+class SpamRule:
+    """Groups of alternative keywords that must occur in order on one line"""
+    
+    def __init__(self, terms, weight: float = 1.0):
+        self.terms = tuple(tuple(keyword.lower() for keyword in term) for term in terms)
+        self.weight = weight
+    
+    @classmethod
+    def parse(cls, pattern: str, weight: float = 1.0):
+        """Build a rule from its text form: space-separated groups of |-separated keywords"""
+        terms = [[keyword for keyword in group.split('|') if keyword] for group in pattern.split()]
+        terms = [term for term in terms if term]
+        if not terms:
+            raise ValueError("A spam pattern needs at least one keyword")
+        return cls(terms, weight)
+    
+    def __str__(self):
+        return ' '.join('|'.join(term) for term in self.terms)
+
+# Built-in rules, the former SPAM_PATTERNS; each one alone reaches the default threshold
+DEFAULT_SPAM_RULES = [
+    SpamRule([('free', 'win', 'winner', 'congratulations'), ('money', 'cash', 'prize', 'reward')]),
+    SpamRule([('click', 'visit', 'check'), ('link', 'url', 'website')]),
+    SpamRule([('telegram', 'whatsapp', 'discord'), ('group', 'channel', 'server')]),
+    SpamRule([('crypto', 'bitcoin', 'trading', 'investment'), ('profit', 'earn', 'money')]),
+    SpamRule([('dating', 'meet', 'girls', 'boys'), ('app', 'site', 'website')]),
+]
+
+class SpamScorer:
+    """Scores messages against a fixed set of rules"""
+    
+    def __init__(self, rules: list):
+        self.rules = list(rules)
+        self.last_terms = [len(rule.terms) - 1 for rule in self.rules]
+        
+        # keyword -> ((rule index, term position), ...)
+        positions = {}
+        for rule_index, rule in enumerate(self.rules):
+            for term_index, term in enumerate(rule.terms):
+                for keyword in term:
+                    positions.setdefault(keyword, []).append((rule_index, term_index))
+        self.positions = {keyword: tuple(uses) for keyword, uses in positions.items()}
+        
+        self.keywords = tuple(self.positions)
+    
+    def score(self, text: str):
+        """Return (score, matched rules) for text"""
+        text = text.lower()
+        occurrences = []
+        for keyword in self.keywords:
+            start = text.find(keyword)
+            while start != -1:
+                occurrences.append((start, keyword))
+                start = text.find(keyword, start + 1)
+        if not occurrences:
+            return 0.0, []
+        occurrences.sort()
+        
+        matched = set()
+        # (rule, term) -> earliest end of an in-order match of the rule up to that term, on this line
+        ends = {}
+        line_end = text.find('\n')
+        for start, keyword in occurrences:
+            if line_end != -1 and start > line_end:
+                ends = {}
+                line_end = text.find('\n', start)
+            end = start + len(keyword)
+            for rule_index, term_index in self.positions[keyword]:
+                if rule_index in matched:
+                    continue
+                if term_index and ends.get((rule_index, term_index - 1), NEVER) > start:
+                    continue
+                if term_index == self.last_terms[rule_index]:
+                    matched.add(rule_index)
+                elif end < ends.get((rule_index, term_index), NEVER):
+                    ends[(rule_index, term_index)] = end
+        
+        rules = [self.rules[rule_index] for rule_index in sorted(matched)]
+        return sum(rule.weight for rule in rules), rules
+
+class SpamScorerCache:
+    """SpamScorer per chat: the built-in rules plus the chat's own patterns"""
+    
+    def __init__(self, default_rules: list):
+        self.default_rules = default_rules
+        self.default = SpamScorer(default_rules)
+        self.scorers = {}
+        self.builds = 0
+        # Bumped on invalidation so a build that raced a pattern change is not kept
+        self.version = 0
+    
+    async def get(self, chat_id: int) -> SpamScorer:
+        scorer = self.scorers.get(chat_id)
+        if scorer is None:
+            from handlers.filters import SpamPattern
+            
+            version = self.version
+            rows = await async_db.run_sync(
+                lambda session: session.query(SpamPattern.pattern, SpamPattern.weight)
+                .filter(SpamPattern.chat_id == chat_id)
+                .all()
+            )
+            custom_rules = []
+            for pattern, weight in rows:
+                try:
+                    custom_rules.append(SpamRule.parse(pattern, weight))
+                except ValueError as e:
+                    logger.warning(f"Skipping spam pattern {pattern!r} in chat {chat_id}: {e}")
+            
+            # Chats without their own patterns share the built-in scorer
+            scorer = SpamScorer(self.default_rules + custom_rules) if custom_rules else self.default
+            if version == self.version:
+                self.scorers[chat_id] = scorer
+            self.builds += 1
+        return scorer
+    
+    def invalidate(self, chat_id: int):
+        self.version += 1
+        self.scorers.pop(chat_id, None)
+
+spam_scorers = SpamScorerCache(DEFAULT_SPAM_RULES)
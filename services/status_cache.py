@@ -0,0 +1,124 @@
+"""
+In-process cache for admin, ban and whitelist status.
+
+These predicates are checked on every admin command and every message but
+change only when an admin, ban or whitelist entry is added or removed. The
+database managers consult StatusCache before querying and invalidate the
+affected keys whenever they write, so cached answers are never stale beyond a
+write made outside the bot (covered by the TTL).
+
+Keys are (kind, user_id, chat_id) tuples; chat_id is None for the chat-less
+form of each predicate (any chat for admins, global entries for bans and
+whitelists).
+"""
+
+import time
+from collections import OrderedDict
+
+from config import Config
+
+MISSING = object()
+
+class StatusCache:
+    """Bounded LRU cache with per-entry TTL and per-user invalidation"""
+    
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        
+        # key -> (value, expires_at)
+        self._entries = OrderedDict()
+        # (kind, user_id) -> set of cached keys, for invalidating every chat at once
+        self._user_keys = {}
+        # Bumped on every invalidation so lookups that raced a write are not stored
+        self.version = 0
+        
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+    
+    def get(self, key):
+        """Return the cached value for key, or MISSING"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return MISSING
+        
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            self._discard(key)
+            self.expirations += 1
+            self.misses += 1
+            return MISSING
+        
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+    
+    def put(self, key, value, version: int = None):
+        """
+        Cache value for key. Pass the version read before querying the database;
+        the value is dropped if an invalidation happened in the meantime.
+        """
+        if version is not None and version != self.version:
+            return
+        
+        if key in self._entries:
+            self._entries.move_to_end(key)
+        else:
+            self._user_keys.setdefault(key[:2], set()).add(key)
+        self._entries[key] = (value, time.monotonic() + self.ttl)
+        
+        while len(self._entries) > self.max_entries:
+            oldest = next(iter(self._entries))
+            self._discard(oldest)
+            self.evictions += 1
+    
+    def invalidate(self, kind: str, user_id: int, chat_id: int = None):
+        """
+        Drop cached status for a user. With chat_id, only that chat's entry and the
+        chat-less entry are dropped; without it, every entry of that kind for the user.
+        """
+        self.version += 1
+        self.invalidations += 1
+        
+        if chat_id:
+            self._discard((kind, user_id, chat_id))
+            self._discard((kind, user_id, None))
+        else:
+            for key in list(self._user_keys.get((kind, user_id), ())):
+                self._discard(key)
+    
+    def clear(self):
+        self.version += 1
+        self._entries.clear()
+        self._user_keys.clear()
+    
+    def _discard(self, key):
+        if self._entries.pop(key, None) is None:
+            return
+        user_keys = self._user_keys.get(key[:2])
+        if user_keys is not None:
+            user_keys.discard(key)
+            if not user_keys:
+                del self._user_keys[key[:2]]
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'invalidations': self.invalidations,
+        }
+
+status_cache = StatusCache(ttl=Config.STATUS_CACHE_TTL, max_entries=Config.STATUS_CACHE_MAX_ENTRIES)
@@ -0,0 +1,139 @@
+"""
+Concurrent update processing that keeps each chat's updates in order.
+
+With the default update processor the application handles one update at a
+time, so a slow handler in one chat (a purge, a report, a database stall)
+holds up every other chat. Allowing concurrent updates fixes that but lets two
+messages from the same chat run at once and finish out of order, which the
+flood limiter and the night mode and captcha flows cannot tolerate.
+
+ShardedUpdateProcessor hashes each update's chat id onto one of UPDATE_SHARDS
+shards. Every shard has a queue of at most UPDATE_SHARD_DEPTH updates and one
+worker that processes them in turn, so a chat's updates are always handled in
+order by the same worker while different chats run in parallel on different
+shards. The application hands updates over one at a time; when the target
+shard is full the hand-off waits, so a backlog stops the application from
+taking more updates off its update queue instead of piling up tasks.
+
+stats() reports queue length, peak depth, blocked hand-offs, queue wait and
+service time per shard; /debug shows them.
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+
+from telegram.ext import BaseUpdateProcessor
+
+logger = logging.getLogger(__name__)
+
+# Service time samples kept per shard for the percentiles in stats()
+SERVICE_TIME_SAMPLES = 500
+
+def update_chat_key(update):
+    """Ordering key of an update: its chat, else its user, else None for no ordering"""
+    chat = getattr(update, 'effective_chat', None)
+    if chat is not None:
+        return chat.id
+    user = getattr(update, 'effective_user', None)
+    if user is not None:
+        return ('user', user.id)
+    return None
+
+class UpdateShard:
+    """Bounded queue of updates and the worker that processes them in order"""
+    
+    def __init__(self, index: int, max_depth: int):
+        self.index = index
+        self.max_depth = max_depth
+        self.queue = None
+        self.worker = None
+        
+        self.processed = 0
+        self.blocked = 0
+        self.peak_depth = 0
+        self.wait_time = 0.0
+        self.service_times = deque(maxlen=SERVICE_TIME_SAMPLES)
+    
+    async def run(self):
+        while True:
+            coroutine, queued = await self.queue.get()
+            started = time.monotonic()
+            try:
+                await coroutine
+            except Exception as e:
+                logger.error(f"Update failed on shard {self.index}: {e}")
+            finally:
+                self.processed += 1
+                self.wait_time += started - queued
+                self.service_times.append(time.monotonic() - started)
+                self.queue.task_done()
+    
+    def stats(self) -> dict:
+        service_times = sorted(self.service_times)
+        return {
+            'queued': self.queue.qsize() if self.queue else 0,
+            'peak_depth': self.peak_depth,
+            'processed': self.processed,
+            'blocked': self.blocked,
+            'average_wait': self.wait_time / self.processed if self.processed else 0.0,
+            'service_p50': service_times[len(service_times) // 2] if service_times else 0.0,
+            'service_p99': service_times[int(len(service_times) * 0.99)] if service_times else 0.0,
+        }
+
+class ShardedUpdateProcessor(BaseUpdateProcessor):
+    """Update processor for Application.builder().concurrent_updates() that shards updates by chat"""
+    
+    def __init__(self, shards: int = 8, max_depth: int = 64):
+        # The application awaits each hand-off, so a full shard holds back the update queue
+        super().__init__(1)
+        self.shards = [UpdateShard(index, max_depth) for index in range(shards)]
+        self._next_unkeyed = 0
+    
+    def shard_for(self, update) -> UpdateShard:
+        key = update_chat_key(update)
+        if key is None:
+            # Nothing to keep in order; spread such updates round robin
+            self._next_unkeyed = (self._next_unkeyed + 1) % len(self.shards)
+            return self.shards[self._next_unkeyed]
+        return self.shards[hash(key) % len(self.shards)]
+    
+    async def do_process_update(self, update, coroutine):
+        shard = self.shard_for(update)
+        if shard.queue is None:
+            await self.initialize()
+        if shard.queue.full():
+            shard.blocked += 1
+        await shard.queue.put((coroutine, time.monotonic()))
+        shard.peak_depth = max(shard.peak_depth, shard.queue.qsize())
+    
+    async def initialize(self):
+        for shard in self.shards:
+            if shard.worker is None:
+                shard.queue = asyncio.Queue(maxsize=shard.max_depth)
+                shard.worker = asyncio.get_running_loop().create_task(shard.run())
+    
+    async def drain(self):
+        """Wait until every update handed over so far has been processed"""
+        await asyncio.gather(*(shard.queue.join() for shard in self.shards if shard.queue))
+    
+    async def shutdown(self):
+        for shard in self.shards:
+            if shard.worker is not None:
+                shard.worker.cancel()
+                try:
+                    await shard.worker
+                except asyncio.CancelledError:
+                    pass
+                shard.worker = None
+            # Updates still queued are dropped; close them so they are not reported as never awaited
+            while shard.queue is not None and not shard.queue.empty():
+                coroutine, _ = shard.queue.get_nowait()
+                coroutine.close()
+    
+    def queued(self) -> int:
+        return sum(shard.queue.qsize() for shard in self.shards if shard.queue)
+    
+    def stats(self) -> list:
+        return [shard.stats() for shard in self.shards]
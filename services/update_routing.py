@@ -0,0 +1,101 @@
+"""
+Update types the bot subscribes to, derived from its handlers.
+
+The bot used to request Update.ALL_TYPES, so Telegram sent (and the bot
+downloaded and deserialized) edited messages, channel posts, reactions,
+polls and boosts that no handler acts on. The message and command handlers
+only work with update.message, so an edited message or channel post either
+fell through them or failed on update.message being None.
+
+bot.py registers every message and command handler with NEW_MESSAGES in its
+filter. route_updates() runs once after registration: it refuses a message
+or command handler whose filter accepts a probe edited message or channel
+post, refuses a callback registered twice (one update would reach it twice,
+or take a second filter pass for nothing), and computes the minimal
+allowed_updates list for getUpdates and setWebhook from the handler types.
+"""
+
+import logging
+
+from telegram import Update
+from telegram.ext import CallbackQueryHandler, ChatMemberHandler, CommandHandler, MessageHandler, filters
+
+logger = logging.getLogger(__name__)
+
+# Only new messages; handlers read update.message
+NEW_MESSAGES = filters.UpdateType.MESSAGE
+
+# Messages a handler restricted to NEW_MESSAGES must not accept under another update type
+PROBE_MESSAGES = [
+    {'text': 'probe'},
+    {'text': '/probe', 'entities': [{'type': 'bot_command', 'offset': 0, 'length': 6}]},
+    {'new_chat_members': [{'id': 1, 'is_bot': False, 'first_name': 'Probe'}]},
+    {'left_chat_member': {'id': 1, 'is_bot': False, 'first_name': 'Probe'}},
+]
+
+def probe_updates() -> list:
+    """Edited messages and channel posts carrying each probe message"""
+    updates = []
+    for update_type in ('edited_message', 'channel_post', 'edited_channel_post'):
+        for content in PROBE_MESSAGES:
+            message = {'message_id': 1, 'date': 0, 'chat': {'id': -1, 'type': 'supergroup'}, **content}
+            if update_type == 'edited_message':
+                message['edit_date'] = 1
+            updates.append(Update.de_json({'update_id': len(updates) + 1, update_type: message}, None))
+    return updates
+
+def handler_update_types(handler) -> set:
+    """Update types handler can receive"""
+    if isinstance(handler, (MessageHandler, CommandHandler)):
+        # Registered with NEW_MESSAGES; check_new_messages_only() holds them to it
+        return {'message'}
+    if isinstance(handler, CallbackQueryHandler):
+        return {'callback_query'}
+    if isinstance(handler, ChatMemberHandler):
+        return {
+            ChatMemberHandler.MY_CHAT_MEMBER: {'my_chat_member'},
+            ChatMemberHandler.CHAT_MEMBER: {'chat_member'},
+            ChatMemberHandler.ANY_CHAT_MEMBER: {'my_chat_member', 'chat_member'},
+        }[handler.chat_member_types]
+    # Unknown handler types keep every update type they might need
+    return set(Update.ALL_TYPES)
+
+def check_new_messages_only(application):
+    """Raise ValueError if a message or command handler accepts edited messages or channel posts"""
+    probes = probe_updates()
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            if not isinstance(handler, (MessageHandler, CommandHandler)):
+                continue
+            if any(handler.filters.check_update(update) for update in probes):
+                raise ValueError(f"{handler.callback.__name__} is not restricted to new messages")
+
+def check_single_dispatch(application):
+    """Raise ValueError if a callback is registered more than once for the same updates"""
+    seen = set()
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            # A message starts with one command, so aliases like /ua and /underattack never both match
+            if isinstance(handler, CommandHandler):
+                keys = {('/' + command, handler.callback) for command in handler.commands}
+            else:
+                keys = {(update_type, handler.callback) for update_type in handler_update_types(handler)}
+            if keys & seen:
+                raise ValueError(f"{handler.callback.__name__} is registered more than once")
+            seen |= keys
+
+def allowed_updates(application) -> list:
+    """Minimal allowed_updates for the registered handlers, in Update.ALL_TYPES order"""
+    types = set()
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            types |= handler_update_types(handler)
+    return [update_type for update_type in Update.ALL_TYPES if update_type in types]
+
+def route_updates(application) -> list:
+    """Check the registered handlers; returns the update types to subscribe to"""
+    check_new_messages_only(application)
+    check_single_dispatch(application)
+    types = allowed_updates(application)
+    logger.info(f"Subscribing to {len(types)} of {len(Update.ALL_TYPES)} update types: {', '.join(types)}")
+    return types
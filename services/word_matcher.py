@@ -0,0 +1,234 @@
+"""
+Compiled per-chat word filters.
+
+check_word_filters used to load every WordFilter row on each text message and
+test them one by one. WordMatcher compiles a chat's filters once: literal words
+go into an Aho-Corasick automaton that finds all of them in a single pass over
+the message, and regex filters are precompiled, indexed by their literal prefix
+where they have one and otherwise joined into one alternation.
+Compiled matchers are cached per chat and rebuilt only after /addfilter or
+/removefilter change that chat's filters.
+"""
+
+import logging
+import re
+
+from database import async_db
+
+logger = logging.getLogger(__name__)
+
+NO_MATCH = float('inf')
+
+# Backreferences and conditionals, which depend on group numbering
+GROUP_REFERENCE = re.compile(r'\\[1-9]|\(\?P=|\(\?\(')
+
+REGEX_METACHARACTERS = frozenset('.^$*+?{}[]\\|()')
+
+# Shortest literal prefix worth indexing; shorter ones would trigger on most messages
+MIN_TRIGGER_LENGTH = 3
+
+class AhoCorasick:
+    """Multi-pattern substring search over a trie with failure links"""
+    
+    def __init__(self, patterns: list):
+        # Node 0 is the root. Per node: transitions, failure link, the pattern
+        # indices ending exactly there, the next node on the failure chain that
+        # ends a pattern, and the lowest pattern index ending anywhere on the chain
+        self.goto = [{}]
+        self.fail = [0]
+        self.ends = [()]
+        self.output_link = [0]
+        self.best = [NO_MATCH]
+        
+        for index, pattern in enumerate(patterns):
+            if not pattern:
+                continue
+            node = 0
+            for char in pattern:
+                next_node = self.goto[node].get(char)
+                if next_node is None:
+                    next_node = len(self.goto)
+                    self.goto[node][char] = next_node
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.ends.append(())
+                    self.output_link.append(0)
+                    self.best.append(NO_MATCH)
+                node = next_node
+            self.ends[node] += (index,)
+            self.best[node] = min(self.best[node], index)
+        
+        # Breadth-first so every failure link points at an already finished node
+        queue = list(self.goto[0].values())
+        for node in queue:
+            for char, child in self.goto[node].items():
+                fallback = self.fail[node]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                target = self.goto[fallback].get(char, 0)
+                self.fail[child] = target
+                self.output_link[child] = target if self.ends[target] else self.output_link[target]
+                self.best[child] = min(self.best[child], self.best[target])
+                queue.append(child)
+    
+    def search(self, text: str):
+        """Lowest pattern index occurring anywhere in text, or NO_MATCH"""
+        goto, fail, best = self.goto, self.fail, self.best
+        node = 0
+        found = NO_MATCH
+        for char in text:
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if best[node] < found:
+                found = best[node]
+        return found
+    
+    def search_all(self, text: str) -> set:
+        """Indices of every pattern occurring in text"""
+        goto, fail, ends, output_link = self.goto, self.fail, self.ends, self.output_link
+        node = 0
+        found = set()
+        for char in text:
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            match = node if ends[node] else output_link[node]
+            while match:
+                found.update(ends[match])
+                match = output_link[match]
+        return found
+
+def literal_prefix(pattern: str) -> str:
+    """Literal text every match of pattern starts with (lowercased), or '' if unknown"""
+    if '|' in pattern:
+        return ''
+    prefix = []
+    for char in pattern:
+        if char in REGEX_METACHARACTERS:
+            if char in '*?{' and prefix:
+                prefix.pop()  # the preceding character is optional
+            break
+        prefix.append(char)
+    return ''.join(prefix).lower()
+
+class WordMatcher:
+    """
+    All word filters of one chat. match() returns the earliest-added filter
+    that matches the message, like the old row-by-row loop did.
+    
+    Literal words are found by one Aho-Corasick pass. Regex filters that start
+    with a literal (most do) are only run when another automaton sees that
+    literal in the message. The rest share one combined alternation, used only
+    to tell whether any of them matches; the winner is then found by running
+    them one at a time in creation order, since the alternation reports the
+    leftmost match rather than the earliest filter.
+    """
+    
+    def __init__(self, filters: list):
+        # filters are (word, action, is_regex) in creation order
+        self.filters = filters
+        literal_words = [word if not is_regex else None for word, _, is_regex in filters]
+        self.literals = AhoCorasick(literal_words) if any(literal_words) else None
+        
+        self.patterns = {}
+        self.triggers = None
+        self.regex = None
+        self.regex_patterns = []
+        self.regex_fallback = []
+        trigger_words = [None] * len(filters)
+        combinable = []
+        for index, (word, _, is_regex) in enumerate(filters):
+            if not is_regex:
+                continue
+            try:
+                pattern = re.compile(word, re.IGNORECASE)
+            except re.error as e:
+                logger.warning(f"Skipping invalid regex filter {word!r}: {e}")
+                continue
+            self.patterns[index] = pattern
+            
+            prefix = literal_prefix(word)
+            if len(prefix) >= MIN_TRIGGER_LENGTH:
+                trigger_words[index] = prefix
+            elif pattern.groups and GROUP_REFERENCE.search(word):
+                # Group references would point at the wrong group once combined
+                self.regex_fallback.append((index, pattern))
+            else:
+                combinable.append((index, word, pattern))
+        
+        if any(trigger_words):
+            self.triggers = AhoCorasick(trigger_words)
+        
+        if combinable:
+            alternation = '|'.join(f'(?:{word})' for _, word, _ in combinable)
+            try:
+                self.regex = re.compile(alternation, re.IGNORECASE)
+                self.regex_patterns = [(index, pattern) for index, _, pattern in combinable]
+            except re.error:
+                # e.g. the same group name used by two filters
+                self.regex_fallback.extend((index, pattern) for index, _, pattern in combinable)
+                self.regex_fallback.sort(key=lambda item: item[0])
+    
+    def match(self, text: str):
+        """Return (word, action) of the matching filter for lowercased text, or None"""
+        found = self.literals.search(text) if self.literals else NO_MATCH
+        
+        if self.triggers:
+            for index in sorted(self.triggers.search_all(text)):
+                if index >= found:
+                    break
+                if self.patterns[index].search(text):
+                    found = index
+                    break
+        if self.regex and self.regex_patterns[0][0] < found and self.regex.search(text):
+            for index, pattern in self.regex_patterns:
+                if index >= found:
+                    break
+                if pattern.search(text):
+                    found = index
+                    break
+        for index, pattern in self.regex_fallback:
+            if index >= found:
+                break
+            if pattern.search(text):
+                found = index
+                break
+        
+        if found == NO_MATCH:
+            return None
+        word, action, _ = self.filters[found]
+        return word, action
+
+class WordMatcherCache:
+    """Compiled WordMatcher per chat, rebuilt after the chat's filters change"""
+    
+    def __init__(self):
+        self.matchers = {}
+        self.builds = 0
+        # Bumped on invalidation so a build that raced a filter change is not kept
+        self.version = 0
+    
+    async def get(self, chat_id: int) -> WordMatcher:
+        matcher = self.matchers.get(chat_id)
+        if matcher is None:
+            from handlers.filters import WordFilter
+            
+            version = self.version
+            rows = await async_db.run_sync(
+                lambda session: session.query(WordFilter.word, WordFilter.action, WordFilter.is_regex)
+                .filter(WordFilter.chat_id == chat_id)
+                .order_by(WordFilter.id)
+                .all()
+            )
+            matcher = WordMatcher([(word, action, bool(is_regex)) for word, action, is_regex in rows])
+            if version == self.version:
+                self.matchers[chat_id] = matcher
+            self.builds += 1
+        return matcher
+    
+    def invalidate(self, chat_id: int):
+        self.version += 1
+        self.matchers.pop(chat_id, None)
+
+word_matchers = WordMatcherCache()
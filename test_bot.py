@@ -74,6 +74,42 @@ def test_database():
         print(f"❌ Database test error: {e}")
         return False
 
+def test_async_database():
+    """Test async database functionality"""
+    try:
+        print("\nTesting async database...")
+        from database import async_db
+        
+        async def run():
+            try:
+                await async_db.get_or_create_chat(12345, "Test Chat")
+                await async_db.get_or_create_user(67890, "testuser", "Test", "User")
+                
+                assert await async_db.add_admin(67890, 12345), "Async add_admin failed"
+                assert await async_db.is_admin(67890, 12345), "Async admin check failed"
+                
+                await async_db.add_ban(67890, 12345, 67890, "Test ban")
+                assert await async_db.is_banned(67890, 12345), "Async ban check failed"
+                
+                await async_db.add_mute(67890, 12345, 67890, 60)
+                assert await async_db.is_muted(67890, 12345), "Async mute check failed"
+                
+                # Clean up
+                assert await async_db.remove_mute(67890, 12345)
+                assert await async_db.remove_ban(67890, 12345)
+                assert await async_db.remove_admin(67890, 12345)
+                assert not await async_db.is_admin(67890, 12345)
+            finally:
+                await async_db.engine.dispose()
+        
+        asyncio.run(run())
+        
+        print("✅ Async database tests passed")
+        return True
+    except Exception as e:
+        print(f"❌ Async database test error: {e}")
+        return False
+
 def test_utils():
     """Test utility functions"""
     try:
@@ -126,6 +162,7 @@ def main():
         test_imports,
         test_config,
         test_database,
+        test_async_database,
         test_utils
     ]
     
@@ -3,6 +3,8 @@ from typing import Optional, Union
 from telegram import Update, User
 from telegram.ext import ContextTypes
 
+from services.message_classifier import message_media
+
 def get_user_from_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Optional[tuple]:
     """
     Extract user information from command arguments or replied message.
@@ -83,12 +85,12 @@ def format_time_duration(seconds: int) -> str:
 def is_admin_command(func):
     """Decorator to check if user is admin before executing command"""
     async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
-        from database import db
+        from database import async_db
         
         user_id = update.effective_user.id
         chat_id = update.effective_chat.id
         
-        if not db.is_admin(user_id, chat_id):
+        if not await async_db.is_admin(user_id, chat_id):
             await update.message.reply_text("❌ You need to be an admin to use this command.")
             return
         
@@ -130,21 +132,4 @@ async def update_chat_admins_cache(context: ContextTypes.DEFAULT_TYPE, chat_id:
 
 def get_file_id_from_message(message) -> Optional[str]:
     """Extract file ID from various message types"""
-    if message.photo:
-        return message.photo[-1].file_id  # Get highest resolution
-    elif message.document:
-        return message.document.file_id
-    elif message.video:
-        return message.video.file_id
-    elif message.audio:
-        return message.audio.file_id
-    elif message.voice:
-        return message.voice.file_id
-    elif message.video_note:
-        return message.video_note.file_id
-    elif message.sticker:
-        return message.sticker.file_id
-    elif message.animation:
-        return message.animation.file_id
-    
-    return None
\ No newline at end of file
+    return message_media(message)[1]